@@ -0,0 +1,107 @@
+# Benchmark for serving many concurrent customers with the sync and async services.
+# Each client logs in, searches for a sedan and books one; the sync run uses one
+# thread and session per client, the async run one task per client on a single
+# event loop. Run from the project folder:
+#   python -m benchmarks.bench_async [clients]
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from tabulate import tabulate
+from benchmarks.common import temp_database
+from src.async_database import AsyncDatabase
+from src.async_services import AsyncAuthService, AsyncRentalService
+from src.auth_service import AuthService
+from src.models import User, Vehicle, VehicleType, Role
+from src.password_hasher import PasswordHasher
+from src.rental_service import RentalService
+
+CLIENTS = 100
+ROUNDS = 6  # bcrypt cost, low enough that the database dominates
+
+
+def build_data(session, clients: int, hasher: PasswordHasher):
+    # one customer and one sedan per client
+    password_hash = hasher.hash("Bench123")
+    session.execute(insert(User), [dict(first_name="Bench", last_name=str(i), email=f"bench{i}@example.com",
+                                        mobile_number="1234567890", password_hash=password_hash, role=Role.MEMBER)
+                                   for i in range(clients)])
+    session.execute(insert(Vehicle), [
+        dict(plate=f"BENCH{i:06d}", model="Toyota Camry", type=VehicleType.SEDAN, year=2020,
+             vehicle_mileage=10000, mileage_threshold=100000, min_rent_hours=1, max_rent_hours=72,
+             hourly_rate_cents=500, is_deleted=False)
+        for i in range(clients)
+    ])
+    session.commit()
+
+
+def run_sync(Session, clients: int, hasher: PasswordHasher, start_at: datetime) -> float:
+    def client(i):
+        session = Session()
+        try:
+            user = AuthService(session, hasher).login(f"bench{i}@example.com", "Bench123")
+            rentals = RentalService(session)
+            rentals.search_available_vehicles(VehicleType.SEDAN, start_at, start_at + timedelta(hours=4))
+            rentals.create_booking(user.id, i + 1, start_at, start_at + timedelta(hours=4))
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        started = time.perf_counter()
+        list(pool.map(client, range(clients)))
+        return time.perf_counter() - started
+
+
+async def run_async(db: AsyncDatabase, clients: int, hasher: PasswordHasher, start_at: datetime) -> float:
+    auth = AsyncAuthService(db, hasher)
+    rentals = AsyncRentalService(db)
+
+    async def client(i):
+        user = await auth.login(f"bench{i}@example.com", "Bench123")
+        await rentals.search_available_vehicles(VehicleType.SEDAN, start_at, start_at + timedelta(hours=4))
+        await rentals.create_booking(user.id, i + 1, start_at, start_at + timedelta(hours=4))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client(i) for i in range(clients)])
+    return time.perf_counter() - started
+
+
+def run(clients: int = CLIENTS):
+    hasher = PasswordHasher(rounds=ROUNDS, max_workers=os.cpu_count() or 1)
+    start_at = datetime.utcnow() + timedelta(days=1)
+    rows = []
+
+    engine, Session = temp_database("sync.db")
+    session = Session()
+    build_data(session, clients, hasher)
+    session.close()
+    elapsed = run_sync(Session, clients, hasher, start_at)
+    rows.append(["sync, thread per client", clients, f"{elapsed:.2f}", f"{clients / elapsed:.1f}"])
+    engine.dispose()
+
+    engine, Session = temp_database("async.db")
+    session = Session()
+    build_data(session, clients, hasher)
+    session.close()
+    engine.dispose()
+
+    async def async_run():
+        db = AsyncDatabase.from_url(str(engine.url))
+        try:
+            return await run_async(db, clients, hasher, start_at)
+        finally:
+            await db.dispose()
+
+    elapsed = asyncio.run(async_run())
+    rows.append(["async, one event loop", clients, f"{elapsed:.2f}", f"{clients / elapsed:.1f}"])
+    hasher.shutdown()
+
+    print(f"CPUs: {os.cpu_count()}, bcrypt rounds: {ROUNDS}")
+    print(tabulate(rows, headers=["Services", "Clients", "Seconds", "Clients/s"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else CLIENTS)
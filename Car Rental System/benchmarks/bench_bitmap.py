@@ -0,0 +1,70 @@
+# Benchmark for the hour availability bitmap (src/availability_bitmap.py).
+# Builds the bitmap for fleets of sedans, then compares "which sedans are free for
+# these hours" and a week-long calendar against the availability index, and prints
+# the memory the bitmap takes. Run from the project folder:
+#   python -m benchmarks.bench_bitmap [fleet sizes...]
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+from tabulate import tabulate
+from benchmarks.bench_search import build_fleet
+from benchmarks.common import temp_database, timer
+from src.availability_bitmap import AvailabilityBitmap, SESSION_KEY as BITMAP_KEY
+from src.availability_index import AvailabilityIndex, SESSION_KEY as INDEX_KEY
+from src.models import VehicleType
+from src.rental_service import RentalService, BOOKING_BUFFER
+from src.schedule import ceil_hour
+
+FLEET_SIZES = [1000, 5000]
+CALENDAR_HOURS = 7 * 24
+
+
+def run(fleet_sizes=FLEET_SIZES):
+    rows = []
+    memory = []
+    now = datetime.utcnow()
+    start_at = ceil_hour(now) + timedelta(days=10)
+    end_at = start_at + timedelta(hours=24)
+    for size in fleet_sizes:
+        engine, Session = temp_database(f"bitmap_{size}.db")
+        build_fleet(Session(), size, now)
+
+        session = Session()
+        index = AvailabilityIndex.load(session)
+        built = {}
+        with timer(built):
+            bitmap = AvailabilityBitmap.build(session, now=now)
+        session.close()
+        rows.append([size, "build bitmap", f"{built['ms']:.1f}"])
+
+        session = Session(info={INDEX_KEY: index})
+        stats = {}
+        with timer(stats):
+            expected = [v.id for v in RentalService(session).search_available_vehicles(VehicleType.SEDAN, start_at, end_at)]
+        rows.append([size, "free sedans: index search", f"{stats['ms']:.1f}"])
+        with timer(stats):
+            calendar = RentalService(session).availability_calendar(VehicleType.SEDAN, 8, CALENDAR_HOURS, start_at)
+        rows.append([size, "calendar: index sweep", f"{stats['ms']:.1f}"])
+        session.close()
+
+        session = Session(info={BITMAP_KEY: bitmap})
+        with timer(stats):
+            found = bitmap.free_vehicles(session, VehicleType.SEDAN, start_at - BOOKING_BUFFER, end_at + BOOKING_BUFFER)
+        rows.append([size, "free sedans: bitmap", f"{stats['ms']:.1f}"])
+        with timer(stats):
+            from_bitmap = RentalService(session).availability_calendar(VehicleType.SEDAN, 8, CALENDAR_HOURS, start_at)
+        rows.append([size, "calendar: bitmap", f"{stats['ms']:.1f}"])
+        session.close()
+
+        if found != expected or not np.array_equal(calendar.free, from_bitmap.free):
+            sys.exit(f"result mismatch at fleet size {size}")
+        report = bitmap.memory_report()
+        memory.append([size, report["hours"], f"{report['bytes'] / 2 ** 20:.2f}",
+                       f"{report['bytes_per_1k_vehicle_years'] / 2 ** 20:.2f}"])
+        engine.dispose()
+    print(tabulate(rows, headers=["Fleet", "Operation", "Latency (ms)"], tablefmt="grid"))
+    print(tabulate(memory, headers=["Fleet", "Hours", "Bitmap (MiB)", "Per 1k vehicle-years (MiB)"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or FLEET_SIZES)
@@ -0,0 +1,66 @@
+# Benchmark for VehicleService.bulk_upsert against one add_vehicle call per row.
+# Run from the project folder:
+#   python -m benchmarks.bench_bulk_import [rows]
+import csv
+from itertools import islice
+import os
+import sys
+import tempfile
+import time
+from tabulate import tabulate
+from benchmarks.common import QueryCounter, temp_database
+from src.vehicle_service import VehicleService, read_fleet_file, parse_vehicle_row, IMPORT_FIELDS
+
+ROWS = 100_000
+# add_vehicle is measured on a sample only, a full run would take minutes
+LEGACY_SAMPLE = 2_000
+TYPES = ["SEDAN", "SUV", "VAN", "HATCHBACK", "TRUCK"]
+
+
+def write_fleet_csv(path: str, rows: int, mileage: int = 1000) -> None:
+    # synthetic fleet spread over all vehicle types
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(list(IMPORT_FIELDS) + ["photo_url"])
+        for i in range(rows):
+            writer.writerow([f"BULK{i:07d}", "Toyota Camry", TYPES[i % len(TYPES)], 2020, mileage + i % 500,
+                             100000, 2, 72, 500, ""])
+
+
+def run(rows: int = ROWS):
+    folder = tempfile.mkdtemp(prefix="car_rental_import_")
+    fleet = os.path.join(folder, "fleet.csv")
+    write_fleet_csv(fleet, rows)
+    results = []
+
+    # legacy: one duplicate check and one commit per vehicle
+    engine, Session = temp_database("legacy.db")
+    service = VehicleService(Session())
+    sample = min(rows, LEGACY_SAMPLE)
+    with QueryCounter(engine) as counter:
+        started = time.perf_counter()
+        for _, row in islice(read_fleet_file(fleet), sample):
+            service.add_vehicle(**parse_vehicle_row(row))
+        elapsed = time.perf_counter() - started
+    results.append(["add_vehicle per row", sample, counter.count, f"{elapsed:.2f}", f"{sample / elapsed:,.0f}"])
+    engine.dispose()
+
+    # bulk: first import inserts everything, the second one updates every plate
+    engine, Session = temp_database("bulk.db")
+    for label in ("bulk_upsert insert", "bulk_upsert update"):
+        service = VehicleService(Session())
+        with QueryCounter(engine) as counter:
+            started = time.perf_counter()
+            report = service.bulk_upsert(read_fleet_file(fleet))
+            elapsed = time.perf_counter() - started
+        if report.errors:
+            sys.exit(f"unexpected import errors: {report.errors[:5]}")
+        results.append([label, rows, counter.count, f"{elapsed:.2f}", f"{rows / elapsed:,.0f}"])
+        service.db.close()
+    engine.dispose()
+
+    print(tabulate(results, headers=["Method", "Rows", "Queries", "Seconds", "Rows/s"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS)
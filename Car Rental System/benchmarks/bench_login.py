@@ -0,0 +1,49 @@
+# Benchmark for login throughput through PasswordHasher at different pool sizes.
+# Many clients log in at once; each login is one bcrypt verification on the pool.
+# Run from the project folder:
+#   python -m benchmarks.bench_login [rounds]
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tabulate import tabulate
+from benchmarks.common import temp_database
+from src.auth_service import AuthService
+from src.password_hasher import PasswordHasher
+
+LOGINS = 64
+ROUNDS = 10
+
+
+def run(rounds: int = ROUNDS):
+    engine, Session = temp_database("login.db")
+    AuthService(Session(), PasswordHasher(rounds=rounds)).register(
+        "Bench", "User", "bench@example.com", "1234567890", "Bench123")
+
+    pool_sizes = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+    rows = []
+    for workers in pool_sizes:
+        hasher = PasswordHasher(rounds=rounds, max_workers=workers)
+
+        # one client thread per login, each with its own session
+        def login(_):
+            session = Session()
+            try:
+                AuthService(session, hasher).login("bench@example.com", "Bench123")
+            finally:
+                session.close()
+
+        with ThreadPoolExecutor(max_workers=LOGINS) as clients:
+            started = time.perf_counter()
+            list(clients.map(login, range(LOGINS)))
+            elapsed = time.perf_counter() - started
+        hasher.shutdown()
+        rows.append([workers, LOGINS, f"{elapsed:.2f}", f"{LOGINS / elapsed:.1f}"])
+
+    engine.dispose()
+    print(f"bcrypt rounds: {rounds}, CPUs: {os.cpu_count()}")
+    print(tabulate(rows, headers=["Pool size", "Logins", "Seconds", "Logins/s"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else ROUNDS)
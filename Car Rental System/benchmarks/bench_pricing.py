@@ -0,0 +1,41 @@
+# Benchmark for batch price quoting (src/pricing.py).
+# Prices a fleet against many candidate windows, once with the per-vehicle Python
+# formula and once as a NumPy quote matrix. Run from the project folder:
+#   python -m benchmarks.bench_pricing [vehicles] [windows]
+import random
+import sys
+from datetime import datetime, timedelta
+from tabulate import tabulate
+from benchmarks.common import timer
+from src.pricing import price_cents, quote_matrix
+
+VEHICLES = 10_000
+WINDOWS = 50
+
+
+def run(vehicles: int = VEHICLES, windows: int = WINDOWS):
+    rnd = random.Random(1)
+    rates = [rnd.randint(300, 2500) for _ in range(vehicles)]
+    now = datetime.utcnow()
+    starts = [now + timedelta(hours=rnd.randint(1, 24 * 60)) for _ in range(windows)]
+    ends = [s + timedelta(hours=rnd.randint(1, 72), minutes=rnd.choice([0, 30])) for s in starts]
+
+    rows = []
+    loop = {}
+    with timer(loop):
+        expected = [[price_cents(rate, s, e) for s, e in zip(starts, ends)] for rate in rates]
+    rows.append(["python loop", f"{loop['ms']:.1f}"])
+
+    vectorized = {}
+    with timer(vectorized):
+        quotes = quote_matrix(rates, starts, ends)
+    rows.append(["numpy matrix", f"{vectorized['ms']:.1f}"])
+
+    if quotes.tolist() != expected:
+        sys.exit("quote mismatch")
+    print(f"{vehicles} vehicles x {windows} windows")
+    print(tabulate(rows, headers=["Implementation", "Latency (ms)"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,88 @@
+# Benchmark for read-only listing rows (src/projections.py).
+# Lists every vehicle and every booking once as ORM entities and once as NamedTuple
+# rows, and prints wall-clock time and the memory the result holds (tracemalloc)
+# for the given number of rows. Run from the project folder:
+#   python -m benchmarks.bench_projections [rows]
+import gc
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from tabulate import tabulate
+from benchmarks.common import temp_database, timer
+from src.admin_service import AdminService
+from src.models import ApprovalStatus, BookingStatus, Rental, Role, User, Vehicle, VehicleType
+
+ROWS = 100000
+PAGE_SIZE = 1000
+
+
+def build(session, rows: int):
+    # one customer, `rows` vehicles (every other one over its mileage threshold) and one
+    # booking per vehicle
+    now = datetime.utcnow()
+    session.execute(insert(User), [dict(first_name="Bench", last_name="User", email="bench@example.com",
+                                        mobile_number="1234567890", password_hash="x", role=Role.MEMBER)])
+    session.execute(insert(Vehicle), [
+        dict(plate=f"BENCH{i:06d}", model="Toyota Camry", type=VehicleType.SEDAN, year=2020,
+             vehicle_mileage=99999 + i % 2, mileage_threshold=100000, min_rent_hours=1, max_rent_hours=72,
+             hourly_rate_cents=500, is_deleted=False)
+        for i in range(rows)
+    ])
+    session.execute(insert(Rental), [
+        dict(vehicle_id=i + 1, user_id=1, start_at=now + timedelta(hours=i % 1000), end_at=now + timedelta(hours=i % 1000 + 4),
+             approval_status=ApprovalStatus.APPROVED, booking_status=BookingStatus.REQUESTED,
+             initial_rental_cents=2000, total_rental_cents=2000)
+        for i in range(rows)
+    ])
+    session.commit()
+
+
+def measure(Session, listing):
+    # (ms, retained MiB, peak MiB) of one listing in a fresh session; the result is
+    # kept alive while its memory is read
+    session = Session()
+    stats = {}
+    with timer(stats):
+        listing(AdminService(session))
+    session.close()
+
+    gc.collect()
+    session = Session()
+    tracemalloc.start()
+    result = listing(AdminService(session))
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    session.close()
+    return stats["ms"], retained / 2 ** 20, peak / 2 ** 20
+
+
+def all_pages(pages):
+    return [row for page in pages for row in page]
+
+
+LISTINGS = [
+    ("vehicles", "ORM get_all_vehicles", lambda admin: admin.get_all_vehicles()),
+    ("vehicles", "rows list_vehicles", lambda admin: admin.list_vehicles()),
+    ("over mileage", "ORM get_vehicles_over_mileage", lambda admin: admin.get_vehicles_over_mileage()),
+    ("over mileage", "rows list_vehicles_over_mileage", lambda admin: admin.list_vehicles_over_mileage()),
+    ("bookings", "ORM get_bookings_pages", lambda admin: all_pages(admin.get_bookings_pages(PAGE_SIZE))),
+    ("bookings", "rows get_booking_rows_pages", lambda admin: all_pages(admin.get_booking_rows_pages(PAGE_SIZE))),
+]
+
+
+def run(rows: int = ROWS):
+    engine, Session = temp_database("projections.db")
+    build(Session(), rows)
+    table = []
+    for listing_name, method, listing in LISTINGS:
+        ms, retained, peak = measure(Session, listing)
+        table.append([listing_name, method, f"{ms:.0f}", f"{retained:.1f}", f"{peak:.1f}"])
+    engine.dispose()
+    print(f"{rows} vehicles, {rows} bookings")
+    print(tabulate(table, headers=["Listing", "Method", "Time (ms)", "Retained (MiB)", "Peak (MiB)"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,110 @@
+# Benchmark for RentalService.search_available_vehicles.
+# Compares the old per-vehicle overlap check with the single set-based query
+# and the in-memory availability index across fleet sizes, with and without a warm
+# vehicle catalog. Run from the project folder:
+#   python -m benchmarks.bench_search
+import random
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from tabulate import tabulate
+from benchmarks.common import QueryCounter, temp_database, timer
+from src.availability_index import AvailabilityIndex, SESSION_KEY
+from src.models import Rental, User, Vehicle, VehicleType, Role, ApprovalStatus, BookingStatus
+from src.vehicle_catalog import VehicleCatalog, SESSION_KEY as CATALOG_KEY
+from src.rental_service import RentalService, BLOCKING_BOOKING_STATUSES, BLOCKING_APPROVAL_STATUSES, BOOKING_BUFFER
+
+FLEET_SIZES = [100, 1000, 5000]
+RENTALS_PER_VEHICLE = 5
+
+
+def build_fleet(session, size: int, now: datetime):
+    # one user, `size` sedans and a few bookings per car spread over the next 60 days
+    rnd = random.Random(size)
+    session.execute(insert(User), [dict(first_name="Bench", last_name="User", email="bench@example.com",
+                                        mobile_number="1234567890", password_hash="x", role=Role.MEMBER)])
+    session.execute(insert(Vehicle), [
+        dict(plate=f"BENCH{i:06d}", model="Toyota Camry", type=VehicleType.SEDAN, year=2020,
+             vehicle_mileage=10000, mileage_threshold=100000, min_rent_hours=1, max_rent_hours=72,
+             hourly_rate_cents=500, is_deleted=False)
+        for i in range(size)
+    ])
+    rentals = []
+    for vehicle_id in range(1, size + 1):
+        for _ in range(RENTALS_PER_VEHICLE):
+            start_at = now + timedelta(hours=rnd.randint(0, 24 * 60))
+            rentals.append(dict(vehicle_id=vehicle_id, user_id=1, start_at=start_at,
+                                end_at=start_at + timedelta(hours=rnd.randint(2, 48)),
+                                approval_status=rnd.choice(list(ApprovalStatus)),
+                                booking_status=rnd.choice(list(BookingStatus)),
+                                initial_rental_cents=0, total_rental_cents=0))
+    session.execute(insert(Rental), rentals)
+    session.commit()
+
+
+def legacy_search(session, vehicle_type, start_at: datetime, end_at: datetime):
+    # the previous implementation: load candidates, then one overlap query per vehicle
+    duration_hours = -(-(end_at - start_at).total_seconds() // 3600)
+    buffer_start = start_at - BOOKING_BUFFER
+    buffer_end = end_at + BOOKING_BUFFER
+    vehicles = session.query(Vehicle).filter(
+        Vehicle.type == vehicle_type,
+        Vehicle.is_deleted == False,
+        Vehicle.vehicle_mileage < Vehicle.mileage_threshold,
+        Vehicle.min_rent_hours <= duration_hours,
+        Vehicle.max_rent_hours >= duration_hours
+    ).all()
+    available = []
+    for vehicle in vehicles:
+        overlapping = session.query(Rental).filter(
+            Rental.vehicle_id == vehicle.id,
+            Rental.booking_status.in_(BLOCKING_BOOKING_STATUSES),
+            Rental.approval_status.in_(BLOCKING_APPROVAL_STATUSES),
+            Rental.start_at < buffer_end,
+            Rental.end_at > buffer_start
+        ).first()
+        if not overlapping:
+            available.append(vehicle)
+    return available
+
+
+def run(fleet_sizes=FLEET_SIZES):
+    rows = []
+    now = datetime.utcnow()
+    start_at = now + timedelta(days=10)
+    end_at = start_at + timedelta(hours=24)
+    for size in fleet_sizes:
+        engine, Session = temp_database(f"search_{size}.db")
+        build_fleet(Session(), size, now)
+
+        session = Session()
+        index = AvailabilityIndex.load(session)
+        # warm the catalog so the timed search measures hits
+        catalog = VehicleCatalog()
+        catalog.vehicles_of_type(session, VehicleType.SEDAN)
+        session.close()
+
+        results = {}
+        search = lambda s: RentalService(s).search_available_vehicles(VehicleType.SEDAN, start_at, end_at)
+        for label, search, info in (("legacy", lambda s: legacy_search(s, VehicleType.SEDAN, start_at, end_at), {}),
+                                    ("single query", search, {}),
+                                    ("in-memory index", search, {SESSION_KEY: index}),
+                                    ("vehicle catalog", search, {CATALOG_KEY: catalog}),
+                                    ("catalog + index", search, {CATALOG_KEY: catalog, SESSION_KEY: index})):
+            session = Session(info=info)
+            stats = {}
+            with QueryCounter(engine) as counter, timer(stats):
+                found = search(session)
+            session.close()
+            results[label] = [v.id for v in found]
+            rows.append([size, label, counter.count, f"{stats['ms']:.1f}", len(found)])
+
+        # all implementations must agree before the numbers mean anything
+        if len({tuple(ids) for ids in results.values()}) != 1:
+            sys.exit(f"result mismatch at fleet size {size}")
+        engine.dispose()
+    print(tabulate(rows, headers=["Fleet", "Implementation", "Queries", "Latency (ms)", "Available"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or FLEET_SIZES)
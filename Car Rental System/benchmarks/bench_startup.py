@@ -0,0 +1,82 @@
+# Startup benchmark for short-lived `python start.py` invocations.
+# Times `--help` and single commands against an up-to-date database in fresh
+# interpreters, compares the medians with a wall-clock budget and lists the
+# slowest imports reported by `python -X importtime`. Exits with status 1 when a
+# command is over budget. Run from the project folder:
+#   python -m benchmarks.bench_startup [runs]
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+from tabulate import tabulate
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (arguments, wall-clock budget in ms); budgets include interpreter startup
+COMMANDS = [
+    (["--help"], 150),
+    (["sweep-noshows"], 700),
+    (["rebuild-stats"], 700),
+]
+
+RUNS = 5
+SLOWEST_IMPORTS = 8
+
+
+def run_start(args: List[str], env: Dict[str, str], *options: str) -> Tuple[float, str]:
+    # wall-clock ms and stderr of one `python start.py ...` in a new interpreter
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, *options, "start.py", *args], cwd=PROJECT_DIR, env=env,
+                            capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        sys.exit(f"start.py {' '.join(args)} failed:\n{result.stderr}")
+    return elapsed, result.stderr
+
+
+def slowest_imports(importtime_output: str, count: int) -> List[Tuple[str, float]]:
+    # top-level packages by cumulative import time, from -X importtime lines
+    totals = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # one space of indent marks a top-level import
+            totals.append((name.strip(), int(cumulative) / 1000))
+    return sorted(totals, key=lambda item: -item[1])[:count]
+
+
+def run(runs: int = RUNS):
+    folder = tempfile.mkdtemp(prefix="car_rental_bench_")
+    env = dict(os.environ, CAR_RENTAL_DATABASE_URL="sqlite:///" + os.path.join(folder, "startup.db"))
+    run_start(["rebuild-stats"], env)  # create the database once, the timed runs find it current
+
+    rows, imports, over_budget = [], [], False
+    for args, budget_ms in COMMANDS:
+        samples = [run_start(args, env)[0] for _ in range(runs)]
+        median = statistics.median(samples)
+        over_budget |= median > budget_ms
+        rows.append([" ".join(args), f"{median:.0f}", f"{min(samples):.0f}", budget_ms,
+                     "ok" if median <= budget_ms else "OVER"])
+        _, stderr = run_start(args, env, "-X", "importtime")
+        imports.append([" ".join(args), ", ".join(f"{name} {ms:.0f}" for name, ms in slowest_imports(stderr, SLOWEST_IMPORTS))])
+
+    baseline = statistics.median(run_start_bare() for _ in range(runs))
+    print(f"bare interpreter: {baseline:.0f} ms")
+    print(tabulate(rows, headers=["Command", "Median (ms)", "Min (ms)", "Budget (ms)", ""], tablefmt="grid"))
+    print(tabulate(imports, headers=["Command", "Slowest top-level imports (ms)"], tablefmt="grid"))
+    if over_budget:
+        sys.exit(1)
+
+
+def run_start_bare() -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return (time.perf_counter() - started) * 1000
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:2]])
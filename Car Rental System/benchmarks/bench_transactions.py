@@ -0,0 +1,86 @@
+# Benchmark for transaction() blocks spanning several service calls (src/database.py).
+# Runs two composite workflows, "register + book" and "return + rebook", once with a
+# commit per service call and once grouped in one transaction() per workflow, and
+# prints the COMMIT count and wall-clock time for SQLite's NORMAL and FULL
+# synchronous modes. Run from the project folder:
+#   python -m benchmarks.bench_transactions [workflows]
+import sys
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from tabulate import tabulate
+from benchmarks.common import temp_database, timer
+from src.admin_service import AdminService
+from src.auth_service import AuthService
+from src.database import transaction
+from src.models import PaymentMethod, VehicleType
+from src.rental_service import RentalService
+from src.vehicle_service import VehicleService
+
+WORKFLOWS = 200
+SYNCHRONOUS_MODES = ["NORMAL", "FULL"]
+
+
+def register_and_book(session, i: int, grouped: bool, start_at: datetime):
+    # a new customer books vehicle i; the password hash is precomputed, bcrypt is not measured
+    with transaction(session) if grouped else nullcontext():
+        user = AuthService(session).create_user("Bench", "User", f"bench{i}@example.com", "1234567890", "x")
+        return RentalService(session).create_booking(user.id, i + 1, start_at, start_at + timedelta(hours=4))
+
+
+def return_and_rebook(session, booking, grouped: bool, start_at: datetime):
+    # the booked vehicle comes back (mileage update) and the customer books it again
+    with transaction(session) if grouped else nullcontext():
+        AdminService(session).return_vehicle(booking.id, 50100, 0, "", PaymentMethod.CARD)
+        RentalService(session).create_booking(booking.user_id, booking.vehicle_id, start_at + timedelta(days=2),
+                                              start_at + timedelta(days=2, hours=4))
+
+
+def run_once(workflows: int, synchronous: str, grouped: bool):
+    engine, Session = temp_database(f"transactions_{synchronous}_{grouped}.db", sqlite_synchronous=synchronous)
+    session = Session()
+    vehicle_service = VehicleService(session)
+    for i in range(workflows):
+        vehicle_service.add_vehicle(f"BENCH{i:06d}", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    start_at = datetime.utcnow() + timedelta(days=1)
+
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(conn))
+    rows = []
+    bookings = []
+    stats = {}
+    with timer(stats):
+        for i in range(workflows):
+            bookings.append(register_and_book(session, i, grouped, start_at))
+    rows.append(["register + book", len(commits), stats["ms"]])
+
+    # issue the bookings outside the measurement
+    admin_service = AdminService(session)
+    admin_service.review_bookings([b.id for b in bookings], approve=True)
+    admin_service.issue_vehicles([b.id for b in bookings])
+    session.commit()
+    commits.clear()
+    with timer(stats):
+        for booking in bookings:
+            return_and_rebook(session, booking, grouped, start_at)
+    rows.append(["return + rebook", len(commits), stats["ms"]])
+    session.close()
+    engine.dispose()
+    return rows
+
+
+def run(workflows: int = WORKFLOWS):
+    table = []
+    for synchronous in SYNCHRONOUS_MODES:
+        per_call = run_once(workflows, synchronous, grouped=False)
+        grouped = run_once(workflows, synchronous, grouped=True)
+        for (name, calls_commits, calls_ms), (_, grouped_commits, grouped_ms) in zip(per_call, grouped):
+            table.append([name, synchronous, calls_commits, grouped_commits, f"{calls_ms / workflows:.2f}",
+                          f"{grouped_ms / workflows:.2f}"])
+    print(f"{workflows} workflows each")
+    print(tabulate(table, headers=["Workflow", "synchronous", "Commits (per call)", "Commits (transaction)",
+                                   "ms/workflow (per call)", "ms/workflow (transaction)"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    run(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from src.database import Database
+
+
+def temp_database(name: str = "bench.db", **settings):
+    # create a throwaway SQLite file with all tables and return (engine, session factory)
+    path = os.path.join(tempfile.mkdtemp(prefix="car_rental_bench_"), name)
+    db = Database.from_url(f"sqlite:///{path}", **settings)
+    return db.engine, db.session_factory
+
+
+class QueryCounter:
+    # counts SQL statements sent through an engine while active, BEGIN excluded
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, params, context, executemany):
+        if not statement.startswith("BEGIN"):
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+@contextmanager
+def timer(result: dict, key: str = "ms"):
+    # store the elapsed wall-clock milliseconds of the block in result[key]
+    started = time.perf_counter()
+    yield result
+    result[key] = (time.perf_counter() - started) * 1000
@@ -0,0 +1,160 @@
+# Load generator for the HTTP API (python start.py serve).
+# Client threads each hold one keep-alive connection, log in once, then send
+# availability searches (and optionally bookings) for a fixed time. Without
+# --url a server is started on a temporary, seeded database. Run from the project folder:
+#   python -m benchmarks.load_generator [--url http://127.0.0.1:8080] [--clients 32] [--seconds 10]
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+from sqlalchemy import insert
+from tabulate import tabulate
+from benchmarks.common import temp_database
+from src.models import User, Vehicle, VehicleType, Role
+from src.password_hasher import PasswordHasher
+
+FLEET_SIZE = 500
+USERS = 50
+PASSWORD = "Bench123"
+ROUNDS = 4  # bcrypt cost for the seeded users, the server is started with the same
+
+
+def seed(session):
+    # USERS customers and FLEET_SIZE vehicles spread over all types
+    password_hash = PasswordHasher(rounds=ROUNDS).hash(PASSWORD)
+    session.execute(insert(User), [dict(first_name="Load", last_name=str(i), email=f"load{i}@example.com",
+                                        mobile_number="1234567890", password_hash=password_hash, role=Role.MEMBER)
+                                   for i in range(USERS)])
+    types = list(VehicleType)
+    session.execute(insert(Vehicle), [
+        dict(plate=f"LOAD{i:06d}", model="Model", type=types[i % len(types)], year=2020, vehicle_mileage=0,
+             mileage_threshold=100000, min_rent_hours=1, max_rent_hours=72, hourly_rate_cents=500, is_deleted=False)
+        for i in range(FLEET_SIZE)
+    ])
+    session.commit()
+
+
+def start_server(port: int, threads: int, processes: int):
+    # seeded throwaway database and a `start.py serve` process on it
+    engine, Session = temp_database("load.db")
+    session = Session()
+    seed(session)
+    session.close()
+    engine.dispose()
+    env = dict(os.environ, CAR_RENTAL_DATABASE_URL=str(engine.url), CAR_RENTAL_BCRYPT_ROUNDS=str(ROUNDS),
+               CAR_RENTAL_API_THREADS=str(threads), CAR_RENTAL_API_PROCESSES=str(processes))
+    server = subprocess.Popen([sys.executable, "start.py", "serve", str(port)], env=env, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health")
+            connection.getresponse().read()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("API server did not start.")
+
+
+class Worker(threading.Thread):
+    def __init__(self, host: str, port: int, client_id: int, stop_at: float, book_ratio: float):
+        super().__init__(daemon=True)
+        self.connection = http.client.HTTPConnection(host, port, timeout=30)
+        self.client_id = client_id
+        self.stop_at = stop_at
+        self.book_ratio = book_ratio
+        self.latencies = []
+        self.errors = 0
+        self.token = None
+
+    def call(self, method: str, path: str, body=None):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        started = time.perf_counter()
+        self.connection.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = self.connection.getresponse()
+        payload = json.loads(response.read())
+        self.latencies.append(time.perf_counter() - started)
+        if response.status >= 500:
+            self.errors += 1
+        return response.status, payload
+
+    def run(self):
+        rnd = random.Random(self.client_id)
+        status, payload = self.call("POST", "/login", {"email": f"load{self.client_id % USERS}@example.com",
+                                                       "password": PASSWORD})
+        if status != 200:
+            self.errors += 1
+            return
+        self.token = payload["token"]
+        types = [t.value for t in VehicleType]
+        while time.time() < self.stop_at:
+            start_at = (datetime.utcnow() + timedelta(hours=rnd.randint(24, 24 * 60))).replace(microsecond=0)
+            end_at = start_at + timedelta(hours=rnd.randint(1, 48))
+            if rnd.random() < self.book_ratio:
+                # booking conflicts are expected (400), only server errors count
+                self.call("POST", "/bookings", {"vehicle_id": rnd.randint(1, FLEET_SIZE),
+                                                "start_at": start_at.isoformat(), "end_at": end_at.isoformat()})
+            else:
+                self.call("GET", f"/vehicles/available?type={rnd.choice(types)}"
+                                 f"&start_at={start_at.isoformat()}&end_at={end_at.isoformat()}")
+
+
+def percentile(values, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def run(url: str, clients: int, seconds: float, book_ratio: float):
+    target = urlsplit(url)
+    stop_at = time.time() + seconds
+    workers = [Worker(target.hostname, target.port or 80, i, stop_at, book_ratio) for i in range(clients)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for worker in workers for latency in worker.latencies)
+    errors = sum(worker.errors for worker in workers)
+    print(f"{clients} clients for {seconds:.0f}s against {url}, {book_ratio:.0%} bookings")
+    print(tabulate([[len(latencies), errors, f"{len(latencies) / elapsed:.0f}",
+                     f"{percentile(latencies, 0.5) * 1000:.1f}", f"{percentile(latencies, 0.95) * 1000:.1f}",
+                     f"{percentile(latencies, 0.99) * 1000:.1f}"]],
+                   headers=["Requests", "Errors", "Requests/s", "p50 ms", "p95 ms", "p99 ms"], tablefmt="grid"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the car rental HTTP API.")
+    parser.add_argument("--url", help="running server; omit to start one on a temporary database")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--book-ratio", type=float, default=0.1, help="share of requests that create bookings")
+    parser.add_argument("--port", type=int, default=8765, help="port for the temporary server")
+    parser.add_argument("--threads", type=int, default=64, help="worker threads of the temporary server")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                        help="worker processes of the temporary server")
+    args = parser.parse_args()
+
+    if args.url:
+        run(args.url, args.clients, args.seconds, args.book_ratio)
+        return
+    server = start_server(args.port, args.threads, args.processes)
+    try:
+        run(f"http://127.0.0.1:{args.port}", args.clients, args.seconds, args.book_ratio)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# Benchmark suite for the booking engine on synthetic databases (db/synthetic.py).
+# Times search, booking, cancellation, admin reports and login at a given scale
+# and writes the results as JSON, so two runs can be diffed. Run from the project folder:
+#   python -m benchmarks.suite --scale 1k --output results/1k.json
+#   python -m benchmarks.suite --compare results/before.json results/after.json
+# Generated databases are cached in --data-dir and copied before every run, so
+# write benchmarks always start from the same state.
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+from tabulate import tabulate
+from db.migrations import SCHEMA_VERSION
+from db.synthetic import PASSWORD, build_database
+from src.admin_service import AdminService
+from src.auth_service import AuthService
+from src.database import Database
+from src.models import Vehicle, VehicleType
+from src.password_hasher import get_default_hasher
+from src.rental_service import RentalService
+
+# (vehicles, users, rentals) per named scale
+SCALES = {
+    "1k": (1_000, 1_000, 100_000),
+    "10k": (10_000, 10_000, 1_000_000),
+    "100k": (100_000, 50_000, 1_000_000),
+}
+
+# timed repetitions per operation
+REPEATS = {"search": 30, "create_booking": 50, "cancel_booking": 50, "report": 5, "login": 5}
+
+# a change counts as a regression when its median grows by more than this
+REGRESSION_THRESHOLD = 0.20
+
+SEED = 1
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    # milliseconds
+    samples = sorted(samples)
+    return dict(runs=len(samples), median_ms=round(statistics.median(samples), 3),
+                p95_ms=round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+                min_ms=round(samples[0], 3), max_ms=round(samples[-1], 3))
+
+
+def measure(repeats: int, operation: Callable[[int], object]) -> Dict[str, float]:
+    samples = []
+    for i in range(repeats):
+        started = time.perf_counter()
+        operation(i)
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def cached_database(data_dir: str, scale: str, seed: int) -> str:
+    # generate the scale once per schema version and seed, return the cached file
+    vehicles, users, rentals = SCALES[scale]
+    path = os.path.join(data_dir, f"synthetic_{scale}_seed{seed}_v{SCHEMA_VERSION}.db")
+    if not os.path.exists(path):
+        print(f"Generating {scale} database ({vehicles} vehicles, {rentals} rentals)...", flush=True)
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        build_database(partial, vehicles, users, rentals, seed).dispose()
+        os.replace(partial, path)
+    return path
+
+
+def run_suite(db: Database, seed: int) -> Dict[str, Dict[str, float]]:
+    rnd = random.Random(seed)
+    session = db.get_session()
+    now = datetime.utcnow()
+    vehicle_count = session.query(Vehicle).count()
+    results = {}
+
+    def window(i):
+        start_at = now + timedelta(days=rnd.randint(1, 60), hours=rnd.randint(0, 23))
+        return start_at, start_at + timedelta(hours=rnd.choice([4, 24, 48]))
+
+    types = list(VehicleType)
+    results["search_available_vehicles"] = measure(
+        REPEATS["search"], lambda i: RentalService(session).search_available_vehicles(types[i % len(types)], *window(i)))
+
+    # bookings on random cars; conflicts are part of the workload, like real traffic
+    created = []
+
+    def book(i):
+        start_at, end_at = window(i)
+        try:
+            created.append(RentalService(session).create_booking(2 + i, rnd.randint(1, vehicle_count), start_at, end_at).id)
+        except ValueError:
+            session.rollback()
+    results["create_booking"] = measure(REPEATS["create_booking"], book)
+    results["create_booking"]["succeeded"] = len(created)
+
+    results["cancel_booking"] = measure(
+        min(REPEATS["cancel_booking"], len(created)),
+        lambda i: RentalService(session).cancel_booking(created[i], "CUSTOMER", "Benchmark"))
+
+    admin = AdminService(session)
+    results["report_bookings_first_page"] = measure(REPEATS["report"], lambda i: next(admin.get_bookings_pages(), []))
+    results["report_no_shows"] = measure(REPEATS["report"], lambda i: admin.get_no_show_bookings())
+    results["report_cancelled_stream"] = measure(
+        REPEATS["report"], lambda i: sum(1 for _ in admin.stream_cancelled_bookings(page_size=1000)))
+    results["report_user_bookings"] = measure(
+        REPEATS["report"], lambda i: RentalService(session).get_user_bookings(2 + i))
+
+    # login with the configured bcrypt cost (CAR_RENTAL_BCRYPT_ROUNDS); the synthetic
+    # users are hashed cheaply, so use a user registered with that cost
+    auth = AuthService(session, get_default_hasher())
+    auth.register("Bench", "User", "bench@synthetic.test", "1234567890", PASSWORD)
+    results["login"] = measure(REPEATS["login"], lambda i: auth.login("bench@synthetic.test", PASSWORD))
+    results["login"]["bcrypt_rounds"] = auth.hasher.rounds
+    session.close()
+    return results
+
+
+def metadata(scale: str, seed: int) -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    vehicles, users, rentals = SCALES[scale]
+    return dict(scale=scale, vehicles=vehicles, users=users, rentals=rentals, seed=seed, commit=commit,
+                schema_version=SCHEMA_VERSION, python=platform.python_version(), sqlite=sqlite3.sqlite_version,
+                machine=platform.machine(), cpus=os.cpu_count(), timestamp=datetime.utcnow().isoformat())
+
+
+def run(scales: List[str], data_dir: str, output: str = None, seed: int = SEED) -> Dict:
+    os.makedirs(data_dir, exist_ok=True)
+    report = {}
+    for scale in scales:
+        # fresh copy of the cached data for every run
+        work_dir = tempfile.mkdtemp(prefix="car_rental_suite_")
+        path = os.path.join(work_dir, "suite.db")
+        shutil.copyfile(cached_database(data_dir, scale, seed), path)
+        db = Database.from_url(f"sqlite:///{path}")
+        try:
+            report[scale] = dict(meta=metadata(scale, seed), results=run_suite(db, seed))
+        finally:
+            db.dispose()
+            shutil.rmtree(work_dir, ignore_errors=True)
+        print_results(scale, report[scale]["results"])
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+    return report
+
+
+def print_results(scale: str, results: Dict):
+    rows = [[name, r["runs"], r["median_ms"], r["p95_ms"], r["min_ms"], r["max_ms"]] for name, r in results.items()]
+    print(f"\nScale {scale}")
+    print(tabulate(rows, headers=["Operation", "Runs", "Median ms", "p95 ms", "Min ms", "Max ms"], tablefmt="grid"))
+
+
+def compare(before_path: str, after_path: str, threshold: float = REGRESSION_THRESHOLD) -> bool:
+    # print median changes per operation, True when nothing regressed beyond the threshold
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    ok = True
+    rows = []
+    for scale in sorted(set(before) & set(after)):
+        for name, result in after[scale]["results"].items():
+            old = before[scale]["results"].get(name)
+            if old is None or not old["median_ms"]:
+                continue
+            change = result["median_ms"] / old["median_ms"] - 1
+            flag = "REGRESSION" if change > threshold else ""
+            ok = ok and not flag
+            rows.append([scale, name, old["median_ms"], result["median_ms"], f"{change:+.1%}", flag])
+    print(tabulate(rows, headers=["Scale", "Operation", "Before ms", "After ms", "Change", ""], tablefmt="grid"))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the booking engine on synthetic data.")
+    parser.add_argument("--scale", action="append", choices=list(SCALES),
+                        help="scale to run, repeat for several (default: 1k)")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "car_rental_synthetic"),
+                        help="where generated databases are cached")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="median slowdown that counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, threshold=args.threshold) else 1)
+    run(args.scale or ["1k"], args.data_dir, args.output, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Versioned schema migrations for existing databases.
+# The applied version is kept in SQLite's `PRAGMA user_version` (a `schema_version`
+# table on other databases). Each migration
+# module upgrades the schema by exactly one version and must also be safe on a
+# fresh database created by `Base.metadata.create_all`, which already has the
+# latest tables and indexes. ensure_schema() reads the version on startup and only
+# creates tables and migrates when it is behind, so an up-to-date database costs
+# one PRAGMA instead of a table check per model.
+from sqlalchemy import text
+from db.migrations import (v001_hot_path_indexes, v002_daily_stats, v003_rentals_archive, v004_updated_at_indexes,
+                           v005_rental_id_sequence, v006_reject_reason)
+
+# ordered list of migrations, position + 1 is the version each one produces
+MIGRATIONS = [
+    v001_hot_path_indexes,
+    v002_daily_stats,
+    v003_rentals_archive,
+    v004_updated_at_indexes,
+    v005_rental_id_sequence,
+    v006_reject_reason,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(connection) -> int:
+    # read the version recorded in the database header
+    if connection.dialect.name == "sqlite":
+        return connection.execute(text("PRAGMA user_version")).scalar()
+    connection.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    return connection.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def set_schema_version(connection, version: int) -> None:
+    if connection.dialect.name == "sqlite":
+        # PRAGMA does not accept bound parameters
+        connection.execute(text(f"PRAGMA user_version = {int(version)}"))
+    else:
+        connection.execute(text("DELETE FROM schema_version"))
+        connection.execute(text("INSERT INTO schema_version (version) VALUES (:version)"), {"version": version})
+
+
+def ensure_schema(engine, metadata) -> int:
+    # bring a new or older database to SCHEMA_VERSION, nothing else when it is current
+    with engine.connect() as connection:
+        return ensure_schema_connection(connection, metadata)
+
+
+def ensure_schema_connection(connection, metadata) -> int:
+    # same as ensure_schema() on an open connection, e.g. inside AsyncConnection.run_sync
+    current = get_schema_version(connection)
+    connection.commit()
+    if current == SCHEMA_VERSION:
+        return current
+    if current < SCHEMA_VERSION:
+        # new tables first, the migrations add indexes and backfills on top
+        metadata.create_all(connection)
+        connection.commit()
+    return migrate_connection(connection)
+
+
+def migrate(engine) -> int:
+    # apply every pending migration, one transaction per version
+    with engine.connect() as connection:
+        return migrate_connection(connection)
+
+
+def migrate_connection(connection) -> int:
+    # same as migrate() on an open connection, e.g. inside AsyncConnection.run_sync
+    current = get_schema_version(connection)
+    connection.commit()
+    if current > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {current} is newer than this application ({SCHEMA_VERSION}).")
+
+    for version, migration in enumerate(MIGRATIONS[current:], start=current + 1):
+        try:
+            migration.upgrade(connection)
+            set_schema_version(connection, version)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+    return SCHEMA_VERSION
@@ -0,0 +1,21 @@
+# Version 1: secondary indexes for the rentals and vehicles hot paths.
+from sqlalchemy import text
+
+DESCRIPTION = "Composite indexes for availability, booking listings and reports"
+
+STATEMENTS = [
+    # overlap checks and has_active_bookings only read blocking bookings of one vehicle
+    "CREATE INDEX IF NOT EXISTS ix_rentals_blocking_window ON rentals (vehicle_id, start_at, end_at) "
+    "WHERE booking_status IN ('REQUESTED', 'ACTIVE')",
+    # per-customer booking listing
+    "CREATE INDEX IF NOT EXISTS ix_rentals_user_id ON rentals (user_id)",
+    # no-show and cancellation reports
+    "CREATE INDEX IF NOT EXISTS ix_rentals_status_approval_start ON rentals (booking_status, approval_status, start_at)",
+    # availability search filters vehicles by type among the non-deleted ones
+    "CREATE INDEX IF NOT EXISTS ix_vehicles_type_is_deleted ON vehicles (type, is_deleted)",
+]
+
+
+def upgrade(connection) -> None:
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
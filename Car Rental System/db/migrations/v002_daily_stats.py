@@ -0,0 +1,14 @@
+# Version 2: daily revenue and utilization summary tables, filled from the existing rentals.
+
+DESCRIPTION = "Summary tables for finance reports, backfilled from rentals"
+
+
+def upgrade(connection) -> None:
+    # models and the rebuild live in the application; imported here so importing
+    # db.migrations stays cheap
+    from src.aggregates import rebuild_stats
+    from src.models import DailyRevenueStats, DailyVehicleStats, Rental
+
+    DailyVehicleStats.__table__.create(connection, checkfirst=True)
+    DailyRevenueStats.__table__.create(connection, checkfirst=True)
+    rebuild_stats(connection, models=(Rental,))  # the archive only exists from version 3
@@ -0,0 +1,9 @@
+# Version 3: archive table for completed and cancelled rentals (src/archive.py).
+
+DESCRIPTION = "rentals_archive table with the rental columns"
+
+
+def upgrade(connection) -> None:
+    from src.models import ArchivedRental
+
+    ArchivedRental.__table__.create(connection, checkfirst=True)
@@ -0,0 +1,14 @@
+# Version 4: updated_at indexes for incremental analytics exports (src/export.py).
+from sqlalchemy import text
+
+DESCRIPTION = "updated_at indexes on rentals and rentals_archive"
+
+STATEMENTS = [
+    "CREATE INDEX IF NOT EXISTS ix_rentals_updated_at ON rentals (updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_rentals_archive_updated_at ON rentals_archive (updated_at)",
+]
+
+
+def upgrade(connection) -> None:
+    for statement in STATEMENTS:
+        connection.execute(text(statement))
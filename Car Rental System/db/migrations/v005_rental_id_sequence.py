@@ -0,0 +1,36 @@
+# Version 5: rental ids are never reused once the rental is archived (src/archive.py).
+# SQLite hands the highest free rowid to new rows unless the table is AUTOINCREMENT,
+# so after the newest rentals moved to rentals_archive a new booking could take one
+# of their ids. The rentals table is rebuilt with AUTOINCREMENT and its sequence
+# starts above every archived id; other databases use sequences that never go back.
+from sqlalchemy import text
+
+DESCRIPTION = "rentals rebuilt with AUTOINCREMENT ids above the archived ones"
+
+
+def upgrade(connection) -> None:
+    if connection.dialect.name != "sqlite":
+        return
+    from sqlalchemy.schema import CreateTable
+    from src.models import Rental
+
+    table_sql = connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'rentals'")).scalar()
+    if "AUTOINCREMENT" not in table_sql.upper():
+        # new table, copy, drop the old one with its indexes, rename, recreate indexes
+        create = str(CreateTable(Rental.__table__).compile(dialect=connection.dialect)).strip()
+        connection.execute(text(create.replace("CREATE TABLE rentals ", "CREATE TABLE rentals_rebuild ", 1)))
+        # the model may have columns later migrations add, copy the ones the old table has
+        columns = ", ".join(row[1] for row in connection.execute(text("PRAGMA table_info(rentals)")))
+        connection.execute(text(f"INSERT INTO rentals_rebuild ({columns}) SELECT {columns} FROM rentals"))
+        connection.execute(text("DROP TABLE rentals"))
+        connection.execute(text("ALTER TABLE rentals_rebuild RENAME TO rentals"))
+        for index in Rental.__table__.indexes:
+            index.create(connection)
+
+    # continue after the highest id either table or the sequence has seen
+    highest = connection.execute(text(
+        "SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM rentals UNION ALL SELECT MAX(id) FROM rentals_archive "
+        "UNION ALL SELECT seq FROM sqlite_sequence WHERE name = 'rentals')")).scalar()
+    if highest:
+        connection.execute(text("DELETE FROM sqlite_sequence WHERE name = 'rentals'"))
+        connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('rentals', :seq)"), {"seq": highest})
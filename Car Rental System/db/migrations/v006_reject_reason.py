@@ -0,0 +1,15 @@
+# Version 6: reject_reason column on rentals and rentals_archive, so the reason an
+# admin gives when rejecting a booking is stored.
+from sqlalchemy import inspect, text
+
+DESCRIPTION = "reject_reason column on both rentals tables"
+
+TABLES = ["rentals", "rentals_archive"]
+
+
+def upgrade(connection) -> None:
+    inspector = inspect(connection)
+    for table in TABLES:
+        # a fresh database from create_all already has the column
+        if "reject_reason" not in {column["name"] for column in inspector.get_columns(table)}:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN reject_reason VARCHAR"))
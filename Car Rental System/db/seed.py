@@ -1,6 +1,6 @@
 from src.database import Database
 from src.models import User, Vehicle, Role, VehicleType
-import bcrypt
+from src.password_hasher import get_default_hasher
 from datetime import datetime
 
 def seed_database(db: Database):
@@ -9,7 +9,7 @@ def seed_database(db: Database):
     # Seed admin user if not already in database
     admin = session.query(User).filter(User.email == "dinashaper@gmail.com").first()
     if not admin:
-        hashed = bcrypt.hashpw("Abc546&".encode("utf-8"), bcrypt.gensalt()).decode("utf-8")  # hash the password
+        hashed = get_default_hasher(db.settings).hash("Abc546&")  # hash the password
         admin = User(
             first_name="Admin",
             last_name="User",
@@ -0,0 +1,205 @@
+# Reproducible synthetic data for benchmarks: a fleet, customers and a rental
+# history around "now". The same arguments and seed always give the same rows.
+#
+# Rentals are spread over the fleet with a long-tailed popularity (a few cars
+# take most bookings), durations are log-normal around a day, and each car's
+# blocking rentals never overlap, as the booking rules guarantee. A share of
+# rejected or cancelled requests is placed on top of existing bookings, like
+# customers asking for cars that are already taken.
+#
+#   python -m db.synthetic db/synthetic.db --vehicles 10000 --users 5000 --rentals 1000000 --seed 1
+import argparse
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+from sqlalchemy import insert
+from src.aggregates import rebuild_stats
+from src.database import Database
+from src.models import (User, Vehicle, Rental, Role, VehicleType, ApprovalStatus, BookingStatus, PaymentMethod)
+from src.password_hasher import PasswordHasher
+from src.rental_service import BOOKING_BUFFER
+
+# rows per INSERT batch
+CHUNK_SIZE = 10_000
+
+# password of every generated user, hashed once with a low cost
+PASSWORD = "Synthetic1"
+
+# share of each vehicle type in the fleet and its hourly rate range in cents
+TYPE_MIX = {
+    VehicleType.SEDAN: (0.35, 400, 700),
+    VehicleType.SUV: (0.25, 600, 1000),
+    VehicleType.HATCHBACK: (0.20, 300, 500),
+    VehicleType.VAN: (0.10, 700, 1100),
+    VehicleType.TRUCK: (0.10, 800, 1400),
+}
+
+# history before now and bookings ahead of now
+HISTORY = timedelta(days=365)
+HORIZON = timedelta(days=90)
+
+# shares of special cases
+DELETED_VEHICLES = 0.01
+CONFLICTING_REQUESTS = 0.08  # rejected/cancelled requests overlapping another booking
+CANCELLED_BOOKINGS = 0.07
+NO_SHOWS = 0.01  # approved, never issued, start already passed
+
+
+def _chunks(rows, size: int = CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _vehicles(rnd: random.Random, count: int):
+    types = list(TYPE_MIX)
+    weights = [TYPE_MIX[t][0] for t in types]
+    for i in range(count):
+        vehicle_type = rnd.choices(types, weights)[0]
+        _, low_rate, high_rate = TYPE_MIX[vehicle_type]
+        threshold = rnd.choice([60000, 80000, 100000, 150000])
+        min_hours = rnd.choice([1, 2, 4])
+        yield dict(plate=f"SYN{i:07d}", model=f"{vehicle_type.value.title()} {i % 40}", type=vehicle_type,
+                   year=rnd.randint(2012, 2024), vehicle_mileage=round(rnd.uniform(0, threshold * 1.05), 1),
+                   mileage_threshold=threshold, min_rent_hours=min_hours,
+                   max_rent_hours=rnd.choice([24, 48, 72, 168]), hourly_rate_cents=rnd.randint(low_rate, high_rate),
+                   is_deleted=rnd.random() < DELETED_VEHICLES)
+
+
+def _users(count: int, password_hash: str):
+    # the first user is an admin, the rest are customers
+    for i in range(count):
+        yield dict(first_name="Synthetic", last_name=f"User{i}", email=f"user{i}@synthetic.test",
+                   mobile_number=f"{5550000000 + i % 10_000_000:010d}", password_hash=password_hash,
+                   role=Role.ADMIN if i == 0 else Role.MEMBER)
+
+
+def _rentals(rnd: random.Random, vehicles, users: int, count: int, now: datetime):
+    # assign bookings to cars with Zipf-like popularity, then lay each car's bookings on a timeline
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(len(vehicles))]
+    rnd.shuffle(weights)
+    per_vehicle = [0] * len(vehicles)
+    for index in rnd.choices(range(len(vehicles)), weights, k=count):
+        per_vehicle[index] += 1
+
+    span_hours = (HISTORY + HORIZON).total_seconds() / 3600
+    for (vehicle_id, min_hours, max_hours, rate, mileage), bookings in zip(vehicles, per_vehicle):
+        if not bookings:
+            continue
+        # average free time between bookings so the timeline roughly fills the span;
+        # busy cars simply get a longer history
+        mean_gap = max(1.0, span_hours / bookings - 24)
+        cursor = 0.0
+        timeline = []
+        for _ in range(bookings):
+            hours = min(max_hours, max(min_hours, round(rnd.lognormvariate(3.2, 0.8))))
+            conflicting = rnd.random() < CONFLICTING_REQUESTS
+            timeline.append((cursor, hours, conflicting))
+            if not conflicting:
+                # the next booking starts after the buffer plus some idle time
+                cursor += hours + BOOKING_BUFFER.total_seconds() / 3600 + rnd.expovariate(1 / mean_gap)
+
+        # the car's last booking ends somewhere inside the booking horizon
+        last_start, last_hours, _ = timeline[-1]
+        origin = now + timedelta(hours=rnd.uniform(0, HORIZON.total_seconds() / 3600) - last_start - last_hours)
+        for offset, hours, conflicting in timeline:
+            start_at = origin + timedelta(hours=offset)
+            row = dict(vehicle_id=vehicle_id, user_id=rnd.randint(1, users), start_at=start_at,
+                       end_at=start_at + timedelta(hours=hours), initial_rental_cents=hours * rate,
+                       total_rental_cents=hours * rate, surcharge_cents=0,
+                       created_at=start_at - timedelta(days=rnd.uniform(0.5, 30)))
+            row.update(_lifecycle(rnd, row, now, conflicting, mileage))
+            yield row
+
+
+def _lifecycle(rnd: random.Random, row: Dict, now: datetime, conflicting: bool, mileage: float) -> Dict:
+    # statuses and timestamps consistent with where the booking sits relative to now
+    start_at, end_at = row["start_at"], row["end_at"]
+    if conflicting:
+        if rnd.random() < 0.5:
+            return dict(approval_status=ApprovalStatus.REJECTED, booking_status=BookingStatus.REQUESTED)
+        return dict(approval_status=ApprovalStatus.PENDING, booking_status=BookingStatus.CANCELLED,
+                    cancelled_at=row["created_at"] + timedelta(hours=1), cancelled_by="CUSTOMER",
+                    cancelled_reason="Vehicle unavailable")
+    if rnd.random() < CANCELLED_BOOKINGS:
+        return dict(approval_status=ApprovalStatus.APPROVED, booking_status=BookingStatus.CANCELLED,
+                    cancelled_at=min(now, start_at - timedelta(hours=rnd.uniform(1, 48))),
+                    cancelled_by=rnd.choice(["CUSTOMER", "CUSTOMER", "ADMIN"]), cancelled_reason="Plans changed")
+    if start_at > now:
+        return dict(approval_status=ApprovalStatus.APPROVED if rnd.random() < 0.6 else ApprovalStatus.PENDING,
+                    booking_status=BookingStatus.REQUESTED)
+    if rnd.random() < NO_SHOWS:
+        return dict(approval_status=ApprovalStatus.APPROVED, booking_status=BookingStatus.REQUESTED)
+    if end_at > now:
+        return dict(approval_status=ApprovalStatus.APPROVED, booking_status=BookingStatus.ACTIVE, issued_at=start_at)
+    surcharge = rnd.choice([0, 0, 0, 500, 1500])
+    return dict(approval_status=ApprovalStatus.APPROVED, booking_status=BookingStatus.COMPLETED, issued_at=start_at,
+                completed_at=end_at, paid_at=end_at, surcharge_cents=surcharge,
+                total_rental_cents=row["initial_rental_cents"] + surcharge,
+                payment_method=rnd.choice(list(PaymentMethod)),
+                ending_mileage=round(mileage * rnd.uniform(0.5, 1.0), 1))
+
+
+def generate(session, vehicles: int, users: int, rentals: int, seed: int = 0,
+             now: Optional[datetime] = None) -> Dict[str, int]:
+    # insert the synthetic rows into an empty database, returns row counts
+    if users < 1 or vehicles < 1:
+        raise ValueError("At least one user and one vehicle are needed.")
+    rnd = random.Random(seed)
+    now = now or datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    password_hash = PasswordHasher(rounds=4).hash(PASSWORD)
+
+    for chunk in _chunks(_users(users, password_hash)):
+        session.execute(insert(User), chunk)
+    fleet = []
+    for chunk in _chunks(_vehicles(rnd, vehicles)):
+        session.execute(insert(Vehicle), chunk)
+        fleet.extend(chunk)
+    # ids follow insertion order in an empty database
+    fleet = [(i, v["min_rent_hours"], v["max_rent_hours"], v["hourly_rate_cents"], v["vehicle_mileage"])
+             for i, v in enumerate(fleet, start=1)]
+    session.commit()
+
+    for chunk in _chunks(_rentals(rnd, fleet, users, rentals, now)):
+        session.execute(insert(Rental), chunk)
+        session.commit()
+    # rows were inserted directly, fill the finance summaries the services would keep
+    rebuild_stats(session)
+    session.commit()
+    return dict(vehicles=vehicles, users=users, rentals=rentals)
+
+
+def build_database(path: str, vehicles: int, users: int, rentals: int, seed: int = 0,
+                   now: Optional[datetime] = None) -> Database:
+    # new SQLite file at path filled with synthetic data
+    db = Database.from_url(f"sqlite:///{path}")
+    session = db.get_session()
+    try:
+        if session.query(Vehicle.id).first() is not None:
+            raise ValueError(f"{path} already has data.")
+        generate(session, vehicles, users, rentals, seed, now)
+    finally:
+        session.close()
+    return db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a SQLite database with synthetic rentals.")
+    parser.add_argument("path")
+    parser.add_argument("--vehicles", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rentals", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    build_database(args.path, args.vehicles, args.users, args.rentals, args.seed).dispose()
+    print(f"Created {args.path}: {args.vehicles} vehicles, {args.users} users, {args.rentals} rentals "
+          f"(password {PASSWORD!r}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,34 @@
-from sqlalchemy.orm import Session
-from src.models import Rental, Vehicle, Role, ApprovalStatus, BookingStatus
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session, joinedload
+from src.models import (Rental, ArchivedRental, User, Vehicle, Role, ApprovalStatus, BookingStatus, VehicleType,
+                        PaymentMethod, DailyRevenueStats, DailyVehicleStats)
+from src.aggregates import FleetUtilization, StatsBatch, vehicle_type, vehicle_types
+from src.database import after_commit, begin_write, commit
+from src.pagination import DEFAULT_PAGE_SIZE, keyset_pages, merged_keyset_pages, merged_stream, stream
+from src.projections import BookingRow, VehicleRow, as_row_pages, as_rows, booking_columns, vehicle_columns
 from src.auth_service import AuthService
-from datetime import datetime
+from src.availability_index import untrack_booking
+from src.vehicle_catalog import invalidate_vehicle, invalidate_vehicles
+from src.instrumentation import instrument_class
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import time
 
+# recorded as cancelled_by on bookings cancelled by the no-show sweeper
+SYSTEM_CANCELLER = "SYSTEM"
+NO_SHOW_REASON = "No-show: not picked up within the grace period."
+
+# no-shows cancelled per write transaction; the lock is released between batches
+SWEEP_BATCH_SIZE = 500
+
+
+class NoShowSweep(NamedTuple):
+    cancelled: int
+    batches: int
+    cutoff: datetime  # bookings that should have started before this were cancelled
+
+
+@instrument_class
 class AdminService:
     def __init__(self, db: Session):
         self.db = db
@@ -21,7 +47,9 @@ class AdminService:
             raise ValueError("Booking is not pending approval.")
         booking.approval_status = ApprovalStatus.APPROVED if approve else ApprovalStatus.REJECTED  
         booking.reject_reason = reason
-        self.db.commit()
+        commit(self.db)
+        if not approve:
+            after_commit(self.db, untrack_booking, self.db, booking_id)  # rejected bookings no longer block the vehicle
 
     def issue_vehicle(self, booking_id: int):
         # mark a booking as issued
@@ -34,7 +62,10 @@ class AdminService:
             raise ValueError("Booking is not in REQUESTED status.")
         booking.booking_status = BookingStatus.ACTIVE  
         booking.issued_at = datetime.utcnow()  
-        self.db.commit()
+        stats = StatsBatch()
+        stats.issued(booking.vehicle_id, vehicle_type(self.db, booking.vehicle_id), booking.issued_at)
+        stats.apply(self.db)  # summary rows change in the same transaction
+        commit(self.db)
 
     def return_vehicle(self, booking_id: int, ending_mileage: float, surcharge_cents: int, comment: str, payment_method: str):
         # complete a booking and update vehicle info
@@ -52,25 +83,328 @@ class AdminService:
         booking.completed_at = datetime.utcnow()  
         booking.paid_at = datetime.utcnow()  
         vehicle.vehicle_mileage = ending_mileage  # update vehicle mileage
-        self.db.commit()
+        stats = StatsBatch()
+        stats.returned(vehicle.id, vehicle.type, booking.issued_at or booking.start_at, booking.completed_at,
+                       booking.total_rental_cents, payment_method)
+        stats.apply(self.db)
+        commit(self.db)
+        after_commit(self.db, untrack_booking, self.db, booking_id)
+        after_commit(self.db, invalidate_vehicle, self.db, vehicle.id)
+
+    def _load_batch(self, booking_ids: Iterable[int], *columns) -> Tuple[Dict[int, tuple], Dict[int, Optional[str]]]:
+        # fetch the given columns for every id in one query under the write lock;
+        # returns rows by id and the result report with unknown or repeated ids filled in
+        ids, results = [], {}
+        for booking_id in booking_ids:
+            if booking_id in results:
+                continue
+            results[booking_id] = None
+            ids.append(booking_id)
+        begin_write(self.db)
+        rows = {row[0]: row for row in self.db.query(Rental.id, *columns).filter(Rental.id.in_(ids)).with_for_update()}
+        for booking_id in ids:
+            if booking_id not in rows:
+                results[booking_id] = "Booking not found."
+        return rows, results
+
+    def review_bookings(self, booking_ids: Iterable[int], approve: bool, reason: str = None) -> Dict[int, Optional[str]]:
+        # approve or reject many bookings in one transaction;
+        # returns an error message per id, None where the review was applied
+        rows, results = self._load_batch(booking_ids, Rental.approval_status)
+        valid = []
+        for booking_id, approval_status in rows.values():
+            if approval_status != ApprovalStatus.PENDING:
+                results[booking_id] = "Booking is not pending approval."
+            else:
+                valid.append(booking_id)
+        if valid:
+            self.db.execute(update(Rental).where(Rental.id.in_(valid)).values(
+                approval_status=ApprovalStatus.APPROVED if approve else ApprovalStatus.REJECTED,
+                reject_reason=reason))
+        commit(self.db)
+        if not approve:
+            for booking_id in valid:
+                after_commit(self.db, untrack_booking, self.db, booking_id)
+        return results
+
+    def issue_vehicles(self, booking_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        # issue many approved bookings in one transaction
+        rows, results = self._load_batch(booking_ids, Rental.approval_status, Rental.booking_status, Rental.vehicle_id)
+        valid = []
+        for booking_id, approval_status, booking_status, _ in rows.values():
+            if approval_status != ApprovalStatus.APPROVED:
+                results[booking_id] = "Booking not approved."
+            elif booking_status != BookingStatus.REQUESTED:
+                results[booking_id] = "Booking is not in REQUESTED status."
+            else:
+                valid.append(booking_id)
+        if valid:
+            now = datetime.utcnow()
+            self.db.execute(update(Rental).where(Rental.id.in_(valid)).values(
+                booking_status=BookingStatus.ACTIVE, issued_at=now))
+            types = vehicle_types(self.db, [rows[booking_id][3] for booking_id in valid])
+            stats = StatsBatch()
+            for booking_id in valid:
+                stats.issued(rows[booking_id][3], types[rows[booking_id][3]], now)
+            stats.apply(self.db)
+        commit(self.db)
+        return results
+
+    def return_vehicles(self, returns: Iterable[Tuple[int, float, int, PaymentMethod]]) -> Dict[int, Optional[str]]:
+        # complete many bookings from (booking id, ending mileage, surcharge cents, payment method)
+        # tuples in one transaction, updating vehicle mileage as well
+        returns = list(returns)
+        rows, results = self._load_batch([r[0] for r in returns], Rental.booking_status,
+                                         Rental.initial_rental_cents, Rental.vehicle_id,
+                                         Rental.issued_at, Rental.start_at)
+        now = datetime.utcnow()
+        rental_updates, vehicle_mileage, applied = [], {}, set()
+        types = vehicle_types(self.db, [row[3] for row in rows.values()])
+        stats = StatsBatch()
+        for booking_id, ending_mileage, surcharge_cents, payment_method in returns:
+            if booking_id in applied or booking_id not in rows:
+                continue
+            _, booking_status, initial_rental_cents, vehicle_id, issued_at, start_at = rows[booking_id]
+            if booking_status != BookingStatus.ACTIVE:
+                results[booking_id] = "Booking is not active."
+                continue
+            applied.add(booking_id)
+            rental_updates.append(dict(
+                id=booking_id, booking_status=BookingStatus.COMPLETED, ending_mileage=ending_mileage,
+                surcharge_cents=surcharge_cents, total_rental_cents=initial_rental_cents + surcharge_cents,
+                payment_method=payment_method, completed_at=now, paid_at=now))
+            vehicle_mileage[vehicle_id] = ending_mileage
+            stats.returned(vehicle_id, types[vehicle_id], issued_at or start_at, now,
+                           initial_rental_cents + surcharge_cents, payment_method)
+        if rental_updates:
+            self.db.execute(update(Rental), rental_updates)
+            self.db.execute(update(Vehicle), [dict(id=vehicle_id, vehicle_mileage=mileage)
+                                              for vehicle_id, mileage in vehicle_mileage.items()])
+            stats.apply(self.db)
+        commit(self.db)
+        for booking_id in applied:
+            after_commit(self.db, untrack_booking, self.db, booking_id)
+        after_commit(self.db, invalidate_vehicles, self.db, vehicle_mileage)
+        return results
+
+    def get_daily_revenue(self, start_day: date, end_day: date):
+        # (day, vehicle type, rentals, revenue cents) for returns between the two days, from the summary table
+        return self.db.query(
+            DailyRevenueStats.day, DailyRevenueStats.vehicle_type,
+            func.sum(DailyRevenueStats.rentals).label("rentals"),
+            func.sum(DailyRevenueStats.revenue_cents).label("revenue_cents")
+        ).filter(DailyRevenueStats.day.between(start_day, end_day)).group_by(
+            DailyRevenueStats.day, DailyRevenueStats.vehicle_type
+        ).order_by(DailyRevenueStats.day, DailyRevenueStats.vehicle_type).all()
+
+    def get_payment_mix(self, start_day: date, end_day: date):
+        # (payment method, rentals, revenue cents) for returns between the two days
+        return self.db.query(
+            DailyRevenueStats.payment_method,
+            func.sum(DailyRevenueStats.rentals).label("rentals"),
+            func.sum(DailyRevenueStats.revenue_cents).label("revenue_cents")
+        ).filter(DailyRevenueStats.day.between(start_day, end_day)).group_by(
+            DailyRevenueStats.payment_method
+        ).order_by(DailyRevenueStats.payment_method).all()
+
+    def get_fleet_utilization(self, start_day: date, end_day: date) -> List[FleetUtilization]:
+        # share of vehicle hours rented out between the two days, per vehicle type
+        rented = dict(self.db.query(DailyVehicleStats.vehicle_type, func.sum(DailyVehicleStats.rented_hours)).filter(
+            DailyVehicleStats.day.between(start_day, end_day)).group_by(DailyVehicleStats.vehicle_type).all())
+        fleet = dict(self.db.query(Vehicle.type, func.count(Vehicle.id)).filter(
+            Vehicle.is_deleted == False).group_by(Vehicle.type).all())
+        period_hours = max(0, (end_day - start_day).days + 1) * 24
+        report = []
+        for type_ in VehicleType:
+            vehicles, hours = fleet.get(type_, 0), rented.get(type_) or 0.0
+            capacity = vehicles * period_hours
+            report.append(FleetUtilization(type_, vehicles, round(hours, 1), round(hours / capacity, 4) if capacity else 0.0))
+        return report
 
     def get_no_show_bookings(self):
         # get bookings that were approved but never started (no-shows)
-        now = datetime.utcnow()
-        return self.db.query(Rental).filter(
-            Rental.approval_status == ApprovalStatus.APPROVED, 
-            Rental.booking_status == BookingStatus.REQUESTED,   
-            Rental.start_at < now
-        ).all()
+        return self._no_show_query(datetime.utcnow()).all()
+
+    def get_no_show_bookings_pages(self, page_size: int = DEFAULT_PAGE_SIZE,
+                                   after_id: Optional[int] = None) -> Iterator[List[Rental]]:
+        # pages of no-show bookings by id
+        return keyset_pages(self._no_show_query(datetime.utcnow()), Rental.id, page_size, after_id)
+
+    def _no_show_query(self, cutoff: datetime, *columns):
+        # approved bookings that should have started before cutoff but were never issued
+        query = self.db.query(*columns) if columns else self.db.query(Rental).options(joinedload(Rental.vehicle))
+        return query.filter(
+            Rental.approval_status == ApprovalStatus.APPROVED,
+            Rental.booking_status == BookingStatus.REQUESTED,
+            Rental.start_at < cutoff
+        )
+
+    def sweep_no_shows(self, grace: timedelta = timedelta(0), batch_size: int = SWEEP_BATCH_SIZE,
+                       pause: float = 0.0, now: Optional[datetime] = None) -> NoShowSweep:
+        # cancel every no-show older than the grace period as SYSTEM, one short write
+        # transaction per batch with an optional pause so other writers get the lock in between
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1.")
+        cutoff = (now or datetime.utcnow()) - grace
+        cancelled = batches = 0
+        while True:
+            begin_write(self.db)
+            # cancelled rows leave the filter, so every batch takes the oldest remaining ones
+            rows = self._no_show_query(cutoff, Rental.id, Rental.vehicle_id).order_by(
+                Rental.start_at).limit(batch_size).all()
+            if not rows:
+                commit(self.db)
+                break
+            cancelled_at = datetime.utcnow()
+            booking_ids = [booking_id for booking_id, _ in rows]
+            self.db.execute(update(Rental).where(Rental.id.in_(booking_ids)).values(
+                booking_status=BookingStatus.CANCELLED, cancelled_at=cancelled_at,
+                cancelled_by=SYSTEM_CANCELLER, cancelled_reason=NO_SHOW_REASON))
+            types = vehicle_types(self.db, [vehicle_id for _, vehicle_id in rows])
+            stats = StatsBatch()
+            for _, vehicle_id in rows:
+                stats.cancelled(vehicle_id, types[vehicle_id], cancelled_at)
+            stats.apply(self.db)
+            commit(self.db)
+            for booking_id in booking_ids:
+                after_commit(self.db, untrack_booking, self.db, booking_id)
+            cancelled += len(rows)
+            batches += 1
+            if len(rows) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+        return NoShowSweep(cancelled, batches, cutoff)
 
     def get_vehicles_over_mileage(self):
         # get vehicles that exceeded mileage threshold
         return self.db.query(Vehicle).filter(Vehicle.vehicle_mileage >= Vehicle.mileage_threshold).all()
 
-    def get_cancelled_bookings(self):
-        # get all cancelled bookings
-        return self.db.query(Rental).filter(Rental.booking_status == BookingStatus.CANCELLED).all() 
+    def list_vehicles_over_mileage(self) -> List[VehicleRow]:
+        # same as get_vehicles_over_mileage as read-only rows, for tables and JSON
+        return as_rows(VehicleRow, self.db.query(*vehicle_columns()).filter(
+            Vehicle.vehicle_mileage >= Vehicle.mileage_threshold).order_by(Vehicle.id))
+
+    def get_cancelled_bookings(self, include_archived: bool = False):
+        # get all cancelled bookings, archived ones too when asked for history
+        return [booking for model in self._rental_models(include_archived)
+                for booking in self.db.query(model).options(joinedload(model.vehicle)).filter(
+                    model.booking_status == BookingStatus.CANCELLED).all()]
+
+    def get_all_bookings(self, include_archived: bool = False):
+        # fetch all bookings with their vehicle and customer in one query per table, by id
+        bookings = [booking for model in self._rental_models(include_archived)
+                    for booking in self.db.query(model).options(
+                        joinedload(model.vehicle), joinedload(model.user)).order_by(model.id).all()]
+        return sorted(bookings, key=lambda booking: booking.id) if include_archived else bookings
+
+    def get_booking(self, booking_id: int, include_archived: bool = False) -> Rental:
+        # fetch one booking with its vehicle, looking in the archive when asked
+        for model in self._rental_models(include_archived):
+            booking = self.db.query(model).options(joinedload(model.vehicle)).filter(model.id == booking_id).first()
+            if booking:
+                return booking
+        raise ValueError("Booking not found.")
+
+    def _rental_models(self, include_archived: bool):
+        # live rentals, plus the archive for history reports
+        return (Rental, ArchivedRental) if include_archived else (Rental,)
 
     def get_all_vehicles(self):
         # fetch all vehicles
-        return self.db.query(Vehicle).all()
\ No newline at end of file
+        return self.db.query(Vehicle).all()
+
+    def list_vehicles(self, vehicle_type: Optional[VehicleType] = None, include_deleted: bool = True) -> List[VehicleRow]:
+        # all vehicles as read-only rows by id
+        return as_rows(VehicleRow, self._vehicles_query(vehicle_type, include_deleted, *vehicle_columns()).order_by(
+            Vehicle.id))
+
+    def _bookings_query(self, booking_status: Optional[BookingStatus] = None,
+                        approval_status: Optional[ApprovalStatus] = None,
+                        user_id: Optional[int] = None, cancelled_by: Optional[str] = None, model=Rental,
+                        rows: bool = False):
+        # bookings (live or archived) with vehicle and customer, narrowed by the given filters;
+        # BookingRow columns instead of entities when rows is set
+        if rows:
+            query = self.db.query(*booking_columns(model)).join(Vehicle, Vehicle.id == model.vehicle_id).join(
+                User, User.id == model.user_id)
+        else:
+            query = self.db.query(model).options(joinedload(model.vehicle), joinedload(model.user))
+        if booking_status is not None:
+            query = query.filter(model.booking_status == booking_status)
+        if approval_status is not None:
+            query = query.filter(model.approval_status == approval_status)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        if cancelled_by is not None:
+            query = query.filter(model.cancelled_by == cancelled_by)
+        return query
+
+    def _history_queries(self, include_archived: bool, rows: bool = False, **filters):
+        return [self._bookings_query(model=model, rows=rows, **filters)
+                for model in self._rental_models(include_archived)]
+
+    def _vehicles_query(self, vehicle_type: Optional[VehicleType] = None, include_deleted: bool = True, *columns):
+        query = self.db.query(*columns) if columns else self.db.query(Vehicle)
+        if vehicle_type is not None:
+            query = query.filter(Vehicle.type == vehicle_type)
+        if not include_deleted:
+            query = query.filter(Vehicle.is_deleted == False)
+        return query
+
+    def get_bookings_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                           include_archived: bool = False, **filters) -> Iterator[List[Rental]]:
+        # pages of bookings by id, filters as in _bookings_query; archived bookings are
+        # merged in by id when include_archived is set
+        if include_archived:
+            return merged_keyset_pages(self._history_queries(True, **filters), "id", page_size, after_id)
+        return keyset_pages(self._bookings_query(**filters), Rental.id, page_size, after_id)
+
+    def get_cancelled_bookings_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                                     cancelled_by: Optional[str] = None,
+                                     include_archived: bool = False) -> Iterator[List[Rental]]:
+        # pages of cancelled bookings by id
+        return self.get_bookings_pages(page_size, after_id, include_archived,
+                                       booking_status=BookingStatus.CANCELLED, cancelled_by=cancelled_by)
+
+    def get_booking_rows_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                               include_archived: bool = False, **filters) -> Iterator[List[BookingRow]]:
+        # get_bookings_pages as read-only rows, for listings that only show them
+        queries = self._history_queries(include_archived, rows=True, **filters)
+        if include_archived:
+            return as_row_pages(BookingRow, merged_keyset_pages(queries, "id", page_size, after_id))
+        return as_row_pages(BookingRow, keyset_pages(queries[0], Rental.id, page_size, after_id))
+
+    def get_cancelled_booking_rows_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                                         cancelled_by: Optional[str] = None,
+                                         include_archived: bool = False) -> Iterator[List[BookingRow]]:
+        return self.get_booking_rows_pages(page_size, after_id, include_archived,
+                                           booking_status=BookingStatus.CANCELLED, cancelled_by=cancelled_by)
+
+    def get_vehicles_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                           vehicle_type: Optional[VehicleType] = None, include_deleted: bool = True) -> Iterator[List[Vehicle]]:
+        # pages of vehicles by id
+        return keyset_pages(self._vehicles_query(vehicle_type, include_deleted), Vehicle.id, page_size, after_id)
+
+    def get_vehicle_rows_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                               vehicle_type: Optional[VehicleType] = None,
+                               include_deleted: bool = True) -> Iterator[List[VehicleRow]]:
+        # pages of vehicles by id as read-only rows
+        query = self._vehicles_query(vehicle_type, include_deleted, *vehicle_columns())
+        return as_row_pages(VehicleRow, keyset_pages(query, Vehicle.id, page_size, after_id))
+
+    def stream_bookings(self, page_size: int = DEFAULT_PAGE_SIZE, include_archived: bool = False,
+                        **filters) -> Iterator[Rental]:
+        # bookings one at a time, fetched page_size rows per round trip
+        if include_archived:
+            return merged_stream(self._history_queries(True, **filters), "id", page_size)
+        return stream(self._bookings_query(**filters), Rental.id, page_size)
+
+    def stream_cancelled_bookings(self, page_size: int = DEFAULT_PAGE_SIZE, cancelled_by: Optional[str] = None,
+                                  include_archived: bool = False) -> Iterator[Rental]:
+        return self.stream_bookings(page_size, include_archived,
+                                    booking_status=BookingStatus.CANCELLED, cancelled_by=cancelled_by)
+
+    def stream_vehicles(self, page_size: int = DEFAULT_PAGE_SIZE, vehicle_type: Optional[VehicleType] = None,
+                        include_deleted: bool = True) -> Iterator[Vehicle]:
+        return stream(self._vehicles_query(vehicle_type, include_deleted), Vehicle.id, page_size)
@@ -0,0 +1,144 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, NamedTuple, Optional, Sequence, Tuple
+from importlib import import_module
+from sqlalchemy import delete, insert, or_, select, update
+from src.models import (ArchivedRental, DailyRevenueStats, DailyVehicleStats, Rental, Vehicle, BookingStatus,
+                        PaymentMethod, VehicleType)
+
+# Daily revenue and utilization summaries. The services collect the changes of a
+# transaction in a StatsBatch and write them with apply() right before committing,
+# so the summary rows always match the rentals; rebuild_stats() recomputes them
+# from scratch (migration v002 and `python start.py rebuild-stats`).
+
+# dialects that support INSERT ... ON CONFLICT DO UPDATE, imported on first use
+UPSERT_DIALECTS = {"sqlite": "sqlalchemy.dialects.sqlite", "postgresql": "sqlalchemy.dialects.postgresql"}
+
+# rentals read per query while rebuilding
+REBUILD_PAGE_SIZE = 10000
+
+
+class FleetUtilization(NamedTuple):
+    vehicle_type: VehicleType
+    vehicles: int  # current non-deleted fleet of this type
+    rented_hours: float
+    utilization: float  # rented hours / available vehicle hours in the period
+
+
+def hours_by_day(start: datetime, end: datetime) -> Iterator[Tuple[date, float]]:
+    # split [start, end) into (UTC day, hours) pieces
+    while start < end:
+        piece_end = min(end, datetime.combine(start.date() + timedelta(days=1), time.min))
+        yield start.date(), (piece_end - start).total_seconds() / 3600
+        start = piece_end
+
+
+class StatsBatch:
+    # counter increments summed per summary row until apply()
+    def __init__(self):
+        self.vehicle_days: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+        self.revenue_days: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+
+    def __len__(self):
+        return len(self.vehicle_days) + len(self.revenue_days)
+
+    def issued(self, vehicle_id: int, vehicle_type: VehicleType, issued_at: datetime) -> None:
+        self.vehicle_days[(issued_at.date(), vehicle_id, vehicle_type)]["issued"] += 1
+
+    def cancelled(self, vehicle_id: int, vehicle_type: VehicleType, cancelled_at: datetime) -> None:
+        self.vehicle_days[(cancelled_at.date(), vehicle_id, vehicle_type)]["cancelled"] += 1
+
+    def returned(self, vehicle_id: int, vehicle_type: VehicleType, rented_from: datetime, completed_at: datetime,
+                 total_cents: int, payment_method: Optional[PaymentMethod]) -> None:
+        # revenue counts on the return day, rented hours on every day the vehicle was out
+        counters = self.vehicle_days[(completed_at.date(), vehicle_id, vehicle_type)]
+        counters["completed"] += 1
+        counters["revenue_cents"] += total_cents
+        for day, hours in hours_by_day(rented_from, completed_at):
+            self.vehicle_days[(day, vehicle_id, vehicle_type)]["rented_hours"] += hours
+        if payment_method is not None:
+            revenue = self.revenue_days[(completed_at.date(), vehicle_type, PaymentMethod(payment_method))]
+            revenue["rentals"] += 1
+            revenue["revenue_cents"] += total_cents
+
+    def apply(self, target) -> None:
+        # add the counters to the summary tables on a session or connection, in its transaction
+        increment(target, DailyVehicleStats, self.vehicle_days)
+        increment(target, DailyRevenueStats, self.revenue_days)
+        self.vehicle_days.clear()
+        self.revenue_days.clear()
+
+
+def dialect_name(target) -> str:
+    # works for sessions and connections
+    dialect = getattr(target, "dialect", None)
+    return (dialect or target.get_bind().dialect).name
+
+
+def increment(target, model, counters: Dict[tuple, Dict[str, float]]) -> None:
+    # add counters to the rows keyed by the model's primary key, creating missing rows
+    if not counters:
+        return
+    table = model.__table__
+    keys = [column.key for column in table.primary_key]
+    values = [column.key for column in table.columns if not column.primary_key]
+    rows = [dict(zip(keys, key), **{name: counts.get(name, 0) for name in values}) for key, counts in counters.items()]
+
+    dialect_module = UPSERT_DIALECTS.get(dialect_name(target))
+    if dialect_module is not None:
+        statement = import_module(dialect_module).insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys, set_={name: table.c[name] + statement.excluded[name] for name in values})
+        target.execute(statement, rows)
+        return
+
+    # other databases: update in place, insert the rows that did not exist yet
+    for row in rows:
+        result = target.execute(update(table).where(*[table.c[key] == row[key] for key in keys]).values(
+            {name: table.c[name] + row[name] for name in values}))
+        if result.rowcount == 0:
+            target.execute(insert(table), [row])
+
+
+def vehicle_type(session, vehicle_id: int) -> VehicleType:
+    # type of one vehicle as of this write transaction, not from the vehicle catalog,
+    # which may not have seen a type change made by another process yet
+    return session.query(Vehicle.type).filter(Vehicle.id == vehicle_id).scalar()
+
+
+def vehicle_types(session, vehicle_ids: Iterable[int]) -> Dict[int, VehicleType]:
+    # types of many vehicles in one query
+    return dict(session.query(Vehicle.id, Vehicle.type).filter(Vehicle.id.in_(set(vehicle_ids))).all())
+
+
+def rebuild_stats(target, page_size: int = REBUILD_PAGE_SIZE, models: Sequence = (Rental, ArchivedRental)) -> int:
+    # recompute both summary tables from the live and archived rentals, page by page;
+    # the caller commits. Returns the number of rentals that contributed.
+    target.execute(delete(DailyVehicleStats))
+    target.execute(delete(DailyRevenueStats))
+    return sum(_add_rentals(target, model, page_size) for model in models)
+
+
+def _add_rentals(target, model, page_size: int) -> int:
+    query = select(model.id, model.vehicle_id, Vehicle.type, model.booking_status, model.start_at,
+                   model.issued_at, model.completed_at, model.cancelled_at, model.total_rental_cents,
+                   model.payment_method).join(Vehicle, Vehicle.id == model.vehicle_id).where(
+        or_(model.issued_at != None, model.cancelled_at != None, model.completed_at != None)
+    ).order_by(model.id).limit(page_size)
+    counted, last_id = 0, 0
+    while True:
+        rows = target.execute(query.where(model.id > last_id)).all()
+        if not rows:
+            return counted
+        batch = StatsBatch()
+        for (rental_id, vehicle_id, type_, status, start_at, issued_at, completed_at, cancelled_at,
+             total_cents, payment_method) in rows:
+            if issued_at is not None:
+                batch.issued(vehicle_id, type_, issued_at)
+            if status == BookingStatus.COMPLETED and completed_at is not None:
+                batch.returned(vehicle_id, type_, issued_at or start_at, completed_at, total_cents, payment_method)
+            elif status == BookingStatus.CANCELLED and cancelled_at is not None:
+                batch.cancelled(vehicle_id, type_, cancelled_at)
+        batch.apply(target)
+        counted += len(rows)
+        last_id = rows[-1][0]
@@ -0,0 +1,526 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+from src.admin_service import AdminService
+from src.auth_service import AuthService
+from src.config import Settings
+from src.database import Database
+from src.instrumentation import format_prometheus, get_instrumentation
+from src.models import Rental, Role, Vehicle, VehicleType, ApprovalStatus, BookingStatus, PaymentMethod
+from src.password_hasher import PasswordHasher, get_default_hasher
+from src.pricing import price_cents, quote_vehicles
+from src.projections import BookingRow, VehicleRow
+from src.rental_service import RentalService
+from src.vehicle_catalog import SESSION_KEY as CATALOG_KEY, format_catalog_prometheus
+from src.vehicle_service import VehicleService, parse_vehicle_row
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+# largest request body accepted, in bytes
+MAX_BODY_BYTES = 1024 * 1024
+
+# seconds an idle keep-alive connection may hold its worker thread
+KEEP_ALIVE_TIMEOUT = 5
+
+# rows per page for admin listings, when not given and at most
+API_PAGE_SIZE = 50
+MAX_API_PAGE_SIZE = 500
+
+# who may call a route
+PUBLIC, USER, ADMIN = "public", "user", "admin"
+
+
+class HttpError(Exception):
+    # request errors that are not validation failures (those are ValueError, answered with 400)
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class TokenSigner:
+    # stateless bearer tokens "<user id>.<role>.<expiry>.<hmac>", valid in every worker process
+    def __init__(self, secret: str, ttl: int):
+        self.secret = secret.encode("utf-8")
+        self.ttl = ttl
+
+    def _sign(self, payload: str) -> str:
+        return hmac.new(self.secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def issue(self, user_id: int, role: Role) -> str:
+        payload = f"{user_id}.{role.value}.{int(time.time()) + self.ttl}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token: str) -> Optional[Tuple[int, Role]]:
+        # (user id, role) for a valid, unexpired token, otherwise None
+        payload, _, signature = token.rpartition(".")
+        if not payload or not hmac.compare_digest(self._sign(payload), signature):
+            return None
+        try:
+            user_id, role, expires = payload.split(".")
+            if int(expires) < time.time():
+                return None
+            return int(user_id), Role(role)
+        except ValueError:
+            return None
+
+
+def vehicle_json(vehicle: Union[Vehicle, VehicleRow]) -> Dict:
+    return dict(id=vehicle.id, plate=vehicle.plate, model=vehicle.model, type=vehicle.type.value,
+                year=vehicle.year, vehicle_mileage=vehicle.vehicle_mileage,
+                mileage_threshold=vehicle.mileage_threshold, min_rent_hours=vehicle.min_rent_hours,
+                max_rent_hours=vehicle.max_rent_hours, hourly_rate_cents=vehicle.hourly_rate_cents,
+                photo_url=vehicle.photo_url, is_deleted=vehicle.is_deleted)
+
+
+def booking_json(booking: Union[Rental, BookingRow]) -> Dict:
+    return dict(id=booking.id, vehicle_id=booking.vehicle_id, user_id=booking.user_id,
+                start_at=booking.start_at.isoformat(), end_at=booking.end_at.isoformat(),
+                approval_status=booking.approval_status.value, booking_status=booking.booking_status.value,
+                initial_rental_cents=booking.initial_rental_cents, surcharge_cents=booking.surcharge_cents,
+                total_rental_cents=booking.total_rental_cents,
+                payment_method=booking.payment_method.value if booking.payment_method else None,
+                cancelled_by=booking.cancelled_by, cancelled_reason=booking.cancelled_reason)
+
+
+def batch_json(results: Dict[int, Optional[str]]) -> List[Dict]:
+    # per-booking outcome of a batch operation, error is null when it was applied
+    return [dict(id=booking_id, error=error) for booking_id, error in results.items()]
+
+
+def parse_datetime(value, name: str) -> datetime:
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Invalid {name}, expected an ISO 8601 date/time.")
+
+
+def parse_date(value, name: str) -> date:
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Invalid {name}, expected an ISO 8601 date.")
+
+
+def parse_enum(enum, value, name: str):
+    try:
+        return enum[str(value).upper()]
+    except KeyError:
+        raise ValueError(f"Invalid {name}: {value!r}.")
+
+
+def parse_int(value, name: str) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r}.")
+
+
+def parse_float(value, name: str) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name}: {value!r}.")
+
+
+def parse_ids(body: Dict) -> List[int]:
+    ids = body.get("ids")
+    if not isinstance(ids, list) or not ids:
+        raise ValueError("ids must be a non-empty list of booking ids.")
+    return [parse_int(booking_id, "booking id") for booking_id in ids]
+
+
+class Request:
+    # what a route handler sees of an HTTP request
+    __slots__ = ("session", "params", "body", "user_id", "role")
+
+    def __init__(self, session, params: Dict[str, str], body: Dict, user_id: Optional[int], role: Optional[Role]):
+        self.session = session
+        self.params = params
+        self.body = body
+        self.user_id = user_id
+        self.role = role
+
+    def param(self, name: str, default=None):
+        return self.params.get(name, default)
+
+    def require(self, name: str):
+        # a value from the JSON body or query string that must be present
+        value = self.body.get(name, self.params.get(name))
+        if value is None or value == "":
+            raise ValueError(f"Missing {name}.")
+        return value
+
+
+class ApiApp:
+    # JSON routes over the services; every request runs on its own session
+    def __init__(self, db: Database, signer: TokenSigner, hasher: Optional[PasswordHasher] = None):
+        self.db = db
+        self.signer = signer
+        self.hasher = hasher or get_default_hasher(db.settings)
+        self.routes = [
+            ("GET", r"/health", PUBLIC, self.health),
+            ("GET", r"/metrics", PUBLIC, self.metrics),
+            ("POST", r"/login", PUBLIC, self.login),
+            ("POST", r"/register", PUBLIC, self.register),
+            ("GET", r"/vehicles/next-available", USER, self.next_available),
+            ("GET", r"/vehicles/available", USER, self.search_vehicles),
+            ("GET", r"/bookings", USER, self.my_bookings),
+            ("POST", r"/bookings", USER, self.create_booking),
+            ("POST", r"/bookings/(\d+)/cancel", USER, self.cancel_booking),
+            ("GET", r"/admin/bookings", ADMIN, self.list_bookings),
+            ("GET", r"/admin/bookings/(\d+)", ADMIN, self.get_booking),
+            ("POST", r"/admin/bookings/review", ADMIN, self.review_bookings),
+            ("POST", r"/admin/bookings/issue", ADMIN, self.issue_vehicles),
+            ("POST", r"/admin/bookings/return", ADMIN, self.return_vehicles),
+            ("GET", r"/admin/vehicles", ADMIN, self.list_vehicles),
+            ("POST", r"/admin/vehicles", ADMIN, self.add_vehicle),
+            ("GET", r"/admin/reports/no-shows", ADMIN, self.no_show_report),
+            ("GET", r"/admin/reports/over-mileage", ADMIN, self.over_mileage_report),
+            ("GET", r"/admin/reports/finance", ADMIN, self.finance_report),
+        ]
+        self.routes = [(method, re.compile(pattern), access, handler) for method, pattern, access, handler in self.routes]
+
+    def handle(self, method: str, target: str, authorization: Optional[str], body: bytes) -> Tuple[int, Dict]:
+        # answer one request with (status, JSON payload)
+        url = urlsplit(target)
+        path_found = False
+        for route_method, pattern, access, handler in self.routes:
+            match = pattern.fullmatch(url.path)
+            if match is None:
+                continue
+            path_found = True
+            if route_method != method:
+                continue
+            try:
+                return 200, self._call(handler, access, match.groups(), url.query, authorization, body)
+            except HttpError as e:
+                return e.status, {"error": str(e)}
+            except ValueError as e:
+                return 400, {"error": str(e)}
+            except Exception:
+                logger.exception("Unhandled error for %s %s", method, url.path)
+                return 500, {"error": "Internal server error."}
+        if path_found:
+            return 405, {"error": "Method not allowed."}
+        return 404, {"error": "Not found."}
+
+    def _call(self, handler: Callable, access: str, args, query: str, authorization: Optional[str], body: bytes):
+        user_id = role = None
+        if access != PUBLIC:
+            identity = None
+            if authorization and authorization.startswith("Bearer "):
+                identity = self.signer.verify(authorization[len("Bearer "):])
+            if identity is None:
+                raise HttpError(401, "Missing or invalid access token.")
+            user_id, role = identity
+            if access == ADMIN and role != Role.ADMIN:
+                raise HttpError(403, "Admin access required.")
+        try:
+            data = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            raise ValueError("Request body is not valid JSON.")
+        if not isinstance(data, dict):
+            raise ValueError("Request body must be a JSON object.")
+        params = {name: values[-1] for name, values in parse_qs(query).items()}
+
+        session = self.db.get_session()
+        try:
+            return handler(Request(session, params, data, user_id, role), *args)
+        finally:
+            session.close()
+
+    def _page_size(self, request: Request) -> int:
+        page_size = parse_int(request.param("page_size", API_PAGE_SIZE), "page_size")
+        return max(1, min(page_size, MAX_API_PAGE_SIZE))
+
+    def _page(self, pages, page_size: int, to_json: Callable) -> Dict:
+        # first page of a keyset listing, next_after_id continues it
+        page = next(pages, [])
+        next_after_id = page[-1].id if len(page) == page_size else None
+        return dict(items=[to_json(row) for row in page], next_after_id=next_after_id)
+
+    def health(self, request: Request) -> Dict:
+        return {"status": "ok"}
+
+    def metrics(self, request: Request) -> str:
+        # Prometheus text, or JSON with ?format=json; empty unless CAR_RENTAL_INSTRUMENTATION is on,
+        # plus the vehicle catalog counters when the catalog is enabled
+        snapshot = get_instrumentation().snapshot()
+        catalog = self.db.session_info.get(CATALOG_KEY)
+        if request.param("format") == "json":
+            if catalog is not None:
+                snapshot["vehicle_catalog"] = catalog.stats()
+            return snapshot
+        text = format_prometheus(snapshot)
+        return text + format_catalog_prometheus(catalog.stats()) if catalog is not None else text
+
+    def login(self, request: Request) -> Dict:
+        try:
+            user = AuthService(request.session, self.hasher).login(request.require("email"), request.require("password"))
+        except ValueError as e:
+            raise HttpError(401, str(e))
+        return dict(token=self.signer.issue(user.id, user.role), user_id=user.id, role=user.role.value)
+
+    def register(self, request: Request) -> Dict:
+        user = AuthService(request.session, self.hasher).register(
+            request.require("first_name"), request.require("last_name"), request.require("email"),
+            request.require("mobile_number"), request.require("password"))
+        return dict(user_id=user.id)
+
+    def search_vehicles(self, request: Request) -> Dict:
+        start_at = parse_datetime(request.require("start_at"), "start_at")
+        end_at = parse_datetime(request.require("end_at"), "end_at")
+        vehicles = RentalService(request.session).search_available_vehicles(
+            parse_enum(VehicleType, request.require("type"), "type"), start_at, end_at)
+        quotes = quote_vehicles(vehicles, start_at, end_at)
+        return dict(items=[dict(vehicle_json(v), quote_cents=quotes[v.id]) for v in vehicles])
+
+    def next_available(self, request: Request) -> Dict:
+        # earliest start per vehicle, ?type=&hours=[&horizon_hours=]
+        hours = parse_int(request.require("hours"), "hours")
+        slots = RentalService(request.session).find_earliest_slots(
+            parse_enum(VehicleType, request.require("type"), "type"), hours,
+            parse_int(request.param("horizon_hours", 14 * 24), "horizon_hours"))
+        return dict(items=[dict(vehicle_json(v), earliest_start=start_at.isoformat(),
+                                quote_cents=price_cents(v.hourly_rate_cents, start_at, start_at + timedelta(hours=hours)))
+                           for v, start_at in slots])
+
+    def my_bookings(self, request: Request) -> Dict:
+        # ?archived=true adds bookings moved to the archive
+        return dict(items=[booking_json(b) for b in RentalService(request.session).list_user_bookings(
+            request.user_id, request.param("archived", "false").lower() == "true")])
+
+    def create_booking(self, request: Request) -> Dict:
+        booking = RentalService(request.session).create_booking(
+            request.user_id, parse_int(request.require("vehicle_id"), "vehicle_id"),
+            parse_datetime(request.require("start_at"), "start_at"),
+            parse_datetime(request.require("end_at"), "end_at"))
+        return booking_json(booking)
+
+    def cancel_booking(self, request: Request, booking_id: str) -> Dict:
+        # customers may only cancel their own bookings
+        booking = request.session.get(Rental, int(booking_id))
+        if booking is None or (request.role != Role.ADMIN and booking.user_id != request.user_id):
+            raise HttpError(404, "Booking not found.")
+        cancelled_by = "ADMIN" if request.role == Role.ADMIN else "CUSTOMER"
+        RentalService(request.session).cancel_booking(booking.id, cancelled_by, request.body.get("reason", ""))
+        return booking_json(booking)
+
+    def list_bookings(self, request: Request) -> Dict:
+        filters = {}
+        if request.param("booking_status"):
+            filters["booking_status"] = parse_enum(BookingStatus, request.param("booking_status"), "booking_status")
+        if request.param("approval_status"):
+            filters["approval_status"] = parse_enum(ApprovalStatus, request.param("approval_status"), "approval_status")
+        after_id = request.param("after_id")
+        page_size = self._page_size(request)
+        pages = AdminService(request.session).get_booking_rows_pages(
+            page_size, parse_int(after_id, "after_id") if after_id else None,
+            request.param("archived", "false").lower() == "true", **filters)
+        return self._page(pages, page_size, booking_json)
+
+    def get_booking(self, request: Request, booking_id: str) -> Dict:
+        try:
+            return booking_json(AdminService(request.session).get_booking(int(booking_id), include_archived=True))
+        except ValueError as e:
+            raise HttpError(404, str(e))
+
+    def review_bookings(self, request: Request) -> Dict:
+        approve = request.body.get("approve")
+        if not isinstance(approve, bool):
+            raise ValueError("approve must be true or false.")
+        results = AdminService(request.session).review_bookings(parse_ids(request.body), approve, request.body.get("reason"))
+        return dict(results=batch_json(results))
+
+    def issue_vehicles(self, request: Request) -> Dict:
+        return dict(results=batch_json(AdminService(request.session).issue_vehicles(parse_ids(request.body))))
+
+    def return_vehicles(self, request: Request) -> Dict:
+        returns = request.require("returns")
+        if not isinstance(returns, list):
+            raise ValueError("returns must be a list.")
+        parsed = []
+        for item in returns:
+            if not isinstance(item, dict):
+                raise ValueError("Each return must be an object.")
+            parsed.append((parse_int(item.get("id"), "booking id"),
+                           parse_float(item.get("ending_mileage"), "ending_mileage"),
+                           parse_int(item.get("surcharge_cents", 0), "surcharge_cents"),
+                           parse_enum(PaymentMethod, item.get("payment_method"), "payment_method")))
+        return dict(results=batch_json(AdminService(request.session).return_vehicles(parsed)))
+
+    def list_vehicles(self, request: Request) -> Dict:
+        vehicle_type = request.param("type")
+        after_id = request.param("after_id")
+        page_size = self._page_size(request)
+        pages = AdminService(request.session).get_vehicle_rows_pages(
+            page_size, parse_int(after_id, "after_id") if after_id else None,
+            parse_enum(VehicleType, vehicle_type, "type") if vehicle_type else None,
+            request.param("include_deleted", "true").lower() != "false")
+        return self._page(pages, page_size, vehicle_json)
+
+    def add_vehicle(self, request: Request) -> Dict:
+        # same field rules as the fleet import
+        vehicle = VehicleService(request.session).add_vehicle(**parse_vehicle_row(request.body))
+        return vehicle_json(vehicle)
+
+    def no_show_report(self, request: Request) -> Dict:
+        return dict(items=[booking_json(b) for b in AdminService(request.session).get_no_show_bookings()])
+
+    def over_mileage_report(self, request: Request) -> Dict:
+        return dict(items=[vehicle_json(v) for v in AdminService(request.session).list_vehicles_over_mileage()])
+
+    def finance_report(self, request: Request) -> Dict:
+        # revenue, payment mix and utilization from the daily summaries, ?from=&to= (ISO dates)
+        start_day = parse_date(request.require("from"), "from")
+        end_day = parse_date(request.require("to"), "to")
+        admin = AdminService(request.session)
+        return dict(
+            revenue=[dict(day=r.day.isoformat(), vehicle_type=r.vehicle_type.value, rentals=r.rentals,
+                          revenue_cents=r.revenue_cents) for r in admin.get_daily_revenue(start_day, end_day)],
+            payment_mix=[dict(payment_method=r.payment_method.value, rentals=r.rentals, revenue_cents=r.revenue_cents)
+                         for r in admin.get_payment_mix(start_day, end_day)],
+            utilization=[dict(vehicle_type=u.vehicle_type.value, vehicles=u.vehicles, rented_hours=u.rented_hours,
+                              utilization=u.utilization) for u in admin.get_fleet_utilization(start_day, end_day)])
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections open between requests
+    timeout = KEEP_ALIVE_TIMEOUT
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    server_version = "CarRentalAPI/1.0"
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    # other methods get a JSON 405/404 from the router instead of an HTML 501
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # the body cannot be framed, so the connection cannot be reused either
+            self.close_connection = True
+            self._send(400, {"error": "Invalid Content-Length header."})
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send(413, {"error": "Request body too large."})
+            return
+        body = self.rfile.read(length) if length else b""
+        status, payload = self.server.app.handle(method, self.path, self.headers.get("Authorization"), body)
+        self._send(status, payload)
+
+    def _send(self, status: int, payload):
+        # dicts are sent as JSON, strings as plain text (metrics)
+        if isinstance(payload, str):
+            data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # per-request access logs are too costly at load, keep them at debug level
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+class PooledHTTPServer(HTTPServer):
+    # HTTPServer whose connections are served by a fixed pool of worker threads
+    # instead of a new thread per connection
+    request_queue_size = 1024
+
+    def __init__(self, address, threads: int, app: Optional[ApiApp] = None):
+        super().__init__(address, ApiRequestHandler)
+        self.app = app
+        self.workers = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="api-worker")
+
+    def process_request(self, request, client_address):
+        self.workers.submit(self._serve_connection, request, client_address)
+
+    def _serve_connection(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.workers.shutdown(wait=False, cancel_futures=True)
+
+
+def serve(settings: Settings, setup: Optional[Callable[[Database], None]] = None) -> None:
+    # run the API until interrupted; setup(db) runs once in every worker process
+    if settings.api_processes > 1 and not hasattr(os, "fork"):
+        raise ValueError("Multiple API processes need os.fork, set CAR_RENTAL_API_PROCESSES=1.")
+
+    # create or migrate the schema once, before any worker opens the database
+    Database(settings).dispose()
+
+    signer = TokenSigner(settings.api_secret or secrets.token_hex(32), settings.api_token_ttl)
+    server = PooledHTTPServer((settings.api_host, settings.api_port), settings.api_threads)
+
+    # pre-fork workers that accept on the same listening socket
+    children = []
+    for _ in range(settings.api_processes - 1):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve_process(server, settings, signer, setup)
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    print(f"Serving on http://{settings.api_host}:{server.server_address[1]} "
+          f"({settings.api_processes} process(es) x {settings.api_threads} threads)")
+    try:
+        _serve_process(server, settings, signer, setup)
+    finally:
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+
+
+def _serve_process(server: PooledHTTPServer, settings: Settings, signer: TokenSigner,
+                   setup: Optional[Callable[[Database], None]]) -> None:
+    # each process needs its own engine, connections must not cross a fork
+    db = Database(settings)
+    if setup is not None:
+        setup(db)
+    server.app = ApiApp(db, signer)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        db.dispose()
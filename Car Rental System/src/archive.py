@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from sqlalchemy import Column, delete, insert, literal, select
+from sqlalchemy.orm import Session
+from src.database import begin_write, commit
+from src.models import ArchivedRental, Rental, RentalColumns, BookingStatus
+import time
+
+# Completed and cancelled rentals older than a configurable age move from the live
+# `rentals` table to `rentals_archive` in bounded batches, so booking checks, no-show
+# sweeps and the active listings only touch current bookings. History reports ask
+# for the archive explicitly (include_archived=True) and merge both tables by id.
+
+# booking states that never change again
+FINISHED_STATUSES = [BookingStatus.COMPLETED, BookingStatus.CANCELLED]
+
+# rentals moved per write transaction
+ARCHIVE_BATCH_SIZE = 1000
+
+# columns copied from rentals to rentals_archive
+RENTAL_COLUMN_NAMES = [name for name, value in vars(RentalColumns).items() if isinstance(value, Column)]
+
+
+class ArchiveReport(NamedTuple):
+    moved: int
+    batches: int
+    cutoff: datetime  # rentals that ended before this were moved
+
+
+def archive_rentals(db: Session, older_than: timedelta, batch_size: int = ARCHIVE_BATCH_SIZE,
+                    pause: float = 0.0, now: Optional[datetime] = None) -> ArchiveReport:
+    # move finished rentals that ended before now - older_than; every batch copies and
+    # deletes in one short BEGIN IMMEDIATE transaction, so a row is always in exactly
+    # one of the two tables, and other writers get the lock between batches
+    if batch_size < 1:
+        raise ValueError("Batch size must be at least 1.")
+    now = now or datetime.utcnow()
+    cutoff = now - older_than
+    moved = batches = last_id = 0
+    while True:
+        begin_write(db)
+        booking_ids = db.execute(select(Rental.id).where(
+            Rental.booking_status.in_(FINISHED_STATUSES),
+            Rental.end_at < cutoff,
+            Rental.id > last_id
+        ).order_by(Rental.id).limit(batch_size)).scalars().all()
+        if not booking_ids:
+            commit(db)
+            break
+        columns = [getattr(Rental, name) for name in RENTAL_COLUMN_NAMES]
+        db.execute(insert(ArchivedRental).from_select(
+            RENTAL_COLUMN_NAMES + ["archived_at"],
+            select(*columns, literal(now)).where(Rental.id.in_(booking_ids))))
+        db.execute(delete(Rental).where(Rental.id.in_(booking_ids)))
+        commit(db)
+        moved += len(booking_ids)
+        batches += 1
+        last_id = booking_ids[-1]
+        if len(booking_ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return ArchiveReport(moved, batches, cutoff)
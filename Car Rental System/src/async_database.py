@@ -0,0 +1,83 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from src.config import Settings
+from src.database import configure_sqlite_engine, ensure_database_folder, is_memory_database, pool_options
+from src.models import Base
+from db.migrations import ensure_schema_connection
+from typing import Optional
+
+# async driver used when the configured URL names none, e.g. sqlite:/// -> sqlite+aiosqlite:///
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def async_url(database_url: str):
+    # the configured (sync) database URL with an async driver
+    url = make_url(database_url)
+    if "+" in url.drivername:
+        return url
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver known for {url.get_backend_name()} databases.")
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}")
+
+
+def create_async_engine_from_settings(settings: Settings):
+    # async counterpart of create_engine_from_settings, same pooling and pragmas
+    url = async_url(settings.database_url)
+    if url.get_backend_name() != "sqlite":
+        return create_async_engine(url, pool_pre_ping=True, **pool_options(settings))
+
+    if is_memory_database(url):
+        # one shared connection, transaction handling left to the driver
+        return create_async_engine(url)
+
+    ensure_database_folder(url)
+    # aiosqlite defaults to NullPool, keep connections (and their pragmas) instead
+    engine = create_async_engine(url, poolclass=AsyncAdaptedQueuePool, **pool_options(settings))
+    # engine events are registered on the sync engine the async one wraps
+    configure_sqlite_engine(engine.sync_engine, settings.sqlite_pragmas())
+    return engine
+
+
+class AsyncDatabase:
+    # async engine and session factory; call prepare() once before serving requests
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or Settings.from_env()
+        self.engine = create_async_engine_from_settings(self.settings)
+
+        # objects stay readable after commit, a session is closed when its request ends
+        self.session_factory = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        # shared components handed to every session through Session.info
+        self.session_info = {}
+
+    @classmethod
+    def from_url(cls, database_url: str, **settings) -> "AsyncDatabase":
+        return cls(Settings(database_url=database_url, **settings))
+
+    async def prepare(self) -> None:
+        # create missing tables and apply pending migrations, as Database() does
+        async with self.engine.connect() as connection:
+            await connection.run_sync(ensure_schema_connection, Base.metadata)
+
+    def get_session(self) -> AsyncSession:
+        # open a new session, one per request
+        return self.session_factory(info=dict(self.session_info))
+
+    async def enable_availability_index(self, verify: bool = False):
+        # load blocking rentals into memory and share the index with all new sessions
+        from src.availability_index import AvailabilityIndex, SESSION_KEY
+
+        async with self.get_session() as session:
+            index = await session.run_sync(lambda s: AvailabilityIndex.load(s, verify))
+        self.session_info[SESSION_KEY] = index
+        return index
+
+    async def dispose(self) -> None:
+        # close every pooled connection
+        await self.engine.dispose()
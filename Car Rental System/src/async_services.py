@@ -0,0 +1,245 @@
+import asyncio
+from itertools import islice
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.admin_service import AdminService, NoShowSweep, SWEEP_BATCH_SIZE
+from src.async_database import AsyncDatabase
+from src.auth_service import AuthService
+from src.availability_index import track_booking
+from src.models import Rental, Role, User, Vehicle, VehicleType, PaymentMethod
+from src.pagination import DEFAULT_PAGE_SIZE
+from src.password_hasher import PasswordHasher, get_default_hasher
+from src.projections import BookingRow, VehicleRow
+from src.rental_service import RentalService, booking_retry_delays, is_busy_error
+from src.vehicle_service import BulkUpsertReport, IMPORT_CHUNK_SIZE, VehicleService
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+# Async versions of the services for serving many users from one event loop.
+# Every call opens its own session, and the business rules stay in the sync
+# services: they run through AsyncSession.run_sync, where each query awaits the
+# async driver instead of blocking the loop. Only waits that would block
+# outside the database (bcrypt, retry backoff) are done here.
+
+
+async def iterate(session: AsyncSession, rows: Iterable, batch_size: int) -> AsyncIterator:
+    # drain a sync iterator that issues queries, batch_size items per run_sync call
+    rows = iter(rows)
+    while True:
+        batch = await session.run_sync(lambda s: list(islice(rows, batch_size)))
+        if not batch:
+            return
+        for item in batch:
+            yield item
+
+
+class AsyncService:
+    # base class: service_class is the sync service whose methods are delegated
+    service_class = None
+
+    def __init__(self, db: AsyncDatabase):
+        self.db = db
+
+    async def _call(self, method: str, *args, **kwargs):
+        async with self.db.get_session() as session:
+            return await session.run_sync(lambda s: getattr(self.service_class(s), method)(*args, **kwargs))
+
+    async def _pages(self, method: str, *args, **kwargs) -> AsyncIterator[List]:
+        async with self.db.get_session() as session:
+            pages = await session.run_sync(lambda s: getattr(self.service_class(s), method)(*args, **kwargs))
+            async for page in iterate(session, pages, 1):
+                yield page
+
+    async def _stream(self, method: str, page_size: int, *args, **kwargs) -> AsyncIterator:
+        async with self.db.get_session() as session:
+            rows = await session.run_sync(lambda s: getattr(self.service_class(s), method)(page_size, *args, **kwargs))
+            async for row in iterate(session, rows, page_size):
+                yield row
+
+
+class AsyncAuthService:
+    # bcrypt runs on the hasher's pool and is awaited, so logins never block the loop
+    def __init__(self, db: AsyncDatabase, hasher: Optional[PasswordHasher] = None):
+        self.db = db
+        self.hasher = hasher or get_default_hasher(db.settings)
+
+    def _auth(self, session) -> AuthService:
+        return AuthService(session, self.hasher)
+
+    async def register(self, first_name: str, last_name: str, email: str, mobile_number: str, password: str,
+                       role: Role = Role.MEMBER) -> User:
+        async with self.db.get_session() as session:
+            await session.run_sync(lambda s: self._auth(s).check_registration(email, password))
+            hashed = await asyncio.wrap_future(self.hasher.submit_hash(password))
+            return await session.run_sync(
+                lambda s: self._auth(s).create_user(first_name, last_name, email, mobile_number, hashed, role))
+
+    async def login(self, email: str, password: str) -> User:
+        async with self.db.get_session() as session:
+            user = await session.run_sync(lambda s: self._auth(s).find_user(email))
+            if not user or not await asyncio.wrap_future(self.hasher.submit_verify(password, user.password_hash)):
+                raise ValueError("Invalid email or password.")
+
+            # upgrade hashes made with an outdated cost while we know the password
+            if self.hasher.needs_rehash(user.password_hash):
+                hashed = await asyncio.wrap_future(self.hasher.submit_hash(password))
+                await session.run_sync(lambda s: self._auth(s).update_password_hash(user, hashed))
+            return user
+
+
+class AsyncRentalService(AsyncService):
+    service_class = RentalService
+
+    async def search_available_vehicles(self, vehicle_type: VehicleType, start_at: datetime, end_at: datetime) -> List[Vehicle]:
+        return await self._call("search_available_vehicles", vehicle_type, start_at, end_at)
+
+    async def create_booking(self, user_id: int, vehicle_id: int, start_at: datetime, end_at: datetime) -> Rental:
+        # same retry policy as RentalService.create_booking, sleeping without blocking the loop
+        async with self.db.get_session() as session:
+            for delay in booking_retry_delays():
+                try:
+                    booking = await session.run_sync(
+                        lambda s: RentalService(s)._create_booking(user_id, vehicle_id, start_at, end_at))
+                    break
+                except OperationalError as e:
+                    await session.rollback()
+                    if not is_busy_error(e):
+                        raise
+                    if delay is None:
+                        raise ValueError("The booking system is busy, please try again.") from e
+                    await asyncio.sleep(delay)
+            await session.run_sync(lambda s: track_booking(s, booking))
+            return booking
+
+    async def cancel_booking(self, booking_id: int, cancelled_by: str, reason: str) -> None:
+        await self._call("cancel_booking", booking_id, cancelled_by, reason)
+
+    async def has_active_bookings(self, vehicle_id: int) -> bool:
+        return await self._call("has_active_bookings", vehicle_id)
+
+    async def get_user_bookings(self, user_id: int, include_archived: bool = False) -> List[Rental]:
+        return await self._call("get_user_bookings", user_id, include_archived)
+
+    async def list_user_bookings(self, user_id: int, include_archived: bool = False) -> List[BookingRow]:
+        return await self._call("list_user_bookings", user_id, include_archived)
+
+
+class AsyncVehicleService(AsyncService):
+    service_class = VehicleService
+
+    async def add_vehicle(self, plate: str, model: str, type: VehicleType, year: int, vehicle_mileage: float,
+                          mileage_threshold: float, min_rent_hours: int, max_rent_hours: int, hourly_rate_cents: int,
+                          photo_url: Optional[str] = None) -> Vehicle:
+        return await self._call("add_vehicle", plate, model, type, year, vehicle_mileage, mileage_threshold,
+                                min_rent_hours, max_rent_hours, hourly_rate_cents, photo_url)
+
+    async def update_vehicle(self, plate: str, **kwargs) -> Vehicle:
+        return await self._call("update_vehicle", plate, **kwargs)
+
+    async def delete_vehicle(self, plate: str) -> None:
+        await self._call("delete_vehicle", plate)
+
+    async def get_available_vehicles(self, vehicle_type: VehicleType, start_at: datetime, end_at: datetime) -> List[Vehicle]:
+        return await self._call("get_available_vehicles", vehicle_type, start_at, end_at)
+
+    async def bulk_upsert(self, rows: Iterable[Tuple[int, Optional[Dict]]],
+                          chunk_size: int = IMPORT_CHUNK_SIZE) -> BulkUpsertReport:
+        return await self._call("bulk_upsert", rows, chunk_size)
+
+
+class AsyncAdminService(AsyncService):
+    service_class = AdminService
+
+    def __init__(self, db: AsyncDatabase, hasher: Optional[PasswordHasher] = None):
+        super().__init__(db)
+        self.auth_service = AsyncAuthService(db, hasher)  # reuse AsyncAuthService for admin creation
+
+    async def create_admin(self, first_name: str, last_name: str, email: str, mobile_number: str, password: str) -> User:
+        return await self.auth_service.register(first_name, last_name, email, mobile_number, password, role=Role.ADMIN)
+
+    async def review_booking(self, booking_id: int, approve: bool, reason: str = None) -> None:
+        await self._call("review_booking", booking_id, approve, reason)
+
+    async def issue_vehicle(self, booking_id: int) -> None:
+        await self._call("issue_vehicle", booking_id)
+
+    async def return_vehicle(self, booking_id: int, ending_mileage: float, surcharge_cents: int, comment: str,
+                             payment_method: str) -> None:
+        await self._call("return_vehicle", booking_id, ending_mileage, surcharge_cents, comment, payment_method)
+
+    async def review_bookings(self, booking_ids: Iterable[int], approve: bool, reason: str = None) -> Dict[int, Optional[str]]:
+        return await self._call("review_bookings", booking_ids, approve, reason)
+
+    async def issue_vehicles(self, booking_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        return await self._call("issue_vehicles", booking_ids)
+
+    async def return_vehicles(self, returns: Iterable[Tuple[int, float, int, PaymentMethod]]) -> Dict[int, Optional[str]]:
+        return await self._call("return_vehicles", returns)
+
+    async def get_no_show_bookings(self) -> List[Rental]:
+        return await self._call("get_no_show_bookings")
+
+    async def sweep_no_shows(self, grace: timedelta = timedelta(0), batch_size: int = SWEEP_BATCH_SIZE) -> NoShowSweep:
+        # no pause between batches, it would block the event loop
+        return await self._call("sweep_no_shows", grace, batch_size)
+
+    async def get_vehicles_over_mileage(self) -> List[Vehicle]:
+        return await self._call("get_vehicles_over_mileage")
+
+    async def list_vehicles_over_mileage(self) -> List[VehicleRow]:
+        return await self._call("list_vehicles_over_mileage")
+
+    async def get_cancelled_bookings(self, include_archived: bool = False) -> List[Rental]:
+        return await self._call("get_cancelled_bookings", include_archived)
+
+    async def get_all_bookings(self, include_archived: bool = False) -> List[Rental]:
+        return await self._call("get_all_bookings", include_archived)
+
+    async def get_booking(self, booking_id: int, include_archived: bool = False) -> Rental:
+        return await self._call("get_booking", booking_id, include_archived)
+
+    async def get_all_vehicles(self) -> List[Vehicle]:
+        return await self._call("get_all_vehicles")
+
+    async def list_vehicles(self, vehicle_type: Optional[VehicleType] = None,
+                            include_deleted: bool = True) -> List[VehicleRow]:
+        return await self._call("list_vehicles", vehicle_type, include_deleted)
+
+    def get_bookings_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                           include_archived: bool = False, **filters) -> AsyncIterator[List[Rental]]:
+        return self._pages("get_bookings_pages", page_size, after_id, include_archived, **filters)
+
+    def get_cancelled_bookings_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                                     cancelled_by: Optional[str] = None,
+                                     include_archived: bool = False) -> AsyncIterator[List[Rental]]:
+        return self._pages("get_cancelled_bookings_pages", page_size, after_id, cancelled_by, include_archived)
+
+    def get_booking_rows_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                               include_archived: bool = False, **filters) -> AsyncIterator[List[BookingRow]]:
+        return self._pages("get_booking_rows_pages", page_size, after_id, include_archived, **filters)
+
+    def get_cancelled_booking_rows_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                                         cancelled_by: Optional[str] = None,
+                                         include_archived: bool = False) -> AsyncIterator[List[BookingRow]]:
+        return self._pages("get_cancelled_booking_rows_pages", page_size, after_id, cancelled_by, include_archived)
+
+    def get_vehicles_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                           vehicle_type: Optional[VehicleType] = None, include_deleted: bool = True) -> AsyncIterator[List[Vehicle]]:
+        return self._pages("get_vehicles_pages", page_size, after_id, vehicle_type, include_deleted)
+
+    def get_vehicle_rows_pages(self, page_size: int = DEFAULT_PAGE_SIZE, after_id: Optional[int] = None,
+                               vehicle_type: Optional[VehicleType] = None,
+                               include_deleted: bool = True) -> AsyncIterator[List[VehicleRow]]:
+        return self._pages("get_vehicle_rows_pages", page_size, after_id, vehicle_type, include_deleted)
+
+    def stream_bookings(self, page_size: int = DEFAULT_PAGE_SIZE, include_archived: bool = False,
+                        **filters) -> AsyncIterator[Rental]:
+        return self._stream("stream_bookings", page_size, include_archived, **filters)
+
+    def stream_cancelled_bookings(self, page_size: int = DEFAULT_PAGE_SIZE, cancelled_by: Optional[str] = None,
+                                  include_archived: bool = False) -> AsyncIterator[Rental]:
+        return self._stream("stream_cancelled_bookings", page_size, cancelled_by, include_archived)
+
+    def stream_vehicles(self, page_size: int = DEFAULT_PAGE_SIZE, vehicle_type: Optional[VehicleType] = None,
+                        include_deleted: bool = True) -> AsyncIterator[Vehicle]:
+        return self._stream("stream_vehicles", page_size, vehicle_type, include_deleted)
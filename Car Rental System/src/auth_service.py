@@ -1,12 +1,18 @@
-import bcrypt
 from sqlalchemy.orm import Session
 from src.models import User, Role
+from src.password_hasher import PasswordHasher, get_default_hasher
+from src.database import SETTINGS_KEY, commit
+from src.instrumentation import instrument_class
 import re
 from datetime import datetime
+from typing import Optional
 
+@instrument_class
 class AuthService:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, hasher: Optional[PasswordHasher] = None):
         self.db = db
+        # bcrypt runs on the hasher's worker pool, sized by the session's Database settings
+        self.hasher = hasher or get_default_hasher(db.info.get(SETTINGS_KEY))
 
     def validate_password(self, password: str) -> bool:
         # password must be at least 6 chars, contain letters and numbers
@@ -15,33 +21,50 @@ class AuthService:
         return True
 
     def register(self, first_name: str, last_name: str, email: str, mobile_number: str, password: str, role: Role = Role.MEMBER) -> User:
+        self.check_registration(email, password)
+
+        # hash password before storing
+        hashed = self.hasher.hash(password)
+        return self.create_user(first_name, last_name, email, mobile_number, hashed, role)
+
+    def check_registration(self, email: str, password: str) -> None:
         # prevent duplicate email registration
-        if self.db.query(User).filter(User.email == email).first():
+        if self.find_user(email):
             raise ValueError("Email already exists.")
-        
+
         # check password rules
         self.validate_password(password)
 
-        # hash password before storing
-        hashed = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-
-        # create new user
+    def create_user(self, first_name: str, last_name: str, email: str, mobile_number: str, password_hash: str,
+                    role: Role = Role.MEMBER) -> User:
+        # create new user from an already hashed password
         user = User(
             first_name=first_name,
             last_name=last_name,
             email=email,
             mobile_number=mobile_number,
-            password_hash=hashed,
+            password_hash=password_hash,
             role=role
         )
         self.db.add(user)
-        self.db.commit()
+        commit(self.db)
         return user
 
+    def find_user(self, email: str) -> Optional[User]:
+        return self.db.query(User).filter(User.email == email).first()
+
     def login(self, email: str, password: str) -> User:
         # check if user exists
-        user = self.db.query(User).filter(User.email == email).first()
+        user = self.find_user(email)
         # verify password
-        if not user or not bcrypt.checkpw(password.encode("utf-8"), user.password_hash.encode("utf-8")):
+        if not user or not self.hasher.verify(password, user.password_hash):
             raise ValueError("Invalid email or password.")
+
+        # upgrade hashes made with an outdated cost while we know the password
+        if self.hasher.needs_rehash(user.password_hash):
+            self.update_password_hash(user, self.hasher.hash(password))
         return user
+
+    def update_password_hash(self, user: User, password_hash: str) -> None:
+        user.password_hash = password_hash
+        commit(self.db)
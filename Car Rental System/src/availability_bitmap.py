@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta
+from math import ceil, floor
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy.orm import Session
+from src.availability_index import BITMAP_SESSION_KEY as SESSION_KEY
+from src.models import Rental, Vehicle, BLOCKING_BOOKING_STATUSES, BLOCKING_APPROVAL_STATUSES, inline_values
+from src.vehicle_catalog import get_catalog
+import numpy as np
+import os
+import tempfile
+
+# One bit per vehicle-hour, set while a blocking rental covers any part of that
+# hour; rows are vehicles, columns little-endian uint64 words of 64 hours from
+# `origin`. Blocking rentals of one vehicle are at least the 6-hour booking buffer
+# apart, so they never share an hour and answers for whole-hour windows are exact.
+
+HOUR = timedelta(hours=1)
+WORD_BITS = 64
+WORD = np.dtype("<u8")
+
+# hours kept before the current one, so today's calendars fit
+PAST_HOURS = 24
+
+# spare rows allocated for vehicles added after the build
+SPARE_ROWS = 64
+
+
+def range_masks(low: int, high: int) -> Tuple[int, np.ndarray]:
+    # first word index and the masks selecting bits [low, high) in each word
+    first, last = low // WORD_BITS, (high - 1) // WORD_BITS
+    masks = []
+    for word in range(first, last + 1):
+        start = max(low, word * WORD_BITS) - word * WORD_BITS
+        stop = min(high, (word + 1) * WORD_BITS) - word * WORD_BITS
+        masks.append(((1 << (stop - start)) - 1) << start)
+    return first, np.array(masks, dtype=WORD)
+
+
+class AvailabilityBitmap:
+    # kept up to date by the same hooks as the availability index; with a folder the
+    # bits are memory-mapped to a private temporary file there, which no other
+    # process can open and which disappears on close (the bitmap is rebuilt from the
+    # database on every start, so nothing needs to outlive the process)
+    def __init__(self, origin: datetime, hours: int, capacity: int = SPARE_ROWS, folder: Optional[str] = None):
+        self.origin = origin.replace(minute=0, second=0, microsecond=0)
+        self.hours = hours
+        self.words = ceil(hours / WORD_BITS)
+        self.file = tempfile.TemporaryFile(dir=folder, prefix="car_rental.availability.") if folder else None
+        self.bits = self._allocate(max(capacity, 1))
+        self._rows: Dict[int, int] = {}  # vehicle id -> row
+        self._rentals: Dict[int, Tuple[int, int, int]] = {}  # rental id -> (row, first hour, end hour)
+        self._lock = Lock()
+
+    @classmethod
+    def build(cls, db: Session, days: int = 366, folder: Optional[str] = None,
+              now: Optional[datetime] = None) -> "AvailabilityBitmap":
+        # bitmap from the current hour minus PAST_HOURS over `days` days
+        origin = (now or datetime.utcnow()) - timedelta(hours=PAST_HOURS)
+        vehicle_ids = [vehicle_id for vehicle_id, in db.query(Vehicle.id).order_by(Vehicle.id)]
+        bitmap = cls(origin, PAST_HOURS + days * 24, len(vehicle_ids) + SPARE_ROWS, folder)
+        bitmap.reload(db, vehicle_ids)
+        return bitmap
+
+    def reload(self, db: Session, vehicle_ids: Optional[Sequence[int]] = None) -> None:
+        # rebuild from the blocking rentals stored in the database
+        if vehicle_ids is None:
+            vehicle_ids = [vehicle_id for vehicle_id, in db.query(Vehicle.id).order_by(Vehicle.id)]
+        rows = db.query(Rental.id, Rental.vehicle_id, Rental.start_at, Rental.end_at).filter(
+            Rental.booking_status.in_(inline_values(BLOCKING_BOOKING_STATUSES)),
+            Rental.approval_status.in_(BLOCKING_APPROVAL_STATUSES),
+            Rental.end_at > self.origin
+        ).all()
+        with self._lock:
+            self.bits[:] = 0
+            self._rows = {}
+            self._rentals = {}
+            for vehicle_id in vehicle_ids:
+                self._row(vehicle_id)
+            for rental_id, vehicle_id, start_at, end_at in rows:
+                self._add(rental_id, vehicle_id, start_at, end_at)
+            self._flush()
+
+    def __len__(self):
+        return len(self._rentals)
+
+    def add(self, rental: Rental) -> None:
+        # record a rental if it currently blocks its vehicle
+        if rental.booking_status not in BLOCKING_BOOKING_STATUSES or rental.approval_status not in BLOCKING_APPROVAL_STATUSES:
+            return
+        with self._lock:
+            if rental.id not in self._rentals:
+                self._add(rental.id, rental.vehicle_id, rental.start_at, rental.end_at)
+
+    def discard(self, rental_id: int) -> None:
+        # forget a rental that no longer blocks its vehicle
+        with self._lock:
+            entry = self._rentals.pop(rental_id, None)
+            if entry is not None:
+                row, low, high = entry
+                first, masks = range_masks(low, high)
+                self.bits[row, first:first + len(masks)] &= ~masks
+
+    def hour_index(self, moment: datetime) -> int:
+        # column of the hour containing moment
+        return floor((moment - self.origin) / HOUR)
+
+    def covers(self, start_at: datetime, end_at: datetime) -> bool:
+        # whether every hour touching [start_at, end_at) is inside the bitmap
+        return self.hour_index(start_at) >= 0 and ceil((end_at - self.origin) / HOUR) <= self.hours
+
+    def free_mask(self, vehicle_ids: Sequence[int], start_at: datetime, end_at: datetime) -> np.ndarray:
+        # bool per vehicle: no blocking rental in any hour touching [start_at, end_at)
+        low, high = self.hour_index(start_at), ceil((end_at - self.origin) / HOUR)
+        self._check_range(low, high)
+        first, masks = range_masks(low, high)
+        with self._lock:
+            rows = np.array([self._rows.get(vehicle_id, -1) for vehicle_id in vehicle_ids], dtype=np.int64)
+            known = rows >= 0
+            block = self.bits[rows[known], first:first + len(masks)]
+        free = np.ones(len(rows), dtype=bool)
+        free[known] = ~(block & masks).any(axis=1)
+        return free
+
+    def free_vehicles(self, db: Session, vehicle_type, start_at: datetime, end_at: datetime) -> List[int]:
+        # ids of the active vehicles of a type that are free for every hour of [start_at, end_at)
+        vehicle_ids = active_vehicle_ids(db, vehicle_type)
+        free = self.free_mask(vehicle_ids, start_at, end_at)
+        return [vehicle_id for vehicle_id, is_free in zip(vehicle_ids, free) if is_free]
+
+    def free_start_matrix(self, vehicle_ids: Sequence[int], first_hour: datetime, hours: int,
+                          duration_hours: int, buffer_hours: int) -> np.ndarray:
+        # bool (vehicles, hours): a booking of duration_hours may start at first_hour + column,
+        # keeping buffer_hours clear on both sides
+        start = self.hour_index(first_hour)
+        low, high = start - buffer_hours, start + hours + duration_hours + buffer_hours
+        self._check_range(low, high)
+        first, last = low // WORD_BITS, (high - 1) // WORD_BITS
+        with self._lock:
+            rows = np.array([self._rows.get(vehicle_id, -1) for vehicle_id in vehicle_ids], dtype=np.int64)
+            block = self.bits[np.maximum(rows, 0), first:last + 1].copy()
+        block[rows < 0] = 0  # vehicles added since the build have no rentals yet
+        busy = np.unpackbits(block.view(np.uint8), axis=1, bitorder="little")[:, low - first * WORD_BITS:high - first * WORD_BITS]
+        # busy hours inside each sliding window of duration + both buffers
+        counts = np.concatenate([np.zeros((len(rows), 1), dtype=np.int32), np.cumsum(busy, axis=1, dtype=np.int32)], axis=1)
+        span = duration_hours + 2 * buffer_hours
+        return counts[:, span:span + hours] == counts[:, :hours]
+
+    def memory_report(self) -> Dict[str, float]:
+        # bytes in use and the cost of storing 1000 vehicles for one year
+        return dict(vehicles=len(self._rows), rows=self.bits.shape[0], hours=self.hours, bytes=int(self.bits.nbytes),
+                    bytes_per_1k_vehicle_years=1000 * ceil(366 * 24 / WORD_BITS) * WORD.itemsize)
+
+    def _check_range(self, low: int, high: int) -> None:
+        if low < 0 or high > self.hours or high <= low:
+            raise ValueError("Requested hours are outside the availability bitmap.")
+
+    def _row(self, vehicle_id: int) -> int:
+        row = self._rows.get(vehicle_id)
+        if row is None:
+            row = self._rows[vehicle_id] = len(self._rows)
+            if row >= self.bits.shape[0]:
+                self._grow(2 * self.bits.shape[0])
+        return row
+
+    def _add(self, rental_id: int, vehicle_id: int, start_at: datetime, end_at: datetime) -> None:
+        low = max(self.hour_index(start_at), 0)
+        high = min(ceil((end_at - self.origin) / HOUR), self.hours)
+        row = self._row(vehicle_id)
+        if low < high:
+            first, masks = range_masks(low, high)
+            self.bits[row, first:first + len(masks)] |= masks
+            self._rentals[rental_id] = (row, low, high)
+
+    def _allocate(self, rows: int) -> np.ndarray:
+        if self.file is None:
+            return np.zeros((rows, self.words), dtype=WORD)
+        return np.memmap(self.file, dtype=WORD, mode="w+", shape=(rows, self.words))
+
+    def _grow(self, rows: int) -> None:
+        # rows are appended, existing rows keep their place in memory or in the file
+        if self.file is None:
+            bits = np.zeros((rows, self.words), dtype=WORD)
+            bits[:self.bits.shape[0]] = self.bits
+            self.bits = bits
+            return
+        self.bits.flush()
+        del self.bits
+        self.file.truncate(rows * self.words * WORD.itemsize)
+        self.bits = np.memmap(self.file, dtype=WORD, mode="r+", shape=(rows, self.words))
+
+    def _flush(self) -> None:
+        if isinstance(self.bits, np.memmap):
+            self.bits.flush()
+
+
+def active_vehicle_ids(db: Session, vehicle_type) -> List[int]:
+    # ids of non-deleted vehicles of a type, from the vehicle catalog when enabled
+    catalog = get_catalog(db)
+    if catalog is not None:
+        return [v.id for v in catalog.vehicles_of_type(db, vehicle_type)]
+    return [vehicle_id for vehicle_id, in db.query(Vehicle.id).filter(
+        Vehicle.type == vehicle_type, Vehicle.is_deleted == False).order_by(Vehicle.id)]
+
+
+def get_bitmap(db: Session) -> Optional[AvailabilityBitmap]:
+    # the bitmap attached to this session, if the application enabled one
+    return db.info.get(SESSION_KEY)
+
+
+def bitmap_folder(database_path: str) -> str:
+    # folder of the memory-mapped bitmap file: the one holding the SQLite database
+    return os.path.dirname(os.path.abspath(database_path))
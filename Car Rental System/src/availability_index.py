@@ -0,0 +1,146 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List, Tuple
+from sqlalchemy.orm import Session
+from src.models import Rental, BLOCKING_BOOKING_STATUSES, BLOCKING_APPROVAL_STATUSES, inline_values
+
+# key used to share the index with every session through Session.info
+SESSION_KEY = "availability_index"
+
+# the hour bitmap (src/availability_bitmap.py) follows the same booking hooks
+BITMAP_SESSION_KEY = "availability_bitmap"
+TRACKER_KEYS = (SESSION_KEY, BITMAP_SESSION_KEY)
+
+
+class VehicleIntervals:
+    # blocking rentals of one vehicle sorted by start time; max_ends[i] is the
+    # latest end among the first i + 1 rentals so overlap checks need one bisect
+    __slots__ = ("starts", "ends", "ids", "max_ends")
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.max_ends = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, rental_id: int, start_at: datetime, end_at: datetime) -> None:
+        i = bisect_right(self.starts, start_at)
+        self.starts.insert(i, start_at)
+        self.ends.insert(i, end_at)
+        self.ids.insert(i, rental_id)
+        self.max_ends.insert(i, end_at)
+        self._refresh_max_ends(i)
+
+    def remove(self, rental_id: int, start_at: datetime) -> None:
+        # rentals with the same start are adjacent, scan only those
+        i = bisect_left(self.starts, start_at)
+        while self.ids[i] != rental_id:
+            i += 1
+        del self.starts[i], self.ends[i], self.ids[i], self.max_ends[i]
+        self._refresh_max_ends(i)
+
+    def between(self, window_start: datetime, window_end: datetime) -> List[Tuple[datetime, datetime]]:
+        # (start, end) of the rentals overlapping the window, sorted by start
+        i = bisect_left(self.starts, window_end)
+        return [(self.starts[j], self.ends[j]) for j in range(i) if self.ends[j] > window_start]
+
+    def overlaps(self, window_start: datetime, window_end: datetime) -> bool:
+        # rentals [0, i) start before the window ends, one of them overlaps
+        # if the latest end among them is after the window starts
+        i = bisect_left(self.starts, window_end)
+        return i > 0 and self.max_ends[i - 1] > window_start
+
+    def _refresh_max_ends(self, i: int) -> None:
+        running = self.max_ends[i - 1] if i > 0 else None
+        for j in range(i, len(self.ends)):
+            end_at = self.ends[j]
+            running = end_at if running is None or end_at > running else running
+            self.max_ends[j] = running
+
+
+class AvailabilityIndex:
+    # in-process view of blocking rentals per vehicle, kept up to date by the services
+    def __init__(self, verify: bool = False):
+        self.verify = verify  # cross-check every search against the database
+        self._vehicles: Dict[int, VehicleIntervals] = {}
+        self._rentals: Dict[int, Tuple[int, datetime]] = {}  # rental id -> (vehicle id, start)
+        self._lock = Lock()
+
+    @classmethod
+    def load(cls, db: Session, verify: bool = False) -> "AvailabilityIndex":
+        index = cls(verify)
+        index.reload(db)
+        return index
+
+    def reload(self, db: Session) -> None:
+        # rebuild from the blocking rentals stored in the database
+        rows = db.query(Rental.id, Rental.vehicle_id, Rental.start_at, Rental.end_at).filter(
+            Rental.booking_status.in_(inline_values(BLOCKING_BOOKING_STATUSES)),
+            Rental.approval_status.in_(BLOCKING_APPROVAL_STATUSES)
+        ).order_by(Rental.vehicle_id, Rental.start_at).all()
+        with self._lock:
+            self._vehicles = {}
+            self._rentals = {}
+            for rental_id, vehicle_id, start_at, end_at in rows:
+                self._add(rental_id, vehicle_id, start_at, end_at)
+
+    def __len__(self):
+        return len(self._rentals)
+
+    def add(self, rental: Rental) -> None:
+        # record a rental if it currently blocks its vehicle
+        if rental.booking_status not in BLOCKING_BOOKING_STATUSES or rental.approval_status not in BLOCKING_APPROVAL_STATUSES:
+            return
+        with self._lock:
+            if rental.id not in self._rentals:
+                self._add(rental.id, rental.vehicle_id, rental.start_at, rental.end_at)
+
+    def discard(self, rental_id: int) -> None:
+        # forget a rental that no longer blocks its vehicle
+        with self._lock:
+            entry = self._rentals.pop(rental_id, None)
+            if entry is not None:
+                vehicle_id, start_at = entry
+                self._vehicles[vehicle_id].remove(rental_id, start_at)
+
+    def is_available(self, vehicle_id: int, window_start: datetime, window_end: datetime) -> bool:
+        # window bounds must already include the booking buffer
+        with self._lock:
+            intervals = self._vehicles.get(vehicle_id)
+            return intervals is None or not intervals.overlaps(window_start, window_end)
+
+    def intervals(self, vehicle_id: int, window_start: datetime, window_end: datetime) -> List[Tuple[datetime, datetime]]:
+        # blocking rentals of a vehicle overlapping the window, sorted by start
+        with self._lock:
+            intervals = self._vehicles.get(vehicle_id)
+            return intervals.between(window_start, window_end) if intervals is not None else []
+
+    def _add(self, rental_id: int, vehicle_id: int, start_at: datetime, end_at: datetime) -> None:
+        intervals = self._vehicles.get(vehicle_id)
+        if intervals is None:
+            intervals = self._vehicles[vehicle_id] = VehicleIntervals()
+        intervals.add(rental_id, start_at, end_at)
+        self._rentals[rental_id] = (vehicle_id, start_at)
+
+
+def get_index(db: Session):
+    # the index attached to this session, if the application enabled one
+    return db.info.get(SESSION_KEY)
+
+
+def track_booking(db: Session, booking: Rental) -> None:
+    for key in TRACKER_KEYS:
+        tracker = db.info.get(key)
+        if tracker is not None:
+            tracker.add(booking)
+
+
+def untrack_booking(db: Session, booking_id: int) -> None:
+    for key in TRACKER_KEYS:
+        tracker = db.info.get(key)
+        if tracker is not None:
+            tracker.discard(booking_id)
@@ -1,25 +1,51 @@
+from functools import cached_property
 from sqlalchemy.orm import Session
 from src.auth_service import AuthService
-from src.vehicle_service import VehicleService
-from src.rental_service import RentalService
-from src.admin_service import AdminService
-from src.models import Role, VehicleType, PaymentMethod, Vehicle, Rental
-from datetime import datetime
-from math import ceil
-from dateutil.parser import parse
-from tabulate import tabulate
+from src.instrumentation import instrumented
+from src.models import Role, VehicleType, PaymentMethod
+from datetime import datetime, timedelta
 
+# rows shown per page in admin reports
+REPORT_PAGE_SIZE = 20
+
+# vehicles listed by "Find Next Available"
+NEXT_AVAILABLE_SHOWN = 20
+
+
+# the welcome screen only needs AuthService; the other services (and NumPy behind
+# pricing and schedules), tabulate and dateutil load when a menu first uses them
+
+def tabulate(*args, **kwargs):
+    from tabulate import tabulate as format_table
+    return format_table(*args, **kwargs)
+
+def parse(text: str) -> datetime:
+    from dateutil.parser import parse as parse_datetime
+    return parse_datetime(text)
 
 class CLIController:
     def __init__(self, db: Session):
         # setup database session and services
         self.db = db.get_session()
+        self.settings = db.settings
         self.auth_service = AuthService(self.db)
-        self.vehicle_service = VehicleService(self.db)
-        self.rental_service = RentalService(self.db)
-        self.admin_service = AdminService(self.db)
         self.current_user = None  # store the logged-in user
 
+    @cached_property
+    def vehicle_service(self):
+        from src.vehicle_service import VehicleService
+        return VehicleService(self.db)
+
+    @cached_property
+    def rental_service(self):
+        from src.rental_service import RentalService
+        return RentalService(self.db)
+
+    @cached_property
+    def admin_service(self):
+        from src.admin_service import AdminService
+        return AdminService(self.db)
+
     def run(self):
         # entry point of the CLI
         while True:
@@ -67,7 +93,7 @@ class CLIController:
         # menu shown to customers
         while True:
             print("\nCustomer Menu:")
-            print("1. Search Vehicles\n2. Book Vehicle\n3. Cancel Booking\n4. View my Bookings\n5. Logout")
+            print("1. Search Vehicles\n2. Book Vehicle\n3. Cancel Booking\n4. View my Bookings\n5. Find Next Available\n6. Logout")
             choice = input("Select an option: ")
             try:
                 if choice == "1":
@@ -79,6 +105,8 @@ class CLIController:
                 elif choice == "4":
                     self.view_user_bookings()
                 elif choice == "5":
+                    self.find_next_available()
+                elif choice == "6":
                     self.current_user = None
                     break
                 else:
@@ -90,7 +118,7 @@ class CLIController:
         # menu shown to admins
         while True:
             print("\nAdmin Menu:")
-            print("1. Add Vehicle\n2. Update Vehicle\n3. Delete Vehicle\n4. Review Booking\n5. Issue Vehicle\n6. Return Vehicle\n7. Cancel No-Show\n8. View All Bookings\n9. View Vehicles Over Mileage\n10. View Cancelled Bookings Report\n11. Create Admin\n12. View All Vehicles\n13. Logout")
+            print("1. Add Vehicle\n2. Update Vehicle\n3. Delete Vehicle\n4. Review Booking\n5. Issue Vehicle\n6. Return Vehicle\n7. Cancel No-Show\n8. View All Bookings\n9. View Vehicles Over Mileage\n10. View Cancelled Bookings Report\n11. Create Admin\n12. View All Vehicles\n13. Bulk Review/Issue/Return\n14. Finance Reports\n15. Logout")
             choice = input("Select an option: ")
             try:
                 if choice == "1":
@@ -118,6 +146,10 @@ class CLIController:
                 elif choice == "12":
                     self.view_all_vehicles()
                 elif choice == "13":
+                    self.bulk_operations()
+                elif choice == "14":
+                    self.view_finance_report()
+                elif choice == "15":
                     self.current_user = None
                     break
                 else:
@@ -127,26 +159,46 @@ class CLIController:
 
     def search_vehicles(self):
         # customers search available vehicles
+        from src.pricing import quote_vehicles
+
         vehicle_type = input("Vehicle Type (SEDAN, SUV, VAN, HATCHBACK, TRUCK): ").upper()
         start_at = parse(input("Start Date (YYYY-MM-DD HH:MM): "))
         end_at = parse(input("End Date (YYYY-MM-DD HH:MM): "))
         vehicles = self.rental_service.search_available_vehicles(VehicleType[vehicle_type], start_at, end_at)
         
+        # price all results at once
+        quotes = quote_vehicles(vehicles, start_at, end_at)
         table = []
         for v in vehicles:
-            duration_hours = ceil((end_at - start_at).total_seconds() / 3600)
-            cost = duration_hours * v.hourly_rate_cents
-            table.append([v.id, v.plate, v.model, f"${cost/100:.2f}"])
+            table.append([v.id, v.plate, v.model, f"${quotes[v.id]/100:.2f}"])
         print(tabulate(table, headers=["ID", "Plate", "Model", "Estimated Cost"], tablefmt="grid"))
 
+    def find_next_available(self):
+        # earliest start per vehicle instead of guessing dates one search at a time
+        from src.pricing import price_cents
+
+        vehicle_type = VehicleType[input("Vehicle Type (SEDAN, SUV, VAN, HATCHBACK, TRUCK): ").upper()]
+        duration_hours = int(input("Rental Hours: "))
+        horizon_days = int(input("Look ahead how many days? (default 14): ") or 14)
+        slots = self.rental_service.find_earliest_slots(vehicle_type, duration_hours, horizon_days * 24)
+        if not slots:
+            print("No vehicle is free for that long in the next %d days." % horizon_days)
+            return
+        table = []
+        for v, start_at in slots[:NEXT_AVAILABLE_SHOWN]:
+            cost = price_cents(v.hourly_rate_cents, start_at, start_at + timedelta(hours=duration_hours))
+            table.append([v.id, v.plate, v.model, start_at.strftime("%Y-%m-%d %H:%M"), f"${cost/100:.2f}"])
+        print(tabulate(table, headers=["ID", "Plate", "Model", "Earliest Start", "Estimated Cost"], tablefmt="grid"))
+
     def book_vehicle(self):
         # create a booking
+        from src.pricing import price_cents
+
         vehicle_id = int(input("Vehicle ID: "))
         start_at = parse(input("Start Date (YYYY-MM-DD HH:MM): "))
         end_at = parse(input("End Date (YYYY-MM-DD HH:MM): "))
-        vehicle = self.db.query(Vehicle).filter(Vehicle.id == vehicle_id).first()
-        duration_hours = ceil((end_at - start_at).total_seconds() / 3600)
-        cost = duration_hours * vehicle.hourly_rate_cents
+        vehicle = self.vehicle_service.get_vehicle(vehicle_id)
+        cost = price_cents(vehicle.hourly_rate_cents, start_at, end_at)
         print(f"Estimated Cost: ${cost/100:.2f}")
         confirm = input("Confirm booking? (y/n): ")
         if confirm.lower() == "y":
@@ -162,16 +214,16 @@ class CLIController:
         self.rental_service.cancel_booking(booking_id, "CUSTOMER", reason)
         print("Booking cancelled.")
 
+    @instrumented
     def view_user_bookings(self):
-        # show all bookings for current user
-        bookings = self.db.query(Rental).filter(Rental.user_id == self.current_user.id).all()
+        # show all bookings for current user, archived history included
+        bookings = self.rental_service.list_user_bookings(self.current_user.id, include_archived=True)
         if not bookings:
             print("No bookings found.")
             return
         table = []
         for b in bookings:
-            vehicle = self.db.query(Vehicle).filter(Vehicle.id == b.vehicle_id).first()
-            table.append([b.id, vehicle.plate, vehicle.model, b.start_at, b.end_at,
+            table.append([b.id, b.plate, b.vehicle_model, b.start_at, b.end_at,
                           b.booking_status.value, b.approval_status.value, f"${b.total_rental_cents/100:.2f}"])
         print(tabulate(table, headers=["Booking ID", "Plate", "Model", "Start", "End",
                                        "Status", "Approval", "Total Cost"], tablefmt="grid"))
@@ -219,9 +271,8 @@ class CLIController:
     def issue_vehicle(self):
         # admin issues vehicle for a booking
         booking_id = int(input("Booking ID: "))
-        booking = self.db.query(Rental).filter(Rental.id == booking_id).first()
-        vehicle = self.db.query(Vehicle).filter(Vehicle.id == booking.vehicle_id).first()
-        print(f"Booking: {booking.id}, Vehicle: {vehicle.plate}, Start: {booking.start_at}, End: {booking.end_at}")
+        booking = self.admin_service.get_booking(booking_id)
+        print(f"Booking: {booking.id}, Vehicle: {booking.vehicle.plate}, Start: {booking.start_at}, End: {booking.end_at}")
         confirm = input("Confirm issue? (y/n): ")
         if confirm.lower() == "y":
             self.admin_service.issue_vehicle(booking_id)
@@ -237,45 +288,106 @@ class CLIController:
         self.admin_service.return_vehicle(booking_id, ending_mileage, surcharge_cents, comment, payment_method)
         print("Vehicle returned.")
 
+    def bulk_operations(self):
+        # admin reviews, issues or returns many bookings at once
+        print("1. Approve Bookings\n2. Reject Bookings\n3. Issue Vehicles\n4. Return Vehicles")
+        choice = input("Select an option: ")
+        if choice in ("1", "2", "3"):
+            booking_ids = [int(i) for i in input("Booking IDs (comma separated): ").replace(" ", "").split(",") if i]
+            if choice == "1":
+                results = self.admin_service.review_bookings(booking_ids, approve=True)
+            elif choice == "2":
+                results = self.admin_service.review_bookings(booking_ids, approve=False,
+                                                             reason=input("Reason: "))
+            else:
+                results = self.admin_service.issue_vehicles(booking_ids)
+        elif choice == "4":
+            # one return per line until a blank line
+            print("Enter returns as: Booking ID, Ending Mileage, Surcharge (cents), Payment Method (CARD, CASH)")
+            returns = []
+            while True:
+                line = input("> ").strip()
+                if not line:
+                    break
+                booking_id, ending_mileage, surcharge_cents, payment_method = [p.strip() for p in line.split(",")]
+                returns.append((int(booking_id), float(ending_mileage), int(surcharge_cents),
+                                PaymentMethod[payment_method.upper()]))
+            results = self.admin_service.return_vehicles(returns)
+        else:
+            print("Invalid option.")
+            return
+        table = [[booking_id, error or "Done"] for booking_id, error in results.items()]
+        print(tabulate(table, headers=["Booking ID", "Result"], tablefmt="grid"))
+
     def cancel_noshow(self):
         # admin cancels no-show bookings
-        bookings = self.admin_service.get_no_show_bookings()
-        table = []
-        for b in bookings:
-            vehicle = self.db.query(Vehicle).filter(Vehicle.id == b.vehicle_id).first()
-            table.append([b.id, vehicle.plate, b.start_at])
-            print(tabulate(table, headers=["Booking ID", "Plate", "Start"], tablefmt="grid"))
-        booking_id = int(input("Booking ID to cancel: "))
+        self.print_pages(self.admin_service.get_no_show_bookings_pages(REPORT_PAGE_SIZE),
+                         ["Booking ID", "Plate", "Start"], lambda b: [b.id, b.vehicle.plate, b.start_at])
+        answer = input("Booking ID to cancel, or 'all' to cancel every no-show: ").strip().lower()
+        if answer == "all":
+            # same rules as the background sweeper, bookings inside the grace period stay
+            settings = self.settings
+            result = self.admin_service.sweep_no_shows(timedelta(minutes=settings.noshow_grace_minutes),
+                                                       settings.noshow_sweep_batch, settings.noshow_sweep_pause)
+            print(f"{result.cancelled} no-show bookings cancelled.")
+            return
+        booking_id = int(answer)
         reason = input("Cancellation Reason: ")
         self.rental_service.cancel_booking(booking_id, "ADMIN", reason)
         print("No-show booking cancelled.")
 
+    def print_pages(self, pages, headers, to_row):
+        # print a report page by page, asking before fetching beyond the first page
+        shown = 0
+        for page in pages:
+            if shown and input("Press Enter for more results or q to stop: ").lower() == "q":
+                break
+            print(tabulate([to_row(item) for item in page], headers=headers, tablefmt="grid"))
+            shown += len(page)
+        if not shown:
+            print("No records found.")
+
+    @instrumented
     def view_bookings(self):
-        # admin views all bookings
-        bookings = self.db.query(Rental).all()
-        table = []
-        for b in bookings:
-            vehicle = self.db.query(Vehicle).filter(Vehicle.id == b.vehicle_id).first()
-            table.append([b.id, vehicle.plate, b.booking_status.value, b.approval_status.value])
-        print(tabulate(table, headers=["Booking ID", "Plate", "Status", "Approval"], tablefmt="grid"))
+        # admin views all bookings, archived history included
+        self.print_pages(self.admin_service.get_booking_rows_pages(REPORT_PAGE_SIZE, include_archived=True),
+                         ["Booking ID", "Plate", "Customer", "Status", "Approval"],
+                         lambda b: [b.id, b.plate, b.user_email, b.booking_status.value, b.approval_status.value])
 
+    @instrumented
     def view_vehicles_over_mileage(self):
         # admin views vehicles that crossed mileage threshold
-        vehicles = self.admin_service.get_vehicles_over_mileage()
+        vehicles = self.admin_service.list_vehicles_over_mileage()
         table = []
         for v in vehicles:
              table.append([v.plate, v.model, v.vehicle_mileage, v.mileage_threshold])
         print(tabulate(table, headers=["Plate", "Model", "Mileage", "Threshold"], tablefmt="grid"))
 
 
+    @instrumented
     def view_cancelled_report(self):
         # admin views cancelled bookings report
-        bookings = self.admin_service.get_cancelled_bookings()
-        table = []
-        for b in bookings:
-            vehicle = self.db.query(Vehicle).filter(Vehicle.id == b.vehicle_id).first()
-            table.append([b.id, vehicle.plate, b.cancelled_by, b.cancelled_reason])
-        print(tabulate(table, headers=["Booking ID", "Plate", "Cancelled By", "Reason"], tablefmt="grid"))
+        self.print_pages(self.admin_service.get_cancelled_booking_rows_pages(REPORT_PAGE_SIZE, include_archived=True),
+                         ["Booking ID", "Plate", "Cancelled By", "Reason"],
+                         lambda b: [b.id, b.plate, b.cancelled_by, b.cancelled_reason])
+
+    @instrumented
+    def view_finance_report(self):
+        # admin views revenue, payment mix and utilization from the daily summaries
+        today = datetime.utcnow().date()
+        start_day = parse(input("From (YYYY-MM-DD, blank for the last 30 days): ") or str(today - timedelta(days=29))).date()
+        end_day = parse(input("To (YYYY-MM-DD, blank for today): ") or str(today)).date()
+        if end_day < start_day:
+            raise ValueError("End date must not be before start date.")
+        revenue = self.admin_service.get_daily_revenue(start_day, end_day)
+        print(tabulate([[r.day, r.vehicle_type.value, r.rentals, f"${r.revenue_cents / 100:.2f}"] for r in revenue],
+                       headers=["Day", "Type", "Rentals", "Revenue"], tablefmt="grid"))
+        mix = self.admin_service.get_payment_mix(start_day, end_day)
+        print(tabulate([[r.payment_method.value, r.rentals, f"${r.revenue_cents / 100:.2f}"] for r in mix],
+                       headers=["Payment", "Rentals", "Revenue"], tablefmt="grid"))
+        utilization = self.admin_service.get_fleet_utilization(start_day, end_day)
+        print(tabulate([[u.vehicle_type.value, u.vehicles, u.rented_hours, f"{u.utilization:.1%}"] for u in utilization],
+                       headers=["Type", "Vehicles", "Rented Hours", "Utilization"], tablefmt="grid"))
 
     def create_admin(self):
         # create a new admin user
@@ -290,14 +402,10 @@ class CLIController:
         except ValueError as e:
             print(f"Error: {e}")
 
+    @instrumented
     def view_all_vehicles(self):
         # admin views all vehicles
-        vehicles = self.admin_service.get_all_vehicles()
-        if not vehicles:
-            print("No vehicles found.")
-            return
-        table = []
-        for v in vehicles:
-            status = "Deleted" if v.is_deleted else "Active"
-            table.append([v.id, v.plate, v.model, v.type.name, v.vehicle_mileage, status])
-        print(tabulate(table, headers=["ID", "Plate", "Model", "Type", "Mileage", "Status"], tablefmt="grid"))
\ No newline at end of file
+        self.print_pages(self.admin_service.get_vehicle_rows_pages(REPORT_PAGE_SIZE),
+                         ["ID", "Plate", "Model", "Type", "Mileage", "Status"],
+                         lambda v: [v.id, v.plate, v.model, v.type.name, v.vehicle_mileage,
+                                    "Deleted" if v.is_deleted else "Active"])
\ No newline at end of file
@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field, fields
+from typing import Dict, Mapping, Optional
+import os
+
+# project folder, so the default database does not depend on the working directory
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATABASE_URL = "sqlite:///" + os.path.join(PROJECT_DIR, "db", "car_rental.db")
+
+# prefix of the environment variables read by Settings.from_env, e.g. CAR_RENTAL_DATABASE_URL
+ENV_PREFIX = "CAR_RENTAL_"
+
+
+@dataclass
+class Settings:
+    # database connection
+    database_url: str = DEFAULT_DATABASE_URL
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0  # seconds to wait for a free pooled connection
+
+    # SQLite pragmas applied to every pooled connection
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kib: int = 20000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+
+    # in-memory availability index: "" (off), "on" or "verify"
+    availability_index: str = ""
+
+    # hour bitmap of blocking rentals per vehicle for calendars and fleet-wide
+    # free checks; optionally memory-mapped to a private temporary file in the
+    # SQLite database's folder
+    availability_bitmap: bool = False
+    availability_bitmap_days: int = 366  # hours covered ahead of the current day
+    availability_bitmap_mmap: bool = False
+
+    # process-local vehicle cache for searches and bookings; changes made by other
+    # processes show up once an entry is older than the TTL
+    vehicle_catalog: bool = False
+    vehicle_catalog_size: int = 10000  # vehicles kept by id, least recently used go first
+    vehicle_catalog_ttl: float = 60.0  # seconds
+
+    # no-show sweeper: approved bookings not picked up within the grace period are
+    # cancelled as SYSTEM by `python start.py sweep-noshows` or, when the interval is
+    # set, by a background thread in the CLI and API processes
+    noshow_grace_minutes: int = 60
+    noshow_sweep_interval: float = 0.0  # seconds between sweeps, 0 = no background sweeps
+    noshow_sweep_batch: int = 500  # bookings per write transaction
+    noshow_sweep_pause: float = 0.05  # seconds between batches, lets other writers in
+
+    # archiving: completed and cancelled rentals that ended more than this many days
+    # ago move to rentals_archive (python start.py archive-rentals)
+    archive_after_days: int = 365
+    archive_batch: int = 1000  # rentals per write transaction
+    archive_pause: float = 0.05  # seconds between batches, lets other writers in
+
+    # analytics export (python start.py export): rows read and written per chunk
+    export_chunk: int = 10000
+
+    # password hashing
+    bcrypt_rounds: int = 12
+    hash_workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+
+    # per-method query counts and latency (python start.py stats)
+    instrumentation: bool = False
+    slow_query_ms: float = 200.0  # log statements at least this slow, 0 turns the log off
+    stats_file: str = os.path.join(PROJECT_DIR, "db", "stats.json")  # written on exit when instrumented
+
+    # HTTP API (python start.py serve)
+    api_host: str = "127.0.0.1"
+    api_port: int = 8080
+    api_threads: int = 64  # worker threads per process, each serves one connection at a time
+    api_processes: int = 1  # pre-forked processes sharing the listening socket
+    api_secret: str = ""  # key signing access tokens, random per start when empty
+    api_token_ttl: int = 3600  # seconds
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None, **overrides) -> "Settings":
+        # read CAR_RENTAL_<FIELD> variables, converting to each field's type
+        environ = os.environ if environ is None else environ
+        values: Dict[str, object] = {}
+        for f in fields(cls):
+            raw = environ.get(ENV_PREFIX + f.name.upper())
+            if raw is None or raw == "":
+                continue
+            if f.type is bool:
+                values[f.name] = raw.strip().lower() in ("1", "true", "on", "yes")
+                continue
+            try:
+                values[f.name] = f.type(raw)
+            except ValueError:
+                raise ValueError(f"Invalid value for {ENV_PREFIX + f.name.upper()}: {raw!r}")
+        values.update(overrides)
+        return cls(**values)
+
+    def sqlite_pragmas(self) -> Dict[str, object]:
+        # pragmas in the order they are applied on connect
+        return {
+            "journal_mode": self.sqlite_journal_mode,
+            "synchronous": self.sqlite_synchronous,
+            "busy_timeout": self.sqlite_busy_timeout_ms,
+            "cache_size": -self.sqlite_cache_size_kib,  # negative values are KiB
+            "mmap_size": self.sqlite_mmap_size,
+        }
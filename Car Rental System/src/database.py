@@ -1,33 +1,222 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from src.config import Settings
 from src.models import Base
+from db.migrations import ensure_schema
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import os
 
-class Database:
-    _instance = None  
+# Session.info key of the innermost open transaction() block
+TRANSACTION_KEY = "transaction_scope"
+
+# Session.info key of the Settings of the Database a session came from
+SETTINGS_KEY = "settings"
+
+def create_sqlite_engine(url, pragmas: Optional[Dict[str, object]] = None, **kwargs):
+    # SQLite engine where SQLAlchemy, not the sqlite3 driver, emits BEGIN; a
+    # transaction can then ask for a write lock up front with the
+    # "sqlite_begin" execution option (e.g. "IMMEDIATE")
+    engine = create_engine(url, **kwargs)
+    configure_sqlite_engine(engine, pragmas)
+    return engine
+
+
+def configure_sqlite_engine(engine, pragmas: Optional[Dict[str, object]] = None) -> None:
+    # install the BEGIN handling and per-connection pragmas on a (sync) engine;
+    # also used for the sync_engine behind the async engine
+    @event.listens_for(engine, "connect")
+    def configure_connection(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        # pragmas are per connection, apply them to every new pooled connection
+        cursor = dbapi_connection.cursor()
+        for name, value in (pragmas or {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def begin(conn):
+        conn.exec_driver_sql("BEGIN " + conn.get_execution_options().get("sqlite_begin", "DEFERRED"))
+
+
+def pool_options(settings: Settings) -> Dict[str, object]:
+    return dict(pool_size=settings.pool_size, max_overflow=settings.max_overflow,
+                pool_timeout=settings.pool_timeout)
+
+
+def is_memory_database(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def ensure_database_folder(url) -> None:
+    # make sure the folder of a SQLite database file exists
+    folder = os.path.dirname(url.database)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+
+def create_engine_from_settings(settings: Settings):
+    # engine for the configured URL with pooling, plus pragmas on SQLite
+    url = make_url(settings.database_url)
+    if url.get_backend_name() != "sqlite":
+        return create_engine(url, pool_pre_ping=True, **pool_options(settings))
+
+    if is_memory_database(url):
+        # in-memory databases live in one connection per thread that all sessions
+        # share, so leave transaction handling to the driver; no pooling or WAL
+        return create_engine(url)
+
+    ensure_database_folder(url)
+    return create_sqlite_engine(url, settings.sqlite_pragmas(), **pool_options(settings))
+
+
+def begin_write(session) -> None:
+    # start a transaction that holds the write lock before its first read, so
+    # a check and the write that depends on it cannot interleave with other writers;
+    # inside a transaction() block the block's transaction already holds it
+    if in_transaction_scope(session):
+        return
+    if session.in_transaction():
+        session.commit()
+    session.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
 
-    def __new__(cls):
-        
-        if cls._instance is None:
-            cls._instance = super(Database, cls).__new__(cls)
 
-            # set database file path
-            db_path = os.path.join("db", "car_rental.db")
+class TransactionScope:
+    # one transaction() block and the callbacks waiting for its outermost commit
+    def __init__(self, parent: Optional["TransactionScope"] = None):
+        self.parent = parent
+        self.after_commit: List[Tuple[Callable, tuple]] = []
 
-            # make sure "db" folder exists
-            os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
-            # create SQLite engine
-            cls._engine = create_engine(f"sqlite:///{db_path}")
+def in_transaction_scope(session) -> bool:
+    return session.info.get(TRANSACTION_KEY) is not None
 
-            # create tables if they don't exist
-            Base.metadata.create_all(cls._engine)
 
-            # session factory
-            cls._Session = sessionmaker(bind=cls._engine)
+@contextmanager
+def transaction(session) -> Iterator[TransactionScope]:
+    # group several service calls into one write transaction and one commit:
+    #   with transaction(session):
+    #       user = auth_service.register(...)
+    #       rental_service.create_booking(user.id, ...)
+    # services flush instead of committing inside the block and queue their cache
+    # updates (availability index, vehicle catalog) until it commits; an exception
+    # rolls everything back. A nested block is a savepoint, so a caller can catch a
+    # failed step without losing the steps before it.
+    parent = session.info.get(TRANSACTION_KEY)
+    scope = TransactionScope(parent)
+    if parent is None:
+        begin_write(session)
+        savepoint = None
+    else:
+        savepoint = session.begin_nested()
+    session.info[TRANSACTION_KEY] = scope
+    try:
+        yield scope
+        if savepoint is None:
+            session.commit()
+        else:
+            savepoint.commit()
+    except BaseException:
+        if savepoint is None:
+            session.rollback()
+        else:
+            savepoint.rollback()
+        raise
+    finally:
+        session.info[TRANSACTION_KEY] = parent
+    if parent is not None:
+        parent.after_commit.extend(scope.after_commit)
+        return
+    for callback, args in scope.after_commit:
+        callback(*args)
 
-        return cls._instance
+
+def commit(session) -> None:
+    # commit a service operation, or only flush it inside a transaction() block so
+    # the block commits once and later steps see the rows
+    if in_transaction_scope(session):
+        session.flush()
+    else:
+        session.commit()
+
+
+def after_commit(session, callback: Callable, *args) -> None:
+    # run callback(*args) once the changes are committed: now, or when the outermost
+    # transaction() block commits; dropped if the block rolls back
+    scope = session.info.get(TRANSACTION_KEY)
+    if scope is None:
+        callback(*args)
+    else:
+        scope.after_commit.append((callback, args))
+
+
+class Database:
+    # engine, schema check and session factory for one database; create one per
+    # application (or per test) and hand its sessions to the services
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or Settings.from_env()
+        self.engine = create_engine_from_settings(self.settings)
+        if self.settings.instrumentation:
+            # statement timing hooks are only installed when asked for
+            from src.instrumentation import get_instrumentation
+            instrumentation = get_instrumentation()
+            instrumentation.enable(self.settings.slow_query_ms)
+            instrumentation.instrument_engine(self.engine)
+
+        # create tables and migrate only when the recorded schema version is behind
+        ensure_schema(self.engine, Base.metadata)
+
+        # session factory
+        self.session_factory = sessionmaker(bind=self.engine)
+
+        # shared components handed to every session through Session.info
+        self.session_info = {SETTINGS_KEY: self.settings}
+
+    @classmethod
+    def from_url(cls, database_url: str, **settings) -> "Database":
+        return cls(Settings(database_url=database_url, **settings))
 
     def get_session(self):
         # open a new database session
-        return self._Session()
+        return self.session_factory(info=dict(self.session_info))
+
+    def enable_availability_index(self, verify: bool = False):
+        # load blocking rentals into memory and share the index with all new sessions
+        from src.availability_index import AvailabilityIndex, SESSION_KEY
+
+        session = self.get_session()
+        try:
+            index = AvailabilityIndex.load(session, verify)
+        finally:
+            session.close()
+        self.session_info[SESSION_KEY] = index
+        return index
+
+    def enable_availability_bitmap(self):
+        # build the hour bitmap from the blocking rentals and share it with all new sessions
+        from src.availability_bitmap import AvailabilityBitmap, SESSION_KEY, bitmap_folder
+
+        url = make_url(self.settings.database_url)
+        folder = None
+        if self.settings.availability_bitmap_mmap and url.get_backend_name() == "sqlite" and not is_memory_database(url):
+            folder = bitmap_folder(url.database)
+        session = self.get_session()
+        try:
+            bitmap = AvailabilityBitmap.build(session, self.settings.availability_bitmap_days, folder)
+        finally:
+            session.close()
+        self.session_info[SESSION_KEY] = bitmap
+        return bitmap
+
+    def enable_vehicle_catalog(self):
+        # share one vehicle catalog cache with all new sessions
+        from src.vehicle_catalog import VehicleCatalog, SESSION_KEY
+
+        catalog = VehicleCatalog(self.settings.vehicle_catalog_size, self.settings.vehicle_catalog_ttl)
+        self.session_info[SESSION_KEY] = catalog
+        return catalog
+
+    def dispose(self) -> None:
+        # close every pooled connection
+        self.engine.dispose()
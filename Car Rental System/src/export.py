@@ -0,0 +1,196 @@
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+from sqlalchemy import Boolean, DateTime, Float, Integer, null, or_, select
+from src.archive import RENTAL_COLUMN_NAMES
+from src.models import ArchivedRental, Rental, User, Vehicle
+import csv
+import os
+
+# Rentals joined with their vehicle and customer for analytics, streamed chunk by
+# chunk from one read transaction (a single WAL snapshot on SQLite, so live bookings
+# keep committing while it runs). Writes Parquet or Arrow IPC when pyarrow is
+# installed, CSV otherwise. Incremental exports read only rentals whose updated_at
+# lies after the previous watermark, through the updated_at indexes (migration v004).
+
+# rows fetched from the cursor and written per chunk
+EXPORT_CHUNK_SIZE = 10000
+
+# rows updated within this lag of the export are left for the next run, so a write
+# transaction that set updated_at before the snapshot but committed after it is
+# never skipped
+WATERMARK_LAG = timedelta(minutes=1)
+
+# output format by file extension
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".csv": "csv"}
+
+# customer and vehicle columns next to the rental columns; never the password hash
+USER_COLUMNS = ["email", "first_name", "last_name", "role"]
+VEHICLE_COLUMNS = ["plate", "model", "type", "year", "hourly_rate_cents"]
+
+
+class ExportReport(NamedTuple):
+    rows: int
+    chunks: int
+    since: Optional[datetime]  # previous watermark, None for a full export
+    watermark: datetime  # every rental updated up to this point is exported
+
+
+def export_columns(model) -> List:
+    # labelled columns of one rentals table; archived_at is empty for live rentals
+    archived_at = model.archived_at if model is ArchivedRental else null().label("archived_at")
+    columns = [getattr(model, name) for name in RENTAL_COLUMN_NAMES] + [archived_at]
+    columns += [getattr(Vehicle, name).label(f"vehicle_{name}") for name in VEHICLE_COLUMNS]
+    columns += [getattr(User, name).label(f"user_{name}") for name in USER_COLUMNS]
+    return columns
+
+
+def export_query(model, since: Optional[datetime], until: datetime):
+    # rentals of one table updated in (since, until]
+    query = select(*export_columns(model)).join(Vehicle, Vehicle.id == model.vehicle_id).join(
+        User, User.id == model.user_id)
+    if since is None:
+        return query.where(or_(model.updated_at <= until, model.updated_at == None))
+    return query.where(model.updated_at > since, model.updated_at <= until)
+
+
+def export_format(path: str, pyarrow_available: Optional[bool] = None) -> str:
+    # format for an output path; Parquet and Arrow need pyarrow
+    fmt = FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None:
+        raise ValueError(f"Unsupported export file type, use one of: {', '.join(FORMATS)}.")
+    if pyarrow_available is None:
+        pyarrow_available = has_pyarrow()
+    if fmt != "csv" and not pyarrow_available:
+        raise ValueError("Parquet and Arrow exports need pyarrow (pip install pyarrow), export to a .csv file instead.")
+    return fmt
+
+
+def has_pyarrow() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def plain(value):
+    # enum members as their stored value
+    return value.value if isinstance(value, Enum) else value
+
+
+class CsvWriter:
+    def __init__(self, path: str, names: Sequence[str]):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(names)
+
+    def write(self, rows: List[tuple]) -> None:
+        self.writer.writerows([["" if value is None else plain(value) for value in row] for row in rows])
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ArrowWriter:
+    # Parquet row groups or Arrow IPC record batches, one per chunk
+    def __init__(self, path: str, names: Sequence[str], column_types: Sequence, fmt: str):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.schema = pa.schema([(name, arrow_type(pa, column_type)) for name, column_type in zip(names, column_types)])
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+    def write(self, rows: List[tuple]) -> None:
+        columns = [self.pa.array([plain(value) for value in values], type=field.type)
+                   for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_batch(self.pa.record_batch(columns, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+def arrow_type(pa, column_type):
+    # Arrow type for a SQLAlchemy column type; enums and strings become strings
+    if isinstance(column_type, Boolean):
+        return pa.bool_()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def open_writer(path: str, fmt: str, names: Sequence[str], column_types: Sequence):
+    if fmt == "csv":
+        return CsvWriter(path, names)
+    return ArrowWriter(path, names, column_types, fmt)
+
+
+def read_chunks(connection, since: Optional[datetime], until: datetime,
+                chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    # chunks of export rows from the live and the archived rentals; the caller keeps
+    # the connection in one transaction so both tables come from the same snapshot
+    for model in (Rental, ArchivedRental):
+        result = connection.execution_options(stream_results=True).execute(export_query(model, since, until))
+        for rows in result.partitions(chunk_size):
+            yield [tuple(row) for row in rows]
+
+
+def export_rentals(engine, path: str, since: Optional[datetime] = None, chunk_size: int = EXPORT_CHUNK_SIZE,
+                   fmt: Optional[str] = None, now: Optional[datetime] = None) -> ExportReport:
+    # write rentals updated after `since` (all of them when None) to path; the file
+    # only appears once the export is complete
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be at least 1.")
+    fmt = fmt or export_format(path)
+    until = (now or datetime.utcnow()) - WATERMARK_LAG
+    if since is not None:
+        until = max(until, since)  # a second run within the lag exports nothing
+    columns = export_columns(Rental)
+    names = [column.key for column in columns]
+    column_types = [column.type for column in columns]
+    column_types[names.index("archived_at")] = ArchivedRental.archived_at.type
+
+    partial = path + ".partial"
+    rows = chunks = 0
+    writer = open_writer(partial, fmt, names, column_types)
+    try:
+        with engine.connect() as connection, connection.begin():
+            for chunk in read_chunks(connection, since, until, chunk_size):
+                writer.write(chunk)
+                rows += len(chunk)
+                chunks += 1
+    except BaseException:
+        writer.close()
+        os.remove(partial)
+        raise
+    writer.close()
+    os.replace(partial, path)
+    return ExportReport(rows, chunks, since, until)
+
+
+def read_watermark(path: str) -> Optional[datetime]:
+    # watermark saved by the previous export, None before the first one
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid watermark in {path}: {text!r}.")
+
+
+def write_watermark(path: str, watermark: datetime) -> None:
+    partial = path + ".partial"
+    with open(partial, "w", encoding="utf-8") as f:
+        f.write(watermark.isoformat() + "\n")
+    os.replace(partial, path)
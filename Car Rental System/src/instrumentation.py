@@ -0,0 +1,242 @@
+from bisect import bisect_left
+from collections import deque
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+from typing import Callable, Dict, List, Optional
+import json
+import logging
+import time
+
+# Per-method SQL statement counts, database time and latency histograms.
+# Service methods are wrapped with @instrumented / instrument_class; engine events
+# attribute every statement to the innermost instrumented call running in the
+# same thread or task. While disabled the wrappers only check one flag and no
+# engine events are installed.
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(__name__ + ".slow_queries")
+
+# histogram bucket upper bounds in milliseconds (Prometheus "le" labels)
+LATENCY_BUCKETS_MS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+# percentiles are computed over the most recent calls of each method
+RECENT_CALLS = 2048
+
+
+class CallStats:
+    # statements and database time of one running call, nested calls roll up into their parent
+    __slots__ = ("parent", "queries", "db_ms")
+
+    def __init__(self, parent: Optional["CallStats"]):
+        self.parent = parent
+        self.queries = 0
+        self.db_ms = 0.0
+
+
+class MethodStats:
+    # totals of one instrumented method
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.queries = 0
+        self.db_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)  # last one is +Inf
+        self.recent = deque(maxlen=RECENT_CALLS)
+
+    def record(self, elapsed_ms: float, call: CallStats, failed: bool) -> None:
+        self.calls += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.queries += call.queries
+        self.db_ms += call.db_ms
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        self.recent.append(elapsed_ms)
+
+    def snapshot(self) -> Dict:
+        recent = sorted(self.recent)
+        return dict(calls=self.calls, errors=self.errors, total_ms=round(self.total_ms, 3),
+                    queries=self.queries, db_ms=round(self.db_ms, 3),
+                    p50_ms=percentile(recent, 0.50), p95_ms=percentile(recent, 0.95), p99_ms=percentile(recent, 0.99),
+                    buckets=list(self.buckets))
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))], 3)
+
+
+class Instrumentation:
+    # process-wide registry, see get_instrumentation()
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = 0.0  # 0 turns the slow-query log off
+        self._methods: Dict[str, MethodStats] = {}
+        self._queries = 0
+        self._db_ms = 0.0
+        self._slow_queries = 0
+        self._lock = Lock()
+        self._current: ContextVar[Optional[CallStats]] = ContextVar("instrumented_call", default=None)
+
+    def enable(self, slow_query_ms: float = 0.0) -> None:
+        self.slow_query_ms = slow_query_ms
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._methods = {}
+            self._queries = 0
+            self._db_ms = 0.0
+            self._slow_queries = 0
+
+    def call(self, name: str, func: Callable, args, kwargs):
+        # run func as an instrumented call named name
+        parent = self._current.get()
+        call = CallStats(parent)
+        token = self._current.set(call)
+        failed = True
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._current.reset(token)
+            if parent is not None:
+                parent.queries += call.queries
+                parent.db_ms += call.db_ms
+            with self._lock:
+                stats = self._methods.get(name)
+                if stats is None:
+                    stats = self._methods[name] = MethodStats()
+                stats.record(elapsed_ms, call, failed)
+
+    def record_query(self, statement: str, elapsed_ms: float) -> None:
+        call = self._current.get()
+        if call is not None:
+            call.queries += 1
+            call.db_ms += elapsed_ms
+        with self._lock:
+            self._queries += 1
+            self._db_ms += elapsed_ms
+            slow = self.slow_query_ms and elapsed_ms >= self.slow_query_ms
+            if slow:
+                self._slow_queries += 1
+        if slow:
+            slow_query_logger.warning("Slow query (%.1f ms): %s", elapsed_ms, " ".join(statement.split()))
+
+    def instrument_engine(self, engine) -> None:
+        # time every statement on this engine; BEGIN/COMMIT issued by the driver are not counted
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info["query_started"].pop()
+            if self.enabled:
+                self.record_query(statement, (time.perf_counter() - started) * 1000)
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(context):
+            # failed statements never reach after_cursor_execute
+            started = context.connection.info.get("query_started") if context.connection is not None else None
+            if started:
+                started.pop()
+
+    def snapshot(self) -> Dict:
+        # plain data for the exporters, also what dump() writes
+        with self._lock:
+            return dict(queries=self._queries, db_ms=round(self._db_ms, 3), slow_queries=self._slow_queries,
+                        slow_query_ms=self.slow_query_ms, buckets_ms=LATENCY_BUCKETS_MS,
+                        methods={name: stats.snapshot() for name, stats in sorted(self._methods.items())})
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+_instrumentation = Instrumentation()
+
+
+def get_instrumentation() -> Instrumentation:
+    return _instrumentation
+
+
+def instrumented(func: Callable = None, name: Optional[str] = None):
+    # record calls of a function under name (default: its qualified name)
+    if func is None:
+        return lambda f: instrumented(f, name)
+    label = name or func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _instrumentation.enabled:
+            return func(*args, **kwargs)
+        return _instrumentation.call(label, func, args, kwargs)
+    return wrapper
+
+
+def instrument_class(cls):
+    # class decorator: instrument every public method defined on the class
+    for attr, value in list(vars(cls).items()):
+        if not attr.startswith("_") and callable(value):
+            setattr(cls, attr, instrumented(value, f"{cls.__name__}.{attr}"))
+    return cls
+
+
+def format_prometheus(snapshot: Dict, prefix: str = "car_rental") -> str:
+    # Prometheus text exposition format
+    lines = [
+        f"# HELP {prefix}_db_queries_total SQL statements executed.",
+        f"# TYPE {prefix}_db_queries_total counter",
+        f"{prefix}_db_queries_total {snapshot['queries']}",
+        f"# HELP {prefix}_db_seconds_total Time spent executing SQL statements.",
+        f"# TYPE {prefix}_db_seconds_total counter",
+        f"{prefix}_db_seconds_total {snapshot['db_ms'] / 1000:.6f}",
+        f"# HELP {prefix}_slow_queries_total Statements slower than the slow-query threshold.",
+        f"# TYPE {prefix}_slow_queries_total counter",
+        f"{prefix}_slow_queries_total {snapshot['slow_queries']}",
+    ]
+    methods = snapshot["methods"]
+    for metric, kind, help_text, key, scale in (
+            ("method_calls_total", "counter", "Calls per service method.", "calls", 1),
+            ("method_errors_total", "counter", "Calls that raised an exception.", "errors", 1),
+            ("method_db_queries_total", "counter", "SQL statements per service method.", "queries", 1),
+            ("method_db_seconds_total", "counter", "Database time per service method.", "db_ms", 1000)):
+        lines += [f"# HELP {prefix}_{metric} {help_text}", f"# TYPE {prefix}_{metric} {kind}"]
+        for name, stats in methods.items():
+            value = stats[key] / scale if scale != 1 else stats[key]
+            lines.append(f'{prefix}_{metric}{{method="{name}"}} {value}')
+
+    lines += [f"# HELP {prefix}_method_duration_seconds Latency per service method.",
+              f"# TYPE {prefix}_method_duration_seconds histogram"]
+    for name, stats in methods.items():
+        cumulative = 0
+        for bound, count in zip(snapshot["buckets_ms"] + ["+Inf"], stats["buckets"]):
+            cumulative += count
+            le = bound if bound == "+Inf" else f"{bound / 1000:g}"
+            lines.append(f'{prefix}_method_duration_seconds_bucket{{method="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'{prefix}_method_duration_seconds_sum{{method="{name}"}} {stats["total_ms"] / 1000:.6f}')
+        lines.append(f'{prefix}_method_duration_seconds_count{{method="{name}"}} {stats["calls"]}')
+    return "\n".join(lines) + "\n"
+
+
+def format_table(snapshot: Dict) -> str:
+    from tabulate import tabulate
+
+    rows = [[name, s["calls"], s["errors"], f"{s['queries'] / s['calls']:.1f}" if s["calls"] else "-",
+             f"{s['db_ms'] / s['calls']:.2f}" if s["calls"] else "-", s["p50_ms"], s["p95_ms"], s["p99_ms"]]
+            for name, s in snapshot["methods"].items()]
+    table = tabulate(rows, headers=["Method", "Calls", "Errors", "Queries/call", "DB ms/call", "p50 ms", "p95 ms",
+                                    "p99 ms"], tablefmt="grid")
+    return (f"{table}\nStatements: {snapshot['queries']}, DB time: {snapshot['db_ms']:.1f} ms, "
+            f"slow (>= {snapshot['slow_query_ms']} ms): {snapshot['slow_queries']}")
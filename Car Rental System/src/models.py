@@ -1,8 +1,8 @@
 from datetime import datetime 
 from enum import Enum
-from sqlalchemy import Column, Integer, String, Enum as SQLEnum, DateTime, Boolean, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Enum as SQLEnum, Date, DateTime, Boolean, ForeignKey, Float, Index, bindparam
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import validates
+from sqlalchemy.orm import declared_attr, validates, relationship
 import re
 
 Base = declarative_base()
@@ -38,6 +38,15 @@ class PaymentMethod(Enum):
     CARD = "CARD"
     CASH = "CASH"
 
+# bookings in these states keep the vehicle blocked
+BLOCKING_BOOKING_STATUSES = [BookingStatus.REQUESTED, BookingStatus.ACTIVE]
+BLOCKING_APPROVAL_STATUSES = [ApprovalStatus.PENDING, ApprovalStatus.APPROVED]
+
+def inline_values(values):
+    # render an IN list as literals instead of bound parameters, SQLite only uses
+    # a partial index when the query repeats the index WHERE clause literally
+    return bindparam(None, values, expanding=True, literal_execute=True)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
@@ -81,8 +90,13 @@ class Vehicle(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-class Rental(Base):
-    __tablename__ = "rentals"
+    __table_args__ = (
+        # search filters vehicles by type among the non-deleted ones
+        Index("ix_vehicles_type_is_deleted", "type", "is_deleted"),
+    )
+
+class RentalColumns:
+    # columns shared by the live rentals table and the archive
     id = Column(Integer, primary_key=True)
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -98,8 +112,73 @@ class Rental(Base):
     cancelled_at = Column(DateTime, nullable=True)
     cancelled_reason = Column(String, nullable=True)
     cancelled_by = Column(String, nullable=True)
+    reject_reason = Column(String, nullable=True)  # given when an admin rejects the booking
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     issued_at = Column(DateTime, nullable=True)  # when approved
     completed_at = Column(DateTime, nullable=True)  # when rental finished
     paid_at = Column(DateTime, nullable=True)  # when payment done
+
+    # many-to-one links, eager-load them in listings to avoid one query per row
+    @declared_attr
+    def vehicle(cls):
+        return relationship("Vehicle")
+
+    @declared_attr
+    def user(cls):
+        return relationship("User")
+
+class Rental(RentalColumns, Base):
+    __tablename__ = "rentals"
+
+    @declared_attr.directive
+    def __table_args__(cls):
+        return (
+            # overlap checks only look at blocking bookings of one vehicle
+            Index("ix_rentals_blocking_window", "vehicle_id", "start_at", "end_at",
+                  sqlite_where=cls.booking_status.in_(BLOCKING_BOOKING_STATUSES),
+                  postgresql_where=cls.booking_status.in_(BLOCKING_BOOKING_STATUSES)),
+            # per-customer booking listing
+            Index("ix_rentals_user_id", "user_id"),
+            # no-show and cancellation reports
+            Index("ix_rentals_status_approval_start", "booking_status", "approval_status", "start_at"),
+            # incremental analytics exports
+            Index("ix_rentals_updated_at", "updated_at"),
+            # ids are never reused, archived rentals keep theirs (migration v005)
+            {"sqlite_autoincrement": True},
+        )
+
+# completed and cancelled rentals moved out of the live table (src/archive.py);
+# ids are kept, so a booking has the same id before and after archiving
+class ArchivedRental(RentalColumns, Base):
+    __tablename__ = "rentals_archive"
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # history listings per customer and of cancellations
+        Index("ix_rentals_archive_user_id", "user_id"),
+        Index("ix_rentals_archive_status", "booking_status"),
+        Index("ix_rentals_archive_updated_at", "updated_at"),
+    )
+
+# summary tables kept up to date in the same transaction as the rental changes
+# (src/aggregates.py), so finance reports never scan the rentals table
+class DailyVehicleStats(Base):
+    __tablename__ = "daily_vehicle_stats"
+    day = Column(Date, primary_key=True)  # UTC day of the event
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), primary_key=True)
+    vehicle_type = Column(SQLEnum(VehicleType), primary_key=True)
+    issued = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    cancelled = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(Integer, nullable=False, default=0)  # total of rentals returned that day
+    rented_hours = Column(Float, nullable=False, default=0)  # hours the vehicle was out that day
+
+class DailyRevenueStats(Base):
+    __tablename__ = "daily_revenue_stats"
+    day = Column(Date, primary_key=True)
+    vehicle_type = Column(SQLEnum(VehicleType), primary_key=True)
+    payment_method = Column(SQLEnum(PaymentMethod), primary_key=True)
+    rentals = Column(Integer, nullable=False, default=0)
+    revenue_cents = Column(Integer, nullable=False, default=0)
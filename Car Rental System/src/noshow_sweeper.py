@@ -0,0 +1,48 @@
+from datetime import timedelta
+from threading import Event, Thread
+from typing import Optional
+from src.admin_service import AdminService, NoShowSweep
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def sweep_once(db, settings=None) -> NoShowSweep:
+    # one sweep with the configured grace period, batch size and pause, in its own session
+    settings = settings or db.settings
+    session = db.get_session()
+    try:
+        return AdminService(session).sweep_no_shows(
+            timedelta(minutes=settings.noshow_grace_minutes), settings.noshow_sweep_batch, settings.noshow_sweep_pause)
+    finally:
+        session.close()
+
+
+class NoShowSweeper:
+    # background thread cancelling no-shows every `interval` seconds
+    def __init__(self, db, interval: float):
+        self.db = db
+        self.interval = interval
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> "NoShowSweeper":
+        self._thread = Thread(target=self._run, name="noshow-sweeper", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                result = sweep_once(self.db)
+            except Exception:
+                # a busy database or a transient error must not end the thread
+                logger.exception("No-show sweep failed")
+                continue
+            if result.cancelled:
+                logger.info("Cancelled %d no-show bookings in %d batches", result.cancelled, result.batches)
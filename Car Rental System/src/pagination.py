@@ -0,0 +1,57 @@
+from heapq import merge
+from typing import Iterator, List, Sequence
+from sqlalchemy.orm import Query
+
+# default number of rows per page for reports
+DEFAULT_PAGE_SIZE = 50
+
+
+def keyset_pages(query: Query, key_column, page_size: int = DEFAULT_PAGE_SIZE, after=None) -> Iterator[List]:
+    # yield pages ordered by a unique key, each page seeks past the last key of the
+    # previous one so the cost per page stays the same however deep the report goes
+    if page_size < 1:
+        raise ValueError("Page size must be at least 1.")
+    while True:
+        page_query = query if after is None else query.filter(key_column > after)
+        page = page_query.order_by(key_column).limit(page_size).all()
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = getattr(page[-1], key_column.key)
+
+
+def stream(query: Query, key_column, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator:
+    # yield rows one by one, fetching page_size rows at a time from the cursor
+    if page_size < 1:
+        raise ValueError("Page size must be at least 1.")
+    return iter(query.order_by(key_column).yield_per(page_size))
+
+
+def merged_keyset_pages(queries: Sequence[Query], key_name: str, page_size: int = DEFAULT_PAGE_SIZE,
+                        after=None) -> Iterator[List]:
+    # keyset pages over several tables sharing a unique key (live and archived rentals),
+    # merged in key order; each page costs one query per table
+    if page_size < 1:
+        raise ValueError("Page size must be at least 1.")
+    while True:
+        rows = []
+        for query in queries:
+            key_column = getattr(query.column_descriptions[0]["entity"], key_name)
+            page_query = query if after is None else query.filter(key_column > after)
+            rows.extend(page_query.order_by(key_column).limit(page_size).all())
+        page = sorted(rows, key=lambda row: getattr(row, key_name))[:page_size]
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = getattr(page[-1], key_name)
+
+
+def merged_stream(queries: Sequence[Query], key_name: str, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator:
+    # stream() over several tables, merged in key order
+    if page_size < 1:
+        raise ValueError("Page size must be at least 1.")
+    streams = [stream(query, getattr(query.column_descriptions[0]["entity"], key_name), page_size) for query in queries]
+    return merge(*streams, key=lambda row: getattr(row, key_name))
+
@@ -0,0 +1,93 @@
+import bcrypt
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+from src.config import Settings
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def hash_rounds(hashed: str) -> int:
+    # cost recorded in a bcrypt hash, e.g. "$2b$12$..." -> 12
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        raise ValueError("Not a bcrypt hash.")
+
+
+class PasswordHasher:
+    # bcrypt hashing on a worker pool with a configurable cost; each extra round
+    # doubles the cost, bcrypt releases the GIL so threads run in parallel
+    def __init__(self, rounds: int = 12, max_workers: int = 1, use_processes: bool = False):
+        if not 4 <= rounds <= 31:
+            raise ValueError("bcrypt rounds must be between 4 and 31.")
+        self.rounds = rounds
+        self.max_workers = max(1, max_workers)
+        self.use_processes = use_processes
+        self._executor: Optional[Executor] = None
+        self._lock = Lock()
+
+    def _pool(self) -> Executor:
+        # start workers on first use so importing this module stays cheap
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    pool = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+                    self._executor = pool(max_workers=self.max_workers)
+        return self._executor
+
+    def submit_hash(self, password: str) -> Future:
+        return self._pool().submit(_hash, password, self.rounds)
+
+    def submit_verify(self, password: str, hashed: str) -> Future:
+        return self._pool().submit(_verify, password, hashed)
+
+    def hash(self, password: str) -> str:
+        return self.submit_hash(password).result()
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self.submit_verify(password, hashed).result()
+
+    def verify_many(self, pairs: Iterable[Tuple[str, str]]) -> List[bool]:
+        # check many (password, hash) pairs in parallel, results in input order
+        futures = [self.submit_verify(password, hashed) for password, hashed in pairs]
+        return [future.result() for future in futures]
+
+    def needs_rehash(self, hashed: str) -> bool:
+        # stored hashes made with a lower cost are upgraded on the next login; higher
+        # ones are kept, lowering the setting never weakens existing hashes
+        return hash_rounds(hashed) < self.rounds
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+# shared hashers by (rounds, workers), so every session of a Database uses one pool
+_default_hashers: Dict[Tuple[int, int], PasswordHasher] = {}
+_env_settings: Optional[Settings] = None
+_hashers_lock = Lock()
+
+
+def get_default_hasher(settings: Optional[Settings] = None) -> PasswordHasher:
+    # process-wide hasher used when a service is not given one, configured from the
+    # given settings (a Database's), or from CAR_RENTAL_BCRYPT_ROUNDS and
+    # CAR_RENTAL_HASH_WORKERS for callers without a Database
+    global _env_settings
+    if settings is None:
+        if _env_settings is None:
+            _env_settings = Settings.from_env()
+        settings = _env_settings
+    key = (settings.bcrypt_rounds, settings.hash_workers)
+    with _hashers_lock:
+        if key not in _default_hashers:
+            _default_hashers[key] = PasswordHasher(*key)
+        return _default_hashers[key]
@@ -0,0 +1,48 @@
+from datetime import datetime
+from math import ceil
+from typing import Dict, Iterable, Sequence
+import numpy as np
+
+# Rental pricing: every started hour is charged at the vehicle's hourly rate.
+# The scalar functions serve single bookings; quote_matrix prices many vehicles
+# against many candidate windows at once with the same arithmetic (float64
+# seconds / 3600, rounded up), so both give identical integer cents.
+
+SECONDS_PER_HOUR = 3600
+
+
+def rental_hours(start_at: datetime, end_at: datetime) -> int:
+    # billed hours of one rental window
+    return ceil((end_at - start_at).total_seconds() / SECONDS_PER_HOUR)
+
+
+def price_cents(hourly_rate_cents: int, start_at: datetime, end_at: datetime) -> int:
+    return rental_hours(start_at, end_at) * hourly_rate_cents
+
+
+def window_hours(starts: Sequence[datetime], ends: Sequence[datetime]) -> np.ndarray:
+    # billed hours of many windows as int64
+    seconds = (np.asarray(ends, dtype="datetime64[us]") - np.asarray(starts, dtype="datetime64[us]")) / np.timedelta64(1, "s")
+    return np.ceil(seconds / SECONDS_PER_HOUR).astype(np.int64)
+
+
+def quote_matrix(hourly_rates_cents: Sequence[int], starts: Sequence[datetime], ends: Sequence[datetime]) -> np.ndarray:
+    # int64 cents, one row per rate (vehicle) and one column per (start, end) window
+    rates = np.asarray(hourly_rates_cents, dtype=np.int64)
+    return np.multiply.outer(rates, window_hours(starts, ends))
+
+
+def within_limits(min_rent_hours: Sequence[int], max_rent_hours: Sequence[int], hours: np.ndarray) -> np.ndarray:
+    # bool matrix of the same shape: window durations each vehicle may be rented for
+    minimum = np.asarray(min_rent_hours, dtype=np.int64)[:, None]
+    maximum = np.asarray(max_rent_hours, dtype=np.int64)[:, None]
+    return (hours[None, :] >= minimum) & (hours[None, :] <= maximum)
+
+
+def quote_vehicles(vehicles: Iterable, start_at: datetime, end_at: datetime) -> Dict[int, int]:
+    # price of one window for each vehicle (anything with id and hourly_rate_cents), by vehicle id
+    vehicles = list(vehicles)
+    if not vehicles:
+        return {}
+    prices = quote_matrix([v.hourly_rate_cents for v in vehicles], [start_at], [end_at])[:, 0]
+    return dict(zip((v.id for v in vehicles), prices.tolist()))
@@ -0,0 +1,66 @@
+from datetime import datetime
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+from src.models import ApprovalStatus, BookingStatus, PaymentMethod, User, Vehicle, VehicleType
+
+# Read-only listing rows: only the columns a table or JSON listing shows, selected
+# as plain tuples so the session neither builds nor tracks ORM instances for them.
+# Field names match the model attributes, so vehicle_json / booking_json and the CLI
+# tables read them the same way (benchmarks/bench_projections.py).
+
+
+class VehicleRow(NamedTuple):
+    id: int
+    plate: str
+    model: str
+    type: VehicleType
+    year: int
+    vehicle_mileage: float
+    mileage_threshold: float
+    min_rent_hours: int
+    max_rent_hours: int
+    hourly_rate_cents: int
+    photo_url: Optional[str]
+    is_deleted: bool
+
+
+class BookingRow(NamedTuple):
+    id: int
+    vehicle_id: int
+    user_id: int
+    start_at: datetime
+    end_at: datetime
+    approval_status: ApprovalStatus
+    booking_status: BookingStatus
+    initial_rental_cents: int
+    surcharge_cents: int
+    total_rental_cents: int
+    payment_method: Optional[PaymentMethod]
+    cancelled_by: Optional[str]
+    cancelled_reason: Optional[str]
+    plate: str  # of the booked vehicle
+    vehicle_model: str
+    user_email: str
+
+
+# BookingRow fields read from the joined tables instead of the rentals table
+BOOKING_JOINED_COLUMNS = {"plate": Vehicle.plate, "vehicle_model": Vehicle.model, "user_email": User.email}
+
+
+def vehicle_columns() -> List:
+    return [getattr(Vehicle, name) for name in VehicleRow._fields]
+
+
+def booking_columns(model) -> List:
+    # BookingRow columns of a rentals table (live or archived); join Vehicle and User
+    return [BOOKING_JOINED_COLUMNS[name].label(name) if name in BOOKING_JOINED_COLUMNS else getattr(model, name)
+            for name in BookingRow._fields]
+
+
+def as_rows(row_type, rows: Iterable) -> List:
+    # query result rows as the given NamedTuple, in select order
+    return [row_type._make(row) for row in rows]
+
+
+def as_row_pages(row_type, pages: Iterable[List]) -> Iterator[List]:
+    for page in pages:
+        yield as_rows(row_type, page)
@@ -1,9 +1,63 @@
-from sqlalchemy.orm import Session
-from src.models import Rental, Vehicle, ApprovalStatus, BookingStatus, PaymentMethod
+from sqlalchemy import exists
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, joinedload
+from src.aggregates import StatsBatch, vehicle_type
+from src.availability_bitmap import get_bitmap
+from src.availability_index import get_index, track_booking, untrack_booking
+from src.database import after_commit, begin_write, commit, in_transaction_scope
+from src.instrumentation import instrument_class
+from src.pricing import price_cents, rental_hours
+from src.schedule import AvailabilityCalendar, ceil_hour, earliest_start, free_start_hours, group_intervals
+from src.projections import BookingRow, as_rows, booking_columns
+from src.vehicle_catalog import get_catalog
+from src.models import (Rental, ArchivedRental, User, Vehicle, ApprovalStatus, BookingStatus, PaymentMethod,
+                        BLOCKING_BOOKING_STATUSES, BLOCKING_APPROVAL_STATUSES, inline_values)
 from datetime import datetime, timedelta
-from math import ceil
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import logging
+import random
+import time
 
+logger = logging.getLogger(__name__)
+
+# buffer time added around every booking to avoid back-to-back overlaps
+BOOKING_BUFFER = timedelta(hours=6)
+
+# how far ahead next-available and calendar queries may look
+MAX_SEARCH_HORIZON_HOURS = 366 * 24
+
+# retries when another writer holds the database lock, the wait doubles each time
+BOOKING_MAX_ATTEMPTS = 5
+BOOKING_RETRY_DELAY = 0.05  # seconds
+
+
+def overlapping_rentals(vehicle_id, buffer_start: datetime, buffer_end: datetime):
+    # EXISTS clause for blocking rentals of a vehicle inside the buffered window
+    return exists().where(
+        Rental.vehicle_id == vehicle_id,
+        Rental.booking_status.in_(inline_values(BLOCKING_BOOKING_STATUSES)),
+        Rental.approval_status.in_(BLOCKING_APPROVAL_STATUSES),
+        Rental.start_at < buffer_end,
+        Rental.end_at > buffer_start
+    )
+
+
+def booking_retry_delays() -> Iterator[Optional[float]]:
+    # seconds to wait before each retry, jittered and doubling; None after the last attempt
+    delay = BOOKING_RETRY_DELAY
+    for _ in range(BOOKING_MAX_ATTEMPTS - 1):
+        yield delay * (1 + random.random())
+        delay *= 2
+    yield None
+
+
+def is_busy_error(error: OperationalError) -> bool:
+    # another writer held the SQLite lock past the busy timeout
+    return "locked" in str(error.orig)
+
+
+@instrument_class
 class RentalService:
     def __init__(self, db: Session):
         self.db = db  # database session
@@ -15,64 +69,201 @@ class RentalService:
         if end_at <= start_at:
             raise ValueError("End date/time must be after start date/time.")
         
-        # calculate rental duration in hours
-        duration_hours = ceil((end_at - start_at).total_seconds() / 3600)
+        # calculate rental duration in billed hours
+        duration_hours = rental_hours(start_at, end_at)
 
         # add buffer time to avoid back-to-back overlaps
-        buffer_start = start_at - timedelta(hours=6)
-        buffer_end = end_at + timedelta(hours=6)
+        buffer_start = start_at - BOOKING_BUFFER
+        buffer_end = end_at + BOOKING_BUFFER
+
+        # without an in-memory index, availability comes straight from the database
+        index = get_index(self.db)
+        if index is None:
+            return self._available_in_db(vehicle_type, duration_hours, buffer_start, buffer_end)
+
+        available = [v for v in self._candidate_vehicles(vehicle_type, duration_hours)
+                     if index.is_available(v.id, buffer_start, buffer_end)]
+        if index.verify:
+            # compare with the database and resync if the index has drifted
+            expected = self._available_in_db(vehicle_type, duration_hours, buffer_start, buffer_end)
+            if [v.id for v in expected] != [v.id for v in available]:
+                logger.warning("Availability index out of sync for %s search, reloading.", vehicle_type)
+                index.reload(self.db)
+                return expected
+        return available
+
+    def _available_in_db(self, vehicle_type, duration_hours: int, buffer_start: datetime,
+                         buffer_end: datetime) -> list:
+        # vehicles free in the window according to the rentals table
+        if get_catalog(self.db) is None:
+            # check overlaps in the same query instead of one overlap query per vehicle
+            return self._candidate_query(vehicle_type, duration_hours).filter(
+                ~overlapping_rentals(Vehicle.id, buffer_start, buffer_end)).all()
+        # fleet rules are checked on cached vehicles; only availability comes from
+        # one covering query on the vehicle type index
+        blocked = {vehicle_id for vehicle_id, in self.db.query(Vehicle.id).filter(
+            Vehicle.type == vehicle_type,
+            Vehicle.is_deleted == False,
+            overlapping_rentals(Vehicle.id, buffer_start, buffer_end)
+        )}
+        return [v for v in self._candidate_vehicles(vehicle_type, duration_hours) if v.id not in blocked]
 
-        # filter vehicles that match requirements
-        vehicles = self.db.query(Vehicle).filter(
+    def _candidate_vehicles(self, vehicle_type, duration_hours: int) -> list:
+        # active vehicles of the type that may be rented for this long, by id
+        catalog = get_catalog(self.db)
+        if catalog is not None:
+            return [v for v in catalog.vehicles_of_type(self.db, vehicle_type)
+                    if v.vehicle_mileage < v.mileage_threshold and v.min_rent_hours <= duration_hours <= v.max_rent_hours]
+        return self._candidate_query(vehicle_type, duration_hours).all()
+
+    def _candidate_query(self, vehicle_type, duration_hours: int):
+        # fleet rules as a query, so callers can add the overlap check in SQL
+        return self.db.query(Vehicle).filter(
             Vehicle.type == vehicle_type,
             Vehicle.is_deleted == False,
             Vehicle.vehicle_mileage < Vehicle.mileage_threshold,
             Vehicle.min_rent_hours <= duration_hours,
             Vehicle.max_rent_hours >= duration_hours
-        ).all()
+        ).order_by(Vehicle.id)
+
+    def _blocking_intervals(self, vehicle_type, vehicles: list, window_start: datetime,
+                            window_end: datetime) -> Dict[int, List[Tuple[datetime, datetime]]]:
+        # blocking rentals overlapping the window per vehicle, sorted by start; one
+        # query for the whole type, or none with the availability index
+        index = get_index(self.db)
+        if index is not None:
+            return {v.id: index.intervals(v.id, window_start, window_end) for v in vehicles}
+        rows = self.db.query(Rental.vehicle_id, Rental.start_at, Rental.end_at).filter(
+            Rental.vehicle_id.in_(self.db.query(Vehicle.id).filter(
+                Vehicle.type == vehicle_type, Vehicle.is_deleted == False).scalar_subquery()),
+            Rental.booking_status.in_(inline_values(BLOCKING_BOOKING_STATUSES)),
+            Rental.approval_status.in_(BLOCKING_APPROVAL_STATUSES),
+            Rental.start_at < window_end,
+            Rental.end_at > window_start
+        ).order_by(Rental.vehicle_id, Rental.start_at)
+        return group_intervals(rows)
+
+    def _check_horizon(self, duration_hours: int, hours: int) -> None:
+        if duration_hours < 1:
+            raise ValueError("Duration must be at least one hour.")
+        if hours < 1 or hours > MAX_SEARCH_HORIZON_HOURS:
+            raise ValueError(f"Search horizon must be between 1 and {MAX_SEARCH_HORIZON_HOURS} hours.")
+
+    def find_earliest_slots(self, vehicle_type, duration_hours: int, horizon_hours: int = 14 * 24,
+                            not_before: Optional[datetime] = None) -> List[Tuple[object, datetime]]:
+        # earliest whole-hour start per vehicle for a booking of duration_hours that
+        # ends within the horizon, as (vehicle, start) sorted by start; vehicles
+        # without a free slot are left out
+        self._check_horizon(duration_hours, horizon_hours)
+        now = datetime.utcnow()
+        if not_before is not None and not_before < now:
+            raise ValueError("Start date/time cannot be in the past.")
+        first_start = ceil_hour(not_before or now)
+        latest_end = first_start + timedelta(hours=horizon_hours)
+        duration = timedelta(hours=duration_hours)
 
-        available = []
+        vehicles = self._candidate_vehicles(vehicle_type, duration_hours)
+        intervals = self._blocking_intervals(vehicle_type, vehicles, first_start - BOOKING_BUFFER,
+                                             latest_end + BOOKING_BUFFER)
+        slots = []
         for vehicle in vehicles:
-            # check if there’s an overlapping booking
-            overlapping = self.db.query(Rental).filter(
-                Rental.vehicle_id == vehicle.id,
-                Rental.booking_status.in_([BookingStatus.REQUESTED, BookingStatus.ACTIVE]),
-                Rental.approval_status.in_([ApprovalStatus.PENDING, ApprovalStatus.APPROVED]),
-                Rental.start_at < buffer_end,
-                Rental.end_at > buffer_start
-            ).first()
-            if not overlapping:
-                available.append(vehicle)
-        return available
+            start = earliest_start(intervals.get(vehicle.id, ()), first_start, latest_end, duration, BOOKING_BUFFER)
+            if start is not None:
+                slots.append((vehicle, start))
+        slots.sort(key=lambda slot: (slot[1], slot[0].id))
+        return slots
+
+    def availability_calendar(self, vehicle_type, duration_hours: int, hours: int = 7 * 24,
+                              first_hour: Optional[datetime] = None) -> AvailabilityCalendar:
+        # for every candidate vehicle and every whole hour from first_hour, whether a
+        # booking of duration_hours may start then
+        self._check_horizon(duration_hours, hours)
+        now = datetime.utcnow()
+        if first_hour is not None and first_hour < now:
+            raise ValueError("Start date/time cannot be in the past.")
+        first_hour = ceil_hour(first_hour or now)
+        duration = timedelta(hours=duration_hours)
+
+        vehicles = self._candidate_vehicles(vehicle_type, duration_hours)
+        window_start = first_hour - BOOKING_BUFFER
+        window_end = first_hour + timedelta(hours=hours) + duration + BOOKING_BUFFER
+        bitmap = get_bitmap(self.db)
+        if bitmap is not None and bitmap.covers(window_start, window_end):
+            # whole-hour starts and buffer, so the hour bits answer exactly
+            free = bitmap.free_start_matrix([v.id for v in vehicles], first_hour, hours, duration_hours,
+                                            BOOKING_BUFFER // timedelta(hours=1))
+            return AvailabilityCalendar(first_hour, vehicles, free)
+
+        intervals = self._blocking_intervals(vehicle_type, vehicles, window_start, window_end)
+        free = np.ones((len(vehicles), hours), dtype=bool)
+        for row, vehicle in enumerate(vehicles):
+            free[row] = free_start_hours(intervals.get(vehicle.id, ()), first_hour, hours, duration, BOOKING_BUFFER)
+        return AvailabilityCalendar(first_hour, vehicles, free)
 
     def create_booking(self, user_id: int, vehicle_id: int, start_at: datetime, end_at: datetime) -> Rental:
-        # check if vehicle exists and is not deleted
-        vehicle = self.db.query(Vehicle).filter(Vehicle.id == vehicle_id, Vehicle.is_deleted == False).first()
-        if not vehicle:
-            raise ValueError("Vehicle not found or deleted.")
+        # retry with backoff while other bookers hold the write lock
+        for delay in booking_retry_delays():
+            try:
+                booking = self._create_booking(user_id, vehicle_id, start_at, end_at)
+                break
+            except OperationalError as e:
+                if in_transaction_scope(self.db):
+                    raise  # the enclosing transaction() block holds the lock and decides
+                self.db.rollback()
+                if not is_busy_error(e):
+                    raise
+                if delay is None:
+                    raise ValueError("The booking system is busy, please try again.") from e
+                time.sleep(delay)
+        after_commit(self.db, track_booking, self.db, booking)
+        return booking
 
-        # calculate booking duration
-        duration_hours = ceil((end_at - start_at).total_seconds() / 3600)
+    def _create_booking(self, user_id: int, vehicle_id: int, start_at: datetime, end_at: datetime) -> Rental:
+        # take the write lock before reading, so the overlap check and the insert
+        # are atomic against concurrent bookings (BEGIN IMMEDIATE on SQLite)
+        begin_write(self.db)
+        try:
+            # check if vehicle exists and is not deleted; on server databases the
+            # row lock serializes bookings of the same vehicle, on SQLite BEGIN
+            # IMMEDIATE already does. Always the row, never the vehicle catalog:
+            # a cached copy can miss a deletion or a return made by another process
+            vehicle = self.db.query(Vehicle).filter(
+                Vehicle.id == vehicle_id, Vehicle.is_deleted == False
+            ).with_for_update().first()
+            if not vehicle:
+                raise ValueError("Vehicle not found or deleted.")
 
-        # make sure duration fits vehicle rental limits
-        if duration_hours < vehicle.min_rent_hours or duration_hours > vehicle.max_rent_hours:
-            raise ValueError("Booking duration out of vehicle rental limits.")
+            # calculate booking duration
+            duration_hours = rental_hours(start_at, end_at)
+
+            # make sure duration fits vehicle rental limits
+            if duration_hours < vehicle.min_rent_hours or duration_hours > vehicle.max_rent_hours:
+                raise ValueError("Booking duration out of vehicle rental limits.")
+
+            # block booking if vehicle passed mileage threshold
+            if vehicle.vehicle_mileage >= vehicle.mileage_threshold:
+                raise ValueError("Vehicle exceeds mileage threshold.")
+
+            # reject bookings that overlap another one, including the buffer
+            if self.db.query(overlapping_rentals(vehicle_id, start_at - BOOKING_BUFFER, end_at + BOOKING_BUFFER)).scalar():
+                raise ValueError("Vehicle is already booked for the selected dates.")
+        except ValueError:
+            if not in_transaction_scope(self.db):
+                self.db.rollback()  # release the write lock
+            raise
 
-        # block booking if vehicle passed mileage threshold
-        if vehicle.vehicle_mileage >= vehicle.mileage_threshold:
-            raise ValueError("Vehicle exceeds mileage threshold.")
-        
         # create new booking record
+        cost = price_cents(vehicle.hourly_rate_cents, start_at, end_at)
         booking = Rental(
             user_id=user_id,
             vehicle_id=vehicle_id,
             start_at=start_at,
             end_at=end_at,
-            initial_rental_cents=duration_hours * vehicle.hourly_rate_cents,
-            total_rental_cents=duration_hours * vehicle.hourly_rate_cents
+            initial_rental_cents=cost,
+            total_rental_cents=cost
         )
         self.db.add(booking)
-        self.db.commit()
+        commit(self.db)
         return booking
 
     def cancel_booking(self, booking_id: int, cancelled_by: str, reason: str) -> None:
@@ -90,12 +281,37 @@ class RentalService:
         booking.cancelled_at = datetime.utcnow()
         booking.cancelled_by = cancelled_by
         booking.cancelled_reason = reason
-        self.db.commit()
+        stats = StatsBatch()
+        stats.cancelled(booking.vehicle_id, vehicle_type(self.db, booking.vehicle_id), booking.cancelled_at)
+        stats.apply(self.db)  # summary rows change in the same transaction
+        commit(self.db)
+        after_commit(self.db, untrack_booking, self.db, booking_id)
 
     def has_active_bookings(self, vehicle_id: int) -> bool:
         # check if this vehicle has any ongoing or pending bookings
         return self.db.query(Rental).filter(
             Rental.vehicle_id == vehicle_id,
-            Rental.booking_status.in_([BookingStatus.REQUESTED, BookingStatus.ACTIVE]),
-            Rental.approval_status.in_([ApprovalStatus.PENDING, ApprovalStatus.APPROVED])
+            Rental.booking_status.in_(inline_values(BLOCKING_BOOKING_STATUSES)),
+            Rental.approval_status.in_(BLOCKING_APPROVAL_STATUSES)
         ).first() is not None
+
+    def get_user_bookings(self, user_id: int, include_archived: bool = False) -> List[Rental]:
+        # all bookings of a customer with their vehicles in one query, plus one for
+        # the archived history when asked
+        bookings = self.db.query(Rental).options(joinedload(Rental.vehicle)).filter(
+            Rental.user_id == user_id
+        ).order_by(Rental.id).all()
+        if not include_archived:
+            return bookings
+        archived = self.db.query(ArchivedRental).options(joinedload(ArchivedRental.vehicle)).filter(
+            ArchivedRental.user_id == user_id
+        ).order_by(ArchivedRental.id).all()
+        return sorted(bookings + archived, key=lambda booking: booking.id)
+
+    def list_user_bookings(self, user_id: int, include_archived: bool = False) -> List[BookingRow]:
+        # get_user_bookings as read-only rows, for listings that only show them
+        rows = []
+        for model in ((Rental, ArchivedRental) if include_archived else (Rental,)):
+            rows += self.db.query(*booking_columns(model)).join(Vehicle, Vehicle.id == model.vehicle_id).join(
+                User, User.id == model.user_id).filter(model.user_id == user_id).order_by(model.id).all()
+        return sorted(as_rows(BookingRow, rows), key=lambda booking: booking.id)
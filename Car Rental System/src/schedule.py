@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from math import ceil, floor
+from typing import Iterable, NamedTuple, Optional, Tuple
+import numpy as np
+
+# Sweeps over the blocking rentals of one vehicle, sorted by start, that answer
+# "when can this vehicle be booked for N hours" without repeated searches.
+# Candidate start times are whole hours.
+
+HOUR = timedelta(hours=1)
+
+
+class AvailabilityCalendar(NamedTuple):
+    first_hour: datetime
+    vehicles: list  # candidate vehicles, one row each
+    free: np.ndarray  # bool (vehicles, hours): a booking may start at first_hour + column hours
+
+
+def ceil_hour(moment: datetime) -> datetime:
+    floored = moment.replace(minute=0, second=0, microsecond=0)
+    return floored if floored == moment else floored + HOUR
+
+
+def earliest_start(intervals: Iterable[Tuple[datetime, datetime]], not_before: datetime, latest_end: datetime,
+                   duration: timedelta, buffer: timedelta) -> Optional[datetime]:
+    # first whole hour at or after not_before where [start - buffer, start + duration + buffer)
+    # misses every interval and the booking ends by latest_end; intervals sorted by start
+    start = ceil_hour(not_before)
+    for rental_start, rental_end in intervals:
+        if rental_start >= start + duration + buffer:
+            break  # this and every later rental start after the window
+        if rental_end + buffer > start:
+            start = ceil_hour(rental_end + buffer)
+    return start if start + duration <= latest_end else None
+
+
+def free_start_hours(intervals: Iterable[Tuple[datetime, datetime]], first_hour: datetime, hours: int,
+                     duration: timedelta, buffer: timedelta) -> np.ndarray:
+    # bool per hour: can a booking of this duration start at first_hour + i hours.
+    # A rental blocks the starts s with rental_start - duration - buffer < s < rental_end + buffer.
+    free = np.ones(hours, dtype=bool)
+    for rental_start, rental_end in intervals:
+        low = floor((rental_start - duration - buffer - first_hour) / HOUR) + 1
+        high = ceil((rental_end + buffer - first_hour) / HOUR)
+        if high > 0 and low < hours:
+            free[max(low, 0):min(high, hours)] = False
+    return free
+
+
+def group_intervals(rows: Iterable[Tuple[int, datetime, datetime]]) -> dict:
+    # (vehicle id, start, end) rows sorted by vehicle and start -> {vehicle id: [(start, end), ...]}
+    grouped = {}
+    for vehicle_id, start_at, end_at in rows:
+        grouped.setdefault(vehicle_id, []).append((start_at, end_at))
+    return grouped
@@ -0,0 +1,191 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from src.database import in_transaction_scope
+from src.models import Vehicle, VehicleType
+import time
+
+# key used to share the catalog with every session through Session.info
+SESSION_KEY = "vehicle_catalog"
+
+# columns copied into cached records
+VEHICLE_COLUMNS = tuple(column.key for column in Vehicle.__table__.columns)
+
+
+class VehicleRecord:
+    # read-only copy of a vehicle row; safe to share between sessions and threads
+    __slots__ = VEHICLE_COLUMNS
+
+    def __init__(self, values: Dict):
+        for key in VEHICLE_COLUMNS:
+            object.__setattr__(self, key, values[key])
+
+    def __setattr__(self, key, value):
+        raise AttributeError("Cached vehicles are read-only, load the Vehicle row to change it.")
+
+    def __repr__(self):
+        return f"VehicleRecord(id={self.id}, plate={self.plate!r})"
+
+
+class VehicleCatalog:
+    # process-local cache of vehicles by id, plate and type with LRU and TTL bounds;
+    # the services invalidate entries after every committed fleet change, the TTL
+    # bounds how stale data written by other processes can get
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._by_id: "OrderedDict[int, Tuple[VehicleRecord, float]]" = OrderedDict()
+        self._by_plate: Dict[str, int] = {}
+        self._by_type: Dict[VehicleType, Tuple[List[VehicleRecord], frozenset, float]] = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, db: Session, vehicle_id: int) -> Optional[VehicleRecord]:
+        # vehicle by id, deleted ones included
+        with self._lock:
+            record = self._lookup(vehicle_id)
+        if record is not None:
+            return record
+        return self._load_one(db, Vehicle.id == vehicle_id)
+
+    def get_by_plate(self, db: Session, plate: str) -> Optional[VehicleRecord]:
+        with self._lock:
+            vehicle_id = self._by_plate.get(plate)
+            record = self._lookup(vehicle_id) if vehicle_id is not None else None
+            if vehicle_id is None:
+                self.misses += 1
+        if record is not None:
+            return record
+        return self._load_one(db, Vehicle.plate == plate)
+
+    def vehicles_of_type(self, db: Session, vehicle_type: VehicleType) -> List[VehicleRecord]:
+        # non-deleted vehicles of one type ordered by id
+        now = time.monotonic()
+        with self._lock:
+            entry = self._by_type.get(vehicle_type)
+            if entry is not None and entry[2] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        rows = db.query(*Vehicle.__table__.columns).filter(
+            Vehicle.type == vehicle_type, Vehicle.is_deleted == False
+        ).order_by(Vehicle.id).all()
+        records = [VehicleRecord(row._mapping) for row in rows]
+        with self._lock:
+            self._by_type[vehicle_type] = (records, frozenset(r.id for r in records), now + self.ttl)
+        return records
+
+    def invalidate(self, vehicle_id: Optional[int] = None, vehicle_type: Optional[VehicleType] = None) -> None:
+        # forget one vehicle and every type listing that includes it; pass the type of
+        # new vehicles (or the new type after a change) to drop that listing as well
+        with self._lock:
+            self.invalidations += 1
+            if vehicle_id is not None:
+                self._drop(vehicle_id)
+                for listed_type, (_, ids, _) in list(self._by_type.items()):
+                    if vehicle_id in ids:
+                        del self._by_type[listed_type]
+            if vehicle_type is not None:
+                self._by_type.pop(vehicle_type, None)
+
+    def invalidate_many(self, vehicle_ids: Iterable[int]) -> None:
+        for vehicle_id in vehicle_ids:
+            self.invalidate(vehicle_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += 1
+            self._by_id.clear()
+            self._by_plate.clear()
+            self._by_type.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                        invalidations=self.invalidations, entries=len(self._by_id), type_listings=len(self._by_type))
+
+    def _lookup(self, vehicle_id: int) -> Optional[VehicleRecord]:
+        # caller holds the lock; counts the hit or miss
+        entry = self._by_id.get(vehicle_id)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                self._drop(vehicle_id)
+            self.misses += 1
+            return None
+        self._by_id.move_to_end(vehicle_id)
+        self.hits += 1
+        return entry[0]
+
+    def _load_one(self, db: Session, condition) -> Optional[VehicleRecord]:
+        row = db.query(*Vehicle.__table__.columns).filter(condition).first()
+        if row is None:
+            return None
+        record = VehicleRecord(row._mapping)
+        with self._lock:
+            self._drop(record.id)
+            self._by_id[record.id] = (record, time.monotonic() + self.ttl)
+            self._by_plate[record.plate] = record.id
+            while len(self._by_id) > self.max_entries:
+                evicted_id, _ = self._by_id.popitem(last=False)
+                self._drop_plate(evicted_id)
+                self.evictions += 1
+        return record
+
+    def _drop(self, vehicle_id: int) -> None:
+        entry = self._by_id.pop(vehicle_id, None)
+        if entry is not None and self._by_plate.get(entry[0].plate) == vehicle_id:
+            del self._by_plate[entry[0].plate]
+
+    def _drop_plate(self, vehicle_id: int) -> None:
+        for plate, cached_id in list(self._by_plate.items()):
+            if cached_id == vehicle_id:
+                del self._by_plate[plate]
+                break
+
+
+def get_catalog(db: Session) -> Optional[VehicleCatalog]:
+    # the catalog attached to this session, if the application enabled one; None
+    # inside a transaction() block, whose own uncommitted changes (a returned
+    # vehicle's mileage, say) only reach the catalog once the block commits
+    if in_transaction_scope(db):
+        return None
+    return db.info.get(SESSION_KEY)
+
+
+def invalidate_vehicle(db: Session, vehicle_id: Optional[int] = None, vehicle_type: Optional[VehicleType] = None) -> None:
+    catalog = db.info.get(SESSION_KEY)
+    if catalog is not None:
+        catalog.invalidate(vehicle_id, vehicle_type)
+
+
+def invalidate_vehicles(db: Session, vehicle_ids: Iterable[int]) -> None:
+    catalog = db.info.get(SESSION_KEY)
+    if catalog is not None:
+        catalog.invalidate_many(vehicle_ids)
+
+
+def clear_catalog(db: Session) -> None:
+    catalog = db.info.get(SESSION_KEY)
+    if catalog is not None:
+        catalog.clear()
+
+
+def format_catalog_prometheus(stats: Dict[str, int], prefix: str = "car_rental") -> str:
+    # catalog counters in the Prometheus text format, appended to /metrics
+    lines = []
+    for key, kind, help_text in (
+            ("hits", "counter", "Vehicle catalog lookups served from memory."),
+            ("misses", "counter", "Vehicle catalog lookups that went to the database."),
+            ("evictions", "counter", "Vehicles dropped from the catalog by the size bound."),
+            ("invalidations", "counter", "Catalog invalidations after vehicle changes."),
+            ("entries", "gauge", "Vehicles cached by id.")):
+        metric = f"{prefix}_vehicle_catalog_{key}" + ("_total" if kind == "counter" else "")
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}", f"{metric} {stats[key]}"]
+    return "\n".join(lines) + "\n"
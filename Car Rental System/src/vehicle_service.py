@@ -1,8 +1,77 @@
+from sqlalchemy import insert, update
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from src.models import Vehicle, VehicleType
+from src.database import after_commit, commit, transaction
+from src.instrumentation import instrument_class
+from src.vehicle_catalog import get_catalog, invalidate_vehicle, clear_catalog
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import csv
+import json
+import os
 
+# rows validated and written per transaction during bulk imports
+IMPORT_CHUNK_SIZE = 1000
+
+# columns accepted in fleet import files, photo_url may be left empty
+IMPORT_FIELDS = {
+    "plate": str, "model": str, "type": VehicleType, "year": int, "vehicle_mileage": float,
+    "mileage_threshold": float, "min_rent_hours": int, "max_rent_hours": int, "hourly_rate_cents": int,
+}
+
+
+@dataclass
+class BulkUpsertReport:
+    inserted: int = 0
+    updated: int = 0
+    errors: List[Tuple[int, str]] = field(default_factory=list)  # (line number, message)
+
+
+def read_fleet_file(path: str) -> Iterator[Tuple[int, Optional[Dict]]]:
+    # stream (line number, row) pairs from a .csv or .jsonl file; unreadable rows come back as None
+    if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson"):
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = None
+                yield line_no, row if isinstance(row, dict) else None
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def parse_vehicle_row(row: Optional[Dict]) -> Dict:
+    # validate an import row and convert it to Vehicle column values
+    if not isinstance(row, dict):
+        raise ValueError("Row could not be read.")
+    values = {}
+    for name, kind in IMPORT_FIELDS.items():
+        raw = row.get(name)
+        if raw is None or str(raw).strip() == "":
+            raise ValueError(f"Missing value for {name}.")
+        try:
+            values[name] = VehicleType[str(raw).strip().upper()] if kind is VehicleType else kind(str(raw).strip())
+        except (KeyError, ValueError):
+            raise ValueError(f"Invalid value for {name}: {raw!r}.")
+    if values["min_rent_hours"] < 1 or values["min_rent_hours"] > values["max_rent_hours"]:
+        raise ValueError("Rent hours must satisfy 1 <= min_rent_hours <= max_rent_hours.")
+    if values["hourly_rate_cents"] < 0 or values["vehicle_mileage"] < 0:
+        raise ValueError("Rates and mileages must not be negative.")
+    if values["mileage_threshold"] <= 0:
+        raise ValueError("Mileage threshold must be positive.")
+    values["photo_url"] = (row.get("photo_url") or "").strip() or None
+    return values
+
+
+@instrument_class
 class VehicleService:
     def __init__(self, db: Session):
         self.db = db  
@@ -21,7 +90,8 @@ class VehicleService:
         )
 
         self.db.add(vehicle)
-        self.db.commit()
+        commit(self.db)
+        after_commit(self.db, invalidate_vehicle, self.db, vehicle.id, vehicle.type)
         return vehicle
 
     def update_vehicle(self, plate: str, **kwargs) -> Vehicle:
@@ -35,7 +105,8 @@ class VehicleService:
             setattr(vehicle, key, value)
 
         vehicle.updated_at = datetime.utcnow()
-        self.db.commit()
+        commit(self.db)
+        after_commit(self.db, invalidate_vehicle, self.db, vehicle.id, vehicle.type)
         return vehicle
 
     def delete_vehicle(self, plate: str) -> None:
@@ -53,7 +124,19 @@ class VehicleService:
         # soft delete
         vehicle.is_deleted = True
         vehicle.updated_at = datetime.utcnow()
-        self.db.commit()
+        commit(self.db)
+        after_commit(self.db, invalidate_vehicle, self.db, vehicle.id)
+
+    def get_vehicle(self, vehicle_id: int):
+        # active vehicle by id, a read-only cached copy when the vehicle catalog is enabled
+        catalog = get_catalog(self.db)
+        if catalog is not None:
+            vehicle = catalog.get(self.db, vehicle_id)
+        else:
+            vehicle = self.db.query(Vehicle).filter(Vehicle.id == vehicle_id).first()
+        if not vehicle or vehicle.is_deleted:
+            raise ValueError("Vehicle not found or deleted.")
+        return vehicle
 
     def get_available_vehicles(self, vehicle_type: VehicleType, start_at: datetime, end_at: datetime) -> List[Vehicle]:
         from src.rental_service import RentalService
@@ -61,3 +144,65 @@ class VehicleService:
         # ask rental service for vehicles free in the given time range
         rental_service = RentalService(self.db)
         return rental_service.search_available_vehicles(vehicle_type, start_at, end_at)
+
+    def bulk_upsert(self, rows: Iterable[Tuple[int, Optional[Dict]]], chunk_size: int = IMPORT_CHUNK_SIZE) -> BulkUpsertReport:
+        # insert new plates and update existing ones from (line number, row) pairs,
+        # one plate lookup and one transaction per chunk; bad rows are reported, not fatal
+        report = BulkUpsertReport()
+        seen = set()
+        chunk = []
+        for line_no, row in rows:
+            try:
+                values = parse_vehicle_row(row)
+            except ValueError as e:
+                report.errors.append((line_no, str(e)))
+                continue
+            if values["plate"] in seen:
+                report.errors.append((line_no, "Duplicate plate in import."))
+                continue
+            seen.add(values["plate"])
+            chunk.append((line_no, values))
+            if len(chunk) >= chunk_size:
+                self._write_chunk(chunk, report)
+                chunk = []
+        if chunk:
+            self._write_chunk(chunk, report)
+        # imports touch many vehicles, start the catalog over
+        after_commit(self.db, clear_catalog, self.db)
+        return report
+
+    def _write_chunk(self, chunk: List[Tuple[int, Dict]], report: BulkUpsertReport) -> None:
+        inserts, updates, errors = [], [], []
+        try:
+            # its own write transaction, or a savepoint inside a transaction() block; the
+            # plate lookup runs under the write lock so no other writer can add or delete
+            # one of these plates before the chunk is written
+            with transaction(self.db):
+                # find which plates already exist with a single query
+                plates = [values["plate"] for _, values in chunk]
+                existing = {plate: (vehicle_id, is_deleted) for plate, vehicle_id, is_deleted in
+                            self.db.query(Vehicle.plate, Vehicle.id, Vehicle.is_deleted).filter(Vehicle.plate.in_(plates))}
+
+                now = datetime.utcnow()
+                for line_no, values in chunk:
+                    match = existing.get(values["plate"])
+                    if match is None:
+                        inserts.append(values)
+                    elif match[1]:
+                        errors.append((line_no, "Vehicle plate belongs to a deleted vehicle."))
+                    else:
+                        updates.append(dict(values, id=match[0], updated_at=now))
+
+                if inserts:
+                    self.db.execute(insert(Vehicle), inserts)
+                if updates:
+                    self.db.execute(update(Vehicle), updates)
+        except SQLAlchemyError as e:
+            # the chunk is all or nothing, report every row that was going to be written
+            rejected = {line_no for line_no, _ in errors}
+            errors += [(line_no, f"Chunk not saved: {e.__class__.__name__}") for line_no, _ in chunk
+                       if line_no not in rejected]
+            inserts, updates = [], []
+        report.inserted += len(inserts)
+        report.updated += len(updates)
+        report.errors.extend(errors)
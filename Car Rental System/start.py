@@ -1,14 +1,211 @@
+import atexit
+import json
+import os
 import sys
-from src.cli_controller import CLIController
-from src.database import Database
-from db.seed import seed_database
+from typing import TYPE_CHECKING, Optional
+from src.config import Settings
+
+# SQLAlchemy, bcrypt and the CLI are imported by the commands that need them,
+# so --help and `stats` start without loading them
+if TYPE_CHECKING:
+    from src.database import Database
+
+USAGE = """Usage: python start.py [command]
+
+Commands:
+  run                         interactive customer and admin menus (default)
+  init-db                     create the database and add starter data
+  import-vehicles <file>      add or update vehicles from a CSV or JSONL file
+  rebuild-stats               recompute the finance summary tables
+  sweep-noshows               cancel approved bookings not picked up in time
+  archive-rentals             move old completed and cancelled rentals to the archive
+  export <file> [--watermark <file>]
+                              rentals for analytics as .parquet, .arrow or .csv,
+                              only the changed ones when the watermark file exists
+  stats [--prometheus]        statistics of the last instrumented run
+  serve [port]                JSON HTTP API
+"""
+
+# errors printed after an import, the rest are only counted
+MAX_IMPORT_ERRORS_SHOWN = 20
+
+def import_vehicles(db: "Database", path: str):
+    # bulk add or update vehicles from a CSV or JSONL file
+    from src.vehicle_service import VehicleService, read_fleet_file
+
+    report = VehicleService(db.get_session()).bulk_upsert(read_fleet_file(path))
+    print(f"Added {report.inserted} vehicles, updated {report.updated}, rejected {len(report.errors)} rows.")
+    for line_no, message in sorted(report.errors)[:MAX_IMPORT_ERRORS_SHOWN]:
+        print(f"  line {line_no}: {message}")
+
+def rebuild_stats(db: "Database"):
+    # recompute the finance summary tables from all rentals
+    from src.aggregates import rebuild_stats as rebuild
+    from src.database import begin_write
+
+    session = db.get_session()
+    begin_write(session)  # keep bookings from changing underneath the rebuild
+    rentals = rebuild(session)
+    session.commit()
+    print(f"Summary tables rebuilt from {rentals} rentals.")
+
+def index_mode(settings: Settings) -> Optional[str]:
+    # "on" or "verify" when CAR_RENTAL_AVAILABILITY_INDEX enables the index, None when off
+    mode = settings.availability_index.strip().lower()
+    if mode == "verify":
+        return mode
+    if mode in ("1", "true", "on"):
+        return "on"
+    return None
+
+def enable_caches(db: "Database"):
+    # optional in-memory availability index, CAR_RENTAL_AVAILABILITY_INDEX=verify also
+    # cross-checks every search against the database
+    mode = index_mode(db.settings)
+    if mode is not None:
+        db.enable_availability_index(verify=mode == "verify")
+    # optional hour bitmap, CAR_RENTAL_AVAILABILITY_BITMAP=1
+    if db.settings.availability_bitmap:
+        db.enable_availability_bitmap()
+    # optional vehicle catalog cache, CAR_RENTAL_VEHICLE_CATALOG=1
+    if db.settings.vehicle_catalog:
+        db.enable_vehicle_catalog()
+
+def serve(db: "Database", port: str = None):
+    # JSON API over HTTP, see src/api_server.py for the routes
+    from src.api_server import serve as serve_api
+
+    settings = db.settings
+    db.dispose()
+    if port is not None:
+        settings.api_port = int(port)
+    if settings.api_processes > 1 and index_mode(settings) is not None:
+        sys.exit("The availability index lives in one process, use CAR_RENTAL_API_PROCESSES=1 with it.")
+    if settings.api_processes > 1 and settings.availability_bitmap:
+        sys.exit("The availability bitmap lives in one process, use CAR_RENTAL_API_PROCESSES=1 with it.")
+    serve_api(settings, setup=setup_process)
+
+def show_stats(settings: Settings, fmt: str = None):
+    # print the statistics written by the last instrumented run
+    from src.instrumentation import format_prometheus, format_table
+
+    path = settings.stats_file
+    if not os.path.exists(path):
+        sys.exit(f"No statistics in {path}, run with CAR_RENTAL_INSTRUMENTATION=1 first.")
+    with open(path) as f:
+        snapshot = json.load(f)
+    if fmt == "--prometheus":
+        print(format_prometheus(snapshot), end="")
+    else:
+        print(format_table(snapshot))
+
+def keep_stats(db: "Database"):
+    # write per-method statistics on exit for `python start.py stats`
+    if db.settings.instrumentation:
+        from src.instrumentation import get_instrumentation
+        atexit.register(get_instrumentation().dump, db.settings.stats_file)
+
+def archive_rentals(db: "Database"):
+    # move finished rentals older than CAR_RENTAL_ARCHIVE_AFTER_DAYS to the archive table
+    from datetime import timedelta
+    from src.archive import archive_rentals as archive
+
+    settings = db.settings
+    report = archive(db.get_session(), timedelta(days=settings.archive_after_days), settings.archive_batch,
+                     settings.archive_pause)
+    print(f"Archived {report.moved} rentals in {report.batches} batches "
+          f"(ended before {report.cutoff:%Y-%m-%d %H:%M} UTC).")
+
+def export(db: "Database", path: str, watermark_path: str = None):
+    # stream rentals to an analytics file from one read snapshot; the watermark file
+    # keeps the position for the next incremental export
+    from src.export import export_rentals, read_watermark, write_watermark
+
+    since = read_watermark(watermark_path) if watermark_path else None
+    report = export_rentals(db.engine, path, since, db.settings.export_chunk)
+    if watermark_path:
+        write_watermark(watermark_path, report.watermark)
+    changed = "" if since is None else f" changed since {since:%Y-%m-%d %H:%M:%S}"
+    print(f"Exported {report.rows} rentals{changed} to {path} (watermark {report.watermark:%Y-%m-%d %H:%M:%S} UTC).")
+
+def sweep_noshows(db: "Database"):
+    # cancel every no-show past the grace period once
+    from src.noshow_sweeper import sweep_once
+
+    result = sweep_once(db)
+    print(f"Cancelled {result.cancelled} no-show bookings in {result.batches} batches "
+          f"(should have started before {result.cutoff:%Y-%m-%d %H:%M} UTC).")
+
+def start_sweeper(db: "Database"):
+    # optional background no-show sweeps, CAR_RENTAL_NOSHOW_SWEEP_INTERVAL=<seconds>
+    if db.settings.noshow_sweep_interval > 0:
+        from src.noshow_sweeper import NoShowSweeper
+
+        NoShowSweeper(db, db.settings.noshow_sweep_interval).start()
+
+def setup_process(db: "Database"):
+    # per-process setup for the CLI and every API worker
+    enable_caches(db)
+    start_sweeper(db)
+
 
 def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "run"
+    if command in ("-h", "--help", "help"):
+        print(USAGE, end="")
+        return
+    if command == "stats":
+        if sys.argv[2:] not in ([], ["--prometheus"]):
+            sys.exit("Usage: python start.py stats [--prometheus]")
+        show_stats(Settings.from_env(), *sys.argv[2:])
+        return
+    if command not in ("run", "init-db", "import-vehicles", "rebuild-stats", "sweep-noshows", "archive-rentals",
+                       "export", "serve"):
+        sys.exit(USAGE)
+
+    from src.database import Database
+
     db = Database()
-    if len(sys.argv) > 1 and sys.argv[1] == "init-db":
+    if command == "init-db":
+        from db.seed import seed_database
+
         seed_database(db)
         print("Database initialized and seeded successfully.")
         return
+    if command == "import-vehicles":
+        if len(sys.argv) != 3:
+            sys.exit("Usage: python start.py import-vehicles <fleet.csv|fleet.jsonl>")
+        import_vehicles(db, sys.argv[2])
+        return
+    if command == "rebuild-stats":
+        rebuild_stats(db)
+        return
+    if command == "sweep-noshows":
+        sweep_noshows(db)
+        return
+    if command == "archive-rentals":
+        archive_rentals(db)
+        return
+    if command == "export":
+        args = sys.argv[2:]
+        if len(args) not in (1, 3) or (len(args) == 3 and args[1] != "--watermark"):
+            sys.exit("Usage: python start.py export <file.parquet|file.arrow|file.csv> [--watermark <file>]")
+        try:
+            export(db, args[0], *args[2:])
+        except ValueError as e:
+            sys.exit(str(e))
+        return
+    if command == "serve":
+        port = sys.argv[2] if len(sys.argv) == 3 else None
+        if len(sys.argv) > 3 or (port is not None and not (port.isdigit() and 0 < int(port) < 65536)):
+            sys.exit("Usage: python start.py serve [port]")
+        keep_stats(db)
+        serve(db, port)
+        return
+    from src.cli_controller import CLIController
+
+    setup_process(db)
+    keep_stats(db)
     controller = CLIController(db)
     controller.run()
 
@@ -0,0 +1,218 @@
+import pytest
+from src.database import Database
+from src.admin_service import AdminService, SYSTEM_CANCELLER
+from src.auth_service import AuthService
+from src.vehicle_service import VehicleService
+from src.rental_service import RentalService
+from src.cli_controller import CLIController
+from src.noshow_sweeper import NoShowSweeper
+from src.models import VehicleType, Role, Base, User, Rental, Vehicle, BookingStatus, ApprovalStatus, PaymentMethod, DailyVehicleStats
+from datetime import datetime, timedelta
+import time
+from sqlalchemy import event, func, update
+
+@pytest.fixture
+def db():
+    # isolated in-memory database for each test
+    db = Database.from_url("sqlite://")
+    yield db
+    db.dispose()
+
+def add_bookings(session, count):
+    # one customer with `count` bookings on different vehicles, every other one cancelled
+    user = AuthService(session).register("John", "Doe", "john@example.com", "1234567890", "Test123", Role.MEMBER)
+    vehicle_service = VehicleService(session)
+    rental_service = RentalService(session)
+    start_at = datetime.utcnow() + timedelta(days=1)
+    for i in range(count):
+        vehicle = vehicle_service.add_vehicle(f"CAR{i:03d}", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+        booking = rental_service.create_booking(user.id, vehicle.id, start_at, start_at + timedelta(hours=4))
+        if i % 2:
+            rental_service.cancel_booking(booking.id, "CUSTOMER", "Plans changed")
+    return user
+
+def count_selects(engine, action):
+    # number of SELECT statements issued while running the action
+    statements = []
+    listener = lambda conn, cursor, statement, params, context, executemany: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        action()
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    return len([s for s in statements if s.lstrip().upper().startswith("SELECT")])
+
+@pytest.mark.parametrize("count", [2, 10])
+def test_listings_load_vehicles_eagerly(db, count):
+    session = db.get_session()
+    user_id = add_bookings(session, count).id
+    admin_service = AdminService(session)
+    rental_service = RentalService(session)
+
+    # touching the vehicle of every row must not trigger extra queries
+    listings = [
+        lambda: [(b.vehicle.plate, b.user.email) for b in admin_service.get_all_bookings()],
+        lambda: [b.vehicle.plate for b in admin_service.get_cancelled_bookings()],
+        lambda: [b.vehicle.plate for b in rental_service.get_user_bookings(user_id)],
+    ]
+    for listing in listings:
+        session.expunge_all()
+        assert count_selects(db.engine, listing) == 1
+
+def test_cli_reports_use_constant_queries(db, capsys):
+    # the admin screens cost the same number of queries for 2 or 10 bookings
+    costs = []
+    for count in (2, 10):
+        Base.metadata.drop_all(db.engine)
+        Base.metadata.create_all(db.engine)
+        controller = CLIController(db)
+        user_id = add_bookings(controller.db, count).id
+        controller.db.expunge_all()
+        controller.current_user = controller.db.get(User, user_id)
+        costs.append([count_selects(db.engine, report) for report in (
+            controller.view_bookings, controller.view_cancelled_report, controller.view_user_bookings)])
+    assert costs[0] == costs[1]
+    assert "CAR009" in capsys.readouterr().out
+
+def test_keyset_pages_and_streams(db):
+    session = db.get_session()
+    add_bookings(session, 7)
+    admin_service = AdminService(session)
+
+    # pages cover every booking once, in id order, with the requested size
+    pages = list(admin_service.get_bookings_pages(page_size=3))
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [b.id for page in pages for b in page] == list(range(1, 8))
+
+    # seeking past an id and filtering
+    assert [b.id for page in admin_service.get_bookings_pages(page_size=3, after_id=5) for b in page] == [6, 7]
+    cancelled = [b.id for page in admin_service.get_cancelled_bookings_pages(page_size=2) for b in page]
+    assert cancelled == [2, 4, 6]
+    assert list(admin_service.get_cancelled_bookings_pages(cancelled_by="ADMIN")) == []
+
+    # streaming yields the same rows as the list based reports
+    assert [b.id for b in admin_service.stream_cancelled_bookings(page_size=2)] == cancelled
+    assert [v.plate for v in admin_service.stream_vehicles(page_size=4, vehicle_type=VehicleType.SEDAN)] == \
+        [v.plate for v in admin_service.get_all_vehicles()]
+    with pytest.raises(ValueError, match="Page size"):
+        list(admin_service.get_vehicles_pages(page_size=0))
+
+def test_listing_rows_match_entities(db):
+    session = db.get_session()
+    user_id = add_bookings(session, 5).id
+    session.execute(update(Vehicle).where(Vehicle.id.in_([2, 4])).values(vehicle_mileage=100000))
+    session.commit()
+    admin_service = AdminService(session)
+    rental_service = RentalService(session)
+    session.expunge_all()
+
+    # read-only rows carry the same values and leave the identity map empty
+    vehicles = admin_service.list_vehicles()
+    assert [(v.id, v.plate, v.type, v.is_deleted) for v in vehicles] == [(i, f"CAR{i - 1:03d}", VehicleType.SEDAN, False)
+                                                                        for i in range(1, 6)]
+    assert [v.plate for v in admin_service.list_vehicles_over_mileage()] == ["CAR001", "CAR003"]
+    bookings = rental_service.list_user_bookings(user_id)
+    assert [(b.id, b.plate, b.user_email, b.booking_status) for b in bookings] == [
+        (b.id, b.vehicle.plate, b.user.email, b.booking_status) for b in admin_service.get_all_bookings()]
+    session.expunge_all()
+    pages = list(admin_service.get_booking_rows_pages(page_size=2))
+    assert [[b.id for b in page] for page in pages] == [[1, 2], [3, 4], [5]]
+    assert [b.id for page in admin_service.get_cancelled_booking_rows_pages() for b in page] == [2, 4]
+    assert [v.id for page in admin_service.get_vehicle_rows_pages(page_size=2, after_id=3) for v in page] == [4, 5]
+    assert len(session.identity_map) == 0
+
+def test_batch_review_issue_and_return(db):
+    session = db.get_session()
+    add_bookings(session, 6)  # bookings 2, 4 and 6 are cancelled
+    admin_service = AdminService(session)
+
+    # one report entry per id, repeated ids are applied once and unknown ids reported
+    assert admin_service.review_bookings([1, 3, 99, 1], approve=True) == {1: None, 3: None, 99: "Booking not found."}
+    assert admin_service.review_bookings([5], approve=False, reason="No licence") == {5: None}
+    assert admin_service.review_bookings([1], approve=True) == {1: "Booking is not pending approval."}
+
+    assert admin_service.issue_vehicles([1, 3, 5]) == {1: None, 3: None, 5: "Booking not approved."}
+    assert admin_service.issue_vehicles([1]) == {1: "Booking is not in REQUESTED status."}
+
+    results = admin_service.return_vehicles([(1, 50100, 250, PaymentMethod.CARD), (3, 50200, 0, PaymentMethod.CASH),
+                                             (5, 50300, 0, PaymentMethod.CASH)])
+    assert results == {1: None, 3: None, 5: "Booking is not active."}
+
+    session.expire_all()
+    booking = admin_service.get_booking(1)
+    assert booking.booking_status == BookingStatus.COMPLETED
+    assert booking.total_rental_cents == booking.initial_rental_cents + 250
+    assert booking.payment_method == PaymentMethod.CARD
+    assert booking.vehicle.vehicle_mileage == 50100
+    assert admin_service.get_booking(5).approval_status == ApprovalStatus.REJECTED
+    assert admin_service.get_booking(5).reject_reason == "No licence"
+    assert admin_service.get_booking(1).reject_reason is None
+
+def test_sweep_no_shows(db):
+    index = db.enable_availability_index()
+    session = db.get_session()
+    add_bookings(session, 10)  # odd ids stay booked, even ids are cancelled
+    admin_service = AdminService(session)
+    admin_service.review_bookings([1, 3, 5, 7], approve=True)  # 9 stays pending
+    admin_service.issue_vehicles([7])
+    start_at = admin_service.get_booking(1).start_at
+
+    # nothing has started yet; an hour into the bookings only the grace period holds them
+    assert admin_service.sweep_no_shows().cancelled == 0
+    assert admin_service.sweep_no_shows(timedelta(hours=2), now=start_at + timedelta(hours=1)).cancelled == 0
+    result = admin_service.sweep_no_shows(timedelta(hours=2), batch_size=2, now=start_at + timedelta(hours=3))
+    assert (result.cancelled, result.batches) == (3, 2)
+    assert result.cutoff == start_at + timedelta(hours=1)
+
+    session.expire_all()
+    for booking_id in (1, 3, 5):
+        booking = admin_service.get_booking(booking_id)
+        assert booking.booking_status == BookingStatus.CANCELLED and booking.cancelled_by == SYSTEM_CANCELLER
+    assert admin_service.get_booking(7).booking_status == BookingStatus.ACTIVE
+    assert admin_service.get_booking(9).booking_status == BookingStatus.REQUESTED
+    assert len(index) == 2  # the active and the pending booking still block their vehicles
+    assert session.query(func.sum(DailyVehicleStats.cancelled)).scalar() == 5 + 3
+    with pytest.raises(ValueError, match="Batch size"):
+        admin_service.sweep_no_shows(batch_size=0)
+
+def test_cli_cancel_noshow_prints_once(db, capsys, monkeypatch):
+    session = db.get_session()
+    add_bookings(session, 6)
+    AdminService(session).review_bookings([1, 3, 5], approve=True)
+    # booking 1 is past the default 60 minute grace period, 3 and 5 are not yet
+    session.execute(update(Rental).values(start_at=datetime.utcnow() - timedelta(minutes=30)))
+    session.execute(update(Rental).where(Rental.id == 1).values(start_at=datetime.utcnow() - timedelta(hours=2)))
+    session.commit()
+
+    controller = CLIController(db)
+    answers = iter(["all"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    controller.cancel_noshow()
+    output = capsys.readouterr().out
+    assert output.count("Booking ID") == 1
+    assert "1 no-show bookings cancelled." in output
+    session.expire_all()
+    assert [r.booking_status for r in session.query(Rental).filter(Rental.id.in_([1, 3, 5])).order_by(Rental.id)] == [
+        BookingStatus.CANCELLED, BookingStatus.REQUESTED, BookingStatus.REQUESTED]
+
+def test_background_sweeper(tmp_path):
+    db = Database.from_url(f"sqlite:///{tmp_path / 'car_rental.db'}", noshow_grace_minutes=0)
+    session = db.get_session()
+    add_bookings(session, 2)
+    AdminService(session).review_bookings([1], approve=True)
+    session.execute(update(Rental).values(start_at=datetime.utcnow() - timedelta(hours=1)))
+    session.commit()
+
+    sweeper = NoShowSweeper(db, interval=0.01).start()
+    try:
+        for _ in range(200):
+            session.commit()  # end the read transaction to see the sweeper's commits
+            if session.get(Rental, 1).booking_status == BookingStatus.CANCELLED:
+                break
+            time.sleep(0.01)
+    finally:
+        sweeper.stop(timeout=5)
+    assert session.get(Rental, 1).cancelled_by == "SYSTEM"
+    session.close()
+    db.dispose()
+
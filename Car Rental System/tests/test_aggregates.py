@@ -0,0 +1,129 @@
+import pytest
+from src.database import Database
+from src.admin_service import AdminService
+from src.auth_service import AuthService
+from src.vehicle_service import VehicleService
+from src.rental_service import RentalService
+from src.password_hasher import PasswordHasher
+from src.cli_controller import CLIController
+from src.aggregates import hours_by_day, rebuild_stats
+from src.models import DailyRevenueStats, DailyVehicleStats, VehicleType, PaymentMethod
+from db.migrations import migrate
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, text
+
+@pytest.fixture
+def db():
+    # isolated in-memory database for each test
+    db = Database.from_url("sqlite://")
+    yield db
+    db.dispose()
+
+def summary(session):
+    vehicle_rows = session.query(DailyVehicleStats.day, DailyVehicleStats.vehicle_id, DailyVehicleStats.vehicle_type,
+                                 DailyVehicleStats.issued, DailyVehicleStats.completed, DailyVehicleStats.cancelled,
+                                 DailyVehicleStats.revenue_cents, DailyVehicleStats.rented_hours).order_by(
+        DailyVehicleStats.day, DailyVehicleStats.vehicle_id).all()
+    revenue_rows = session.query(DailyRevenueStats.day, DailyRevenueStats.vehicle_type, DailyRevenueStats.payment_method,
+                                 DailyRevenueStats.rentals, DailyRevenueStats.revenue_cents).order_by(
+        DailyRevenueStats.day, DailyRevenueStats.vehicle_type, DailyRevenueStats.payment_method).all()
+    return [tuple(r) for r in vehicle_rows], [tuple(r) for r in revenue_rows]
+
+def run_lifecycle(session):
+    # two returns (one of them batched), one cancellation
+    user = AuthService(session, PasswordHasher(rounds=4)).register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    vehicle_service = VehicleService(session)
+    sedan = vehicle_service.add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    suv = vehicle_service.add_vehicle("XYZ789", "Honda CR-V", VehicleType.SUV, 2021, 20000, 100000, 2, 72, 800)
+    rental_service = RentalService(session)
+    admin_service = AdminService(session)
+    start_at = datetime.utcnow() + timedelta(days=1)
+    first = rental_service.create_booking(user.id, sedan.id, start_at, start_at + timedelta(hours=4))
+    second = rental_service.create_booking(user.id, suv.id, start_at, start_at + timedelta(hours=3))
+    third = rental_service.create_booking(user.id, sedan.id, start_at + timedelta(days=3), start_at + timedelta(days=3, hours=4))
+
+    admin_service.review_booking(first.id, approve=True)
+    admin_service.issue_vehicle(first.id)
+    admin_service.return_vehicle(first.id, 50100, 250, "", PaymentMethod.CARD)
+    admin_service.review_bookings([second.id], approve=True)
+    admin_service.issue_vehicles([second.id])
+    admin_service.return_vehicles([(second.id, 20100, 0, PaymentMethod.CASH)])
+    rental_service.cancel_booking(third.id, "CUSTOMER", "Plans changed")
+
+def test_incremental_updates_match_rebuild(db):
+    session = db.get_session()
+    run_lifecycle(session)
+    incremental = summary(session)
+
+    vehicle_rows, revenue_rows = incremental
+    assert sum(r[3] for r in vehicle_rows) == 2  # issued
+    assert sum(r[4] for r in vehicle_rows) == 2  # completed
+    assert sum(r[5] for r in vehicle_rows) == 1  # cancelled
+    assert sum(r[6] for r in vehicle_rows) == 4 * 500 + 250 + 3 * 800
+    assert {(r[1], r[2]) for r in revenue_rows} == {(VehicleType.SEDAN, PaymentMethod.CARD),
+                                                    (VehicleType.SUV, PaymentMethod.CASH)}
+
+    assert rebuild_stats(session) == 3
+    session.commit()
+    rebuilt = summary(session)
+    assert rebuilt[1] == incremental[1]
+    assert [r[:7] for r in rebuilt[0]] == [r[:7] for r in incremental[0]]
+    assert [r[7] for r in rebuilt[0]] == pytest.approx([r[7] for r in incremental[0]])
+
+def test_reports_read_only_the_summaries(db):
+    session = db.get_session()
+    run_lifecycle(session)
+    admin_service = AdminService(session)
+    today = datetime.utcnow().date()
+
+    statements = []
+    listener = lambda conn, cursor, statement, params, context, executemany: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        revenue = admin_service.get_daily_revenue(today, today)
+        mix = admin_service.get_payment_mix(today, today)
+        utilization = admin_service.get_fleet_utilization(today, today)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert not any("FROM rentals" in statement for statement in statements)
+
+    assert [(r.vehicle_type, r.rentals, r.revenue_cents) for r in revenue] == [
+        (VehicleType.SEDAN, 1, 2250), (VehicleType.SUV, 1, 2400)]
+    assert [(r.payment_method, r.rentals) for r in mix] == [(PaymentMethod.CARD, 1), (PaymentMethod.CASH, 1)]
+    by_type = {u.vehicle_type: u for u in utilization}
+    assert by_type[VehicleType.SEDAN].vehicles == 1 and by_type[VehicleType.VAN].utilization == 0.0
+    assert 0 <= by_type[VehicleType.SEDAN].utilization <= 1
+
+def test_hours_by_day():
+    pieces = list(hours_by_day(datetime(2030, 1, 1, 20), datetime(2030, 1, 3, 2)))
+    assert pieces == [(date(2030, 1, 1), 4.0), (date(2030, 1, 2), 24.0), (date(2030, 1, 3), 2.0)]
+    assert list(hours_by_day(datetime(2030, 1, 1), datetime(2030, 1, 1))) == []
+
+def test_migration_backfills_existing_rentals(tmp_path):
+    path = tmp_path / "car_rental.db"
+    db = Database.from_url(f"sqlite:///{path}")
+    session = db.get_session()
+    run_lifecycle(session)
+    expected = summary(session)
+    session.close()
+
+    # a database from before version 2 has rentals but no summary tables
+    with db.engine.begin() as conn:
+        conn.execute(text("DROP TABLE daily_vehicle_stats"))
+        conn.execute(text("DROP TABLE daily_revenue_stats"))
+        conn.execute(text("PRAGMA user_version = 1"))
+    migrate(db.engine)
+    session = db.get_session()
+    assert summary(session)[1] == expected[1]
+    assert len(summary(session)[0]) == len(expected[0])
+    session.close()
+    db.dispose()
+
+def test_cli_finance_report(db, capsys, monkeypatch):
+    run_lifecycle(db.get_session())
+    controller = CLIController(db)
+    answers = iter(["", ""])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    controller.view_finance_report()
+    output = capsys.readouterr().out
+    assert "$22.50" in output and "CASH" in output and "Utilization" in output
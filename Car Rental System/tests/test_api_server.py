@@ -0,0 +1,153 @@
+import http.client
+import json
+import threading
+import pytest
+from src.api_server import ApiApp, PooledHTTPServer, TokenSigner
+from src.auth_service import AuthService
+from src.database import Database
+from src.password_hasher import PasswordHasher
+from src.vehicle_service import VehicleService
+from src.models import Role, VehicleType
+from datetime import datetime, timedelta
+
+@pytest.fixture
+def api(tmp_path):
+    # API on a free local port backed by a temporary database file
+    db = Database.from_url(f"sqlite:///{tmp_path / 'api.db'}")
+    hasher = PasswordHasher(rounds=4)
+    session = db.get_session()
+    auth = AuthService(session, hasher)
+    auth.register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    auth.register("Jane", "Roe", "jane@example.com", "1234567890", "Test123")
+    auth.register("Ann", "Admin", "admin@example.com", "1234567890", "Admin123", Role.ADMIN)
+    VehicleService(session).add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    session.close()
+
+    server = PooledHTTPServer(("127.0.0.1", 0), 4, ApiApp(db, TokenSigner("test-secret", 60), hasher))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+    hasher.shutdown()
+    db.dispose()
+
+class Client:
+    # one keep-alive connection, like a browser or the load generator
+    def __init__(self, port):
+        self.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        self.token = None
+
+    def call(self, method, path, body=None):
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        self.connection.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = self.connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    def login(self, email, password):
+        status, payload = self.call("POST", "/login", {"email": email, "password": password})
+        assert status == 200
+        self.token = payload["token"]
+
+def test_customer_booking_flow(api):
+    client = Client(api)
+    client.login("john@example.com", "Test123")
+
+    # search, book and list over the same connection
+    start_at = (datetime.utcnow() + timedelta(days=1)).replace(microsecond=0)
+    end_at = start_at + timedelta(hours=4)
+    status, payload = client.call("GET", f"/vehicles/available?type=sedan&start_at={start_at.isoformat()}&end_at={end_at.isoformat()}")
+    assert status == 200 and [v["plate"] for v in payload["items"]] == ["ABC123"]
+    assert payload["items"][0]["quote_cents"] == 4 * 500
+    status, payload = client.call("GET", "/vehicles/next-available?type=sedan&hours=4&horizon_hours=48")
+    assert status == 200 and payload["items"][0]["plate"] == "ABC123" and payload["items"][0]["quote_cents"] == 4 * 500
+
+    booking_body = {"vehicle_id": payload["items"][0]["id"], "start_at": start_at.isoformat(), "end_at": end_at.isoformat()}
+    status, booking = client.call("POST", "/bookings", booking_body)
+    assert status == 200 and booking["initial_rental_cents"] == 4 * 500
+
+    # business rule errors come back as 400 with the service message
+    status, payload = client.call("POST", "/bookings", booking_body)
+    assert (status, payload["error"]) == (400, "Vehicle is already booked for the selected dates.")
+
+    status, payload = client.call("GET", "/bookings")
+    assert [b["id"] for b in payload["items"]] == [booking["id"]]
+
+    # another customer cannot see or cancel the booking
+    other = Client(api)
+    other.login("jane@example.com", "Test123")
+    assert other.call("POST", f"/bookings/{booking['id']}/cancel", {"reason": "no"})[0] == 404
+
+    status, payload = client.call("POST", f"/bookings/{booking['id']}/cancel", {"reason": "Plans changed"})
+    assert (status, payload["booking_status"], payload["cancelled_by"]) == (200, "CANCELLED", "CUSTOMER")
+
+def test_auth_errors(api):
+    client = Client(api)
+    assert client.call("POST", "/login", {"email": "john@example.com", "password": "Wrong123"})[0] == 401
+    assert client.call("GET", "/bookings")[0] == 401
+
+    client.token = "1.ADMIN.9999999999.forged"
+    assert client.call("GET", "/admin/bookings")[0] == 401
+
+    # members cannot reach admin routes
+    client.login("john@example.com", "Test123")
+    assert client.call("GET", "/admin/bookings")[0] == 403
+    assert client.call("GET", "/nowhere")[0] == 404
+    assert client.call("DELETE", "/bookings")[0] == 405
+
+def test_invalid_content_length(api):
+    # unparseable or negative lengths are refused instead of failing or waiting for EOF
+    for length in ("abc", "-1"):
+        connection = http.client.HTTPConnection("127.0.0.1", api, timeout=5)
+        connection.putrequest("POST", "/login")
+        connection.putheader("Content-Length", length)
+        connection.endheaders()
+        response = connection.getresponse()
+        assert response.status == 400
+        assert json.loads(response.read()) == {"error": "Invalid Content-Length header."}
+        connection.close()
+
+def test_admin_batch_and_pages(api):
+    customer = Client(api)
+    customer.login("john@example.com", "Test123")
+    start_at = (datetime.utcnow() + timedelta(days=1)).replace(microsecond=0)
+    status, booking = customer.call("POST", "/bookings", {
+        "vehicle_id": 1, "start_at": start_at.isoformat(), "end_at": (start_at + timedelta(hours=2)).isoformat()})
+    assert status == 200
+
+    admin = Client(api)
+    admin.login("admin@example.com", "Admin123")
+    status, payload = admin.call("POST", "/admin/bookings/review", {"ids": [booking["id"], 99], "approve": True})
+    assert payload["results"] == [{"id": booking["id"], "error": None}, {"id": 99, "error": "Booking not found."}]
+    status, payload = admin.call("POST", "/admin/bookings/issue", {"ids": [booking["id"]]})
+    assert payload["results"] == [{"id": booking["id"], "error": None}]
+    status, payload = admin.call("POST", "/admin/bookings/return", {"returns": [
+        {"id": booking["id"], "ending_mileage": 50100.5, "surcharge_cents": 250, "payment_method": "card"}]})
+    assert payload["results"] == [{"id": booking["id"], "error": None}]
+
+    status, payload = admin.call("GET", f"/admin/bookings/{booking['id']}")
+    assert (payload["booking_status"], payload["total_rental_cents"]) == ("COMPLETED", 2 * 500 + 250)
+    today = datetime.utcnow().date().isoformat()
+    status, report = admin.call("GET", f"/admin/reports/finance?from={today}&to={today}")
+    assert report["payment_mix"] == [{"payment_method": "CARD", "rentals": 1, "revenue_cents": 1250}]
+
+    # vehicles are added with the import rules and listed with keyset pages
+    status, payload = admin.call("POST", "/admin/vehicles", {
+        "plate": "XYZ789", "model": "Ford Ranger", "type": "TRUCK", "year": 2019, "vehicle_mileage": 0,
+        "mileage_threshold": 100000, "min_rent_hours": 1, "max_rent_hours": 48, "hourly_rate_cents": 900})
+    assert status == 200
+    status, page = admin.call("GET", "/admin/vehicles?page_size=1")
+    assert [v["plate"] for v in page["items"]] == ["ABC123"] and page["next_after_id"] == 1
+    status, page = admin.call("GET", f"/admin/vehicles?page_size=1&after_id={page['next_after_id']}")
+    assert [v["plate"] for v in page["items"]] == ["XYZ789"]
+
+def test_metrics_endpoint(api):
+    # Prometheus text for scrapers, no token needed
+    connection = http.client.HTTPConnection("127.0.0.1", api, timeout=5)
+    connection.request("GET", "/metrics")
+    response = connection.getresponse()
+    assert response.status == 200
+    assert response.getheader("Content-Type").startswith("text/plain")
+    assert "car_rental_db_queries_total" in response.read().decode()
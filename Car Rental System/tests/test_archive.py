@@ -0,0 +1,147 @@
+import pytest
+from src.database import Database
+from src.admin_service import AdminService
+from src.rental_service import RentalService
+from src.aggregates import rebuild_stats
+from src.archive import archive_rentals
+from src.models import ArchivedRental, Base, BookingStatus, Rental, User, Vehicle
+from db.migrations import migrate, get_schema_version, SCHEMA_VERSION
+from tests.test_aggregates import run_lifecycle, summary
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+YEAR = timedelta(days=365)
+
+@pytest.fixture
+def db():
+    # isolated in-memory database for each test
+    db = Database.from_url("sqlite://")
+    yield db
+    db.dispose()
+
+def archived_lifecycle(session, batch_size=1):
+    # two completed and one cancelled rental, archived a little over a year later,
+    # plus one pending booking that stays in the live table
+    run_lifecycle(session)
+    user = session.query(User).one()
+    vehicle = session.query(Vehicle).first()
+    start_at = datetime.utcnow() + timedelta(days=10)
+    pending = RentalService(session).create_booking(user.id, vehicle.id, start_at, start_at + timedelta(hours=4))
+    report = archive_rentals(session, YEAR, batch_size, now=datetime.utcnow() + YEAR + timedelta(days=30))
+    return user, pending, report
+
+def test_archive_moves_finished_rentals(db):
+    session = db.get_session()
+    user, pending, report = archived_lifecycle(session)
+    assert (report.moved, report.batches) == (3, 3)
+
+    assert [r.id for r in session.query(Rental)] == [pending.id]
+    archived = session.query(ArchivedRental).order_by(ArchivedRental.id).all()
+    assert [(r.id, r.booking_status, r.total_rental_cents) for r in archived] == [
+        (1, BookingStatus.COMPLETED, 2250), (2, BookingStatus.COMPLETED, 2400), (3, BookingStatus.CANCELLED, 2000)]
+    assert all(r.archived_at is not None for r in archived)
+    assert archived[0].vehicle.plate == "ABC123"
+
+    # a second run finds nothing left to move
+    again = archive_rentals(session, YEAR, now=datetime.utcnow() + YEAR + timedelta(days=30))
+    assert (again.moved, again.batches) == (0, 0)
+    # recent rentals are not archived
+    assert archive_rentals(session, YEAR).moved == 0
+    with pytest.raises(ValueError, match="at least 1"):
+        archive_rentals(session, YEAR, batch_size=0)
+
+def test_history_merges_archive(db):
+    session = db.get_session()
+    user, pending, _ = archived_lifecycle(session, batch_size=2)
+    admin_service = AdminService(session)
+    rental_service = RentalService(session)
+    all_ids = [1, 2, 3, pending.id]
+
+    assert [b.id for b in admin_service.get_all_bookings()] == [pending.id]
+    assert [b.id for b in admin_service.get_all_bookings(include_archived=True)] == all_ids
+    assert [b.id for b in rental_service.get_user_bookings(user.id, include_archived=True)] == all_ids
+    assert [b.id for b in admin_service.get_cancelled_bookings(include_archived=True)] == [3]
+    assert admin_service.get_booking(2, include_archived=True).booking_status == BookingStatus.COMPLETED
+    with pytest.raises(ValueError):
+        admin_service.get_booking(2)
+
+    pages = list(admin_service.get_bookings_pages(page_size=3, include_archived=True))
+    assert [[b.id for b in page] for page in pages] == [[1, 2, 3], [pending.id]]
+    after = list(admin_service.get_bookings_pages(page_size=3, after_id=2, include_archived=True))
+    assert [[b.id for b in page] for page in after] == [[3, pending.id]]
+    assert [b.id for b in admin_service.stream_bookings(page_size=1, include_archived=True)] == all_ids
+    assert [b.id for b in admin_service.stream_cancelled_bookings(include_archived=True)] == [3]
+    rows = list(admin_service.get_booking_rows_pages(page_size=3, include_archived=True))
+    assert [[b.id for b in page] for page in rows] == [[1, 2, 3], [pending.id]]
+    assert [b.id for b in rental_service.list_user_bookings(user.id, include_archived=True)] == all_ids
+
+def test_archived_ids_are_not_reused(db):
+    # the newest rental moves to the archive; new bookings must not take its id
+    session = db.get_session()
+    user, pending, _ = archived_lifecycle(session)
+    pending_id = pending.id
+    rental_service = RentalService(session)
+    rental_service.cancel_booking(pending_id, "CUSTOMER", "Plans changed")
+    later = datetime.utcnow() + YEAR + timedelta(days=60)
+    assert archive_rentals(session, YEAR, now=later).moved == 1
+    assert session.query(Rental).count() == 0
+
+    start_at = datetime.utcnow() + timedelta(days=20)
+    booking = rental_service.create_booking(user.id, 1, start_at, start_at + timedelta(hours=4))
+    booking_id = booking.id
+    assert booking_id == pending_id + 1
+    rental_service.cancel_booking(booking_id, "CUSTOMER", "Plans changed")
+    assert archive_rentals(session, YEAR, now=later).moved == 1
+    history = [b.id for b in AdminService(session).get_all_bookings(include_archived=True)]
+    assert history == [1, 2, 3, pending_id, booking_id]
+
+def test_rebuild_counts_archived_rentals(db):
+    session = db.get_session()
+    archived_lifecycle(session)
+    incremental = summary(session)
+    assert rebuild_stats(session) == 3  # the pending booking has no events yet
+    session.commit()
+    rebuilt = summary(session)
+    assert rebuilt[1] == incremental[1]
+    assert [r[:7] for r in rebuilt[0]] == [r[:7] for r in incremental[0]]
+
+def test_migration_creates_archive_table(tmp_path):
+    # a version 2 database without the archive table gets it from v003
+    engine = create_engine(f"sqlite:///{tmp_path / 'car_rental.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE rentals_archive"))
+        conn.execute(text("PRAGMA user_version = 2"))
+    assert migrate(engine) == SCHEMA_VERSION
+    assert "rentals_archive" in inspect(engine).get_table_names()
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == SCHEMA_VERSION
+    engine.dispose()
+
+def test_migration_keeps_ids_above_archive(tmp_path):
+    # a version 4 rentals table without AUTOINCREMENT is rebuilt, rows and indexes
+    # kept, and new ids continue after the archived ones
+    engine = create_engine(f"sqlite:///{tmp_path / 'car_rental.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    run_lifecycle(session)
+    archive_rentals(session, timedelta(0), now=datetime.utcnow() + timedelta(days=5))
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE rentals RENAME TO rentals_old"))
+        conn.execute(text("CREATE TABLE rentals AS SELECT * FROM rentals_old"))
+        conn.execute(text("DROP TABLE rentals_old"))
+        for table in ("rentals", "rentals_archive"):
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN reject_reason"))  # added in v006
+        conn.execute(text("DELETE FROM sqlite_sequence"))
+        conn.execute(text("PRAGMA user_version = 4"))
+    session.close()
+
+    assert migrate(engine) == SCHEMA_VERSION
+    assert "ix_rentals_user_id" in {ix["name"] for ix in inspect(engine).get_indexes("rentals")}
+    session = sessionmaker(bind=engine)()
+    start_at = datetime.utcnow() + timedelta(days=20)
+    booking = RentalService(session).create_booking(1, 1, start_at, start_at + timedelta(hours=4))
+    assert booking.id == 4
+    session.close()
+    engine.dispose()
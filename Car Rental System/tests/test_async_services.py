@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from src.async_database import AsyncDatabase, async_url
+from src.async_services import AsyncAdminService, AsyncAuthService, AsyncRentalService, AsyncVehicleService
+from src.password_hasher import PasswordHasher
+from src.models import ApprovalStatus, Role, VehicleType
+from datetime import datetime, timedelta
+
+@pytest.fixture
+def db(tmp_path):
+    # async database on a temporary file, so sessions use separate pooled connections
+    db = AsyncDatabase.from_url(f"sqlite:///{tmp_path / 'async.db'}")
+    asyncio.run(db.prepare())
+    yield db
+    asyncio.run(db.dispose())
+
+@pytest.fixture
+def hasher():
+    # cheap bcrypt cost to keep the tests fast
+    hasher = PasswordHasher(rounds=4)
+    yield hasher
+    hasher.shutdown()
+
+def test_async_url_picks_driver():
+    # sync URLs get an async driver, explicit drivers are kept
+    assert str(async_url("sqlite:///db/car_rental.db")) == "sqlite+aiosqlite:///db/car_rental.db"
+    assert str(async_url("postgresql+psycopg://u@h/db")) == "postgresql+psycopg://u@h/db"
+    with pytest.raises(ValueError, match="No async driver"):
+        async_url("oracle://u@h/db")
+
+def test_register_and_login(db, hasher):
+    async def scenario():
+        auth = AsyncAuthService(db, hasher)
+        user = await auth.register("John", "Doe", "john@example.com", "1234567890", "Test123")
+        assert (await auth.login("john@example.com", "Test123")).id == user.id
+
+        # same rules as the sync service
+        with pytest.raises(ValueError, match="Email already exists."):
+            await auth.register("Jane", "Doe", "john@example.com", "0987654321", "Test123")
+        with pytest.raises(ValueError, match="Invalid email or password."):
+            await auth.login("john@example.com", "Wrong123")
+    asyncio.run(scenario())
+
+def test_concurrent_bookings_only_one_wins(db, hasher):
+    async def scenario():
+        auth = AsyncAuthService(db, hasher)
+        users = [await auth.register("User", str(i), f"user{i}@example.com", "1234567890", "Test123")
+                 for i in range(5)]
+        vehicle = await AsyncVehicleService(db).add_vehicle(
+            "ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+
+        # five customers race for the same car and window on one event loop
+        rentals = AsyncRentalService(db)
+        start_at = datetime.utcnow() + timedelta(days=1)
+        results = await asyncio.gather(*[
+            rentals.create_booking(user.id, vehicle.id, start_at, start_at + timedelta(hours=4)) for user in users
+        ], return_exceptions=True)
+        booked = [r for r in results if not isinstance(r, Exception)]
+        assert len(booked) == 1
+        assert all(str(r) == "Vehicle is already booked for the selected dates." for r in results if isinstance(r, Exception))
+
+        # the car no longer shows up for that window
+        assert await rentals.search_available_vehicles(VehicleType.SEDAN, start_at, start_at + timedelta(hours=4)) == []
+        return booked[0]
+    booking = asyncio.run(scenario())
+    assert booking.initial_rental_cents == 4 * 500
+
+def test_admin_flow_and_pages(db, hasher):
+    async def scenario():
+        admin = AsyncAdminService(db, hasher)
+        admin_user = await admin.create_admin("Ann", "Admin", "admin@example.com", "1234567890", "Admin123")
+        assert admin_user.role == Role.ADMIN
+
+        vehicles = AsyncVehicleService(db)
+        for i in range(5):
+            await vehicles.add_vehicle(f"PLT{i}", "Model", VehicleType.SUV, 2020, 0, 100000, 1, 72, 100)
+
+        # pages and streams come back in id order across several round trips
+        pages = [[v.plate for v in page] async for page in admin.get_vehicles_pages(page_size=2)]
+        assert pages == [["PLT0", "PLT1"], ["PLT2", "PLT3"], ["PLT4"]]
+        assert [v.plate async for v in admin.stream_vehicles(page_size=2)] == [f"PLT{i}" for i in range(5)]
+
+        # review through the batch API
+        start_at = datetime.utcnow() + timedelta(days=1)
+        booking = await AsyncRentalService(db).create_booking(admin_user.id, 1, start_at, start_at + timedelta(hours=2))
+        assert await admin.review_bookings([booking.id, 999], approve=True) == {booking.id: None, 999: "Booking not found."}
+        return await admin.get_booking(booking.id)
+    booking = asyncio.run(scenario())
+    assert booking.approval_status == ApprovalStatus.APPROVED
+    assert booking.vehicle.plate == "PLT0"
@@ -1,17 +1,15 @@
 import pytest
 from src.database import Database
 from src.auth_service import AuthService
-from src.models import User, Role, Base
-from sqlalchemy import create_engine
+from src.password_hasher import PasswordHasher, hash_rounds
+from src.models import User, Role
 
 @pytest.fixture
 def db():
-    # Setup an in-memory SQLite database for isolated tests
-    db = Database()
-    db._engine = create_engine("sqlite:///:memory:")  # in-memory DB
-    Base.metadata.create_all(db._engine)  # create all tables
+    # isolated in-memory database for each test
+    db = Database.from_url("sqlite://")
     yield db
-    Base.metadata.drop_all(db._engine)  # clean up tables after tests
+    db.dispose()
 
 def test_register_valid(db):
     # test registering a valid user
@@ -32,3 +30,41 @@ def test_login_invalid(db):
     auth = AuthService(db.get_session())
     with pytest.raises(ValueError, match="Invalid email or password."):
         auth.login("john@example.com", "Test123")
+
+def test_login_rehashes_outdated_cost(db):
+    # register with a cheap cost, then log in with a hasher configured for more rounds
+    session = db.get_session()
+    AuthService(session, PasswordHasher(rounds=4)).register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    auth = AuthService(session, PasswordHasher(rounds=5))
+    user = auth.login("john@example.com", "Test123")
+    assert hash_rounds(user.password_hash) == 5
+
+    # the upgraded hash still verifies and is not rehashed again
+    stored = user.password_hash
+    assert auth.login("john@example.com", "Test123").password_hash == stored
+    with pytest.raises(ValueError, match="Invalid email or password."):
+        auth.login("john@example.com", "Wrong123")
+
+    # a lower configured cost leaves the stronger hash alone
+    assert AuthService(session, PasswordHasher(rounds=4)).login("john@example.com", "Test123").password_hash == stored
+
+def test_hasher_verifies_in_parallel():
+    hasher = PasswordHasher(rounds=4, max_workers=4)
+    hashed = hasher.hash("Test123")
+    assert hasher.verify_many([("Test123", hashed), ("Nope123", hashed)] * 4) == [True, False] * 4
+    assert not hasher.needs_rehash(hashed)
+    hasher.shutdown()
+    with pytest.raises(ValueError):
+        PasswordHasher(rounds=3)
+
+def test_default_hasher_follows_database_settings():
+    # services without an explicit hasher use the cost of the Database they work on
+    from src.api_server import ApiApp, TokenSigner
+
+    db = Database.from_url("sqlite://", bcrypt_rounds=5, hash_workers=2)
+    session = db.get_session()
+    user = AuthService(session).register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    assert hash_rounds(user.password_hash) == 5
+    hasher = ApiApp(db, TokenSigner("test-secret", 60)).hasher
+    assert (hasher.rounds, hasher.max_workers) == (5, 2)
+    db.dispose()
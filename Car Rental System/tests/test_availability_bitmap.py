@@ -0,0 +1,104 @@
+import pytest
+from src.database import Database
+from src.auth_service import AuthService
+from src.vehicle_service import VehicleService
+from src.rental_service import RentalService, BOOKING_BUFFER
+from src.password_hasher import PasswordHasher
+from src.availability_bitmap import AvailabilityBitmap, range_masks
+from src.schedule import ceil_hour
+from src.models import VehicleType
+from datetime import datetime, timedelta
+import numpy as np
+import os
+
+HOUR = timedelta(hours=1)
+
+@pytest.fixture
+def db():
+    # isolated in-memory database with the hour bitmap enabled
+    db = Database.from_url("sqlite://")
+    db.enable_availability_bitmap()
+    yield db
+    db.dispose()
+
+def book_fleet(session):
+    # three sedans: free, booked tomorrow, booked tomorrow and the day after
+    user = AuthService(session, PasswordHasher(rounds=4)).register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    vehicle_service = VehicleService(session)
+    sedans = [vehicle_service.add_vehicle(f"SED{i}", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+              for i in range(3)]
+    rental_service = RentalService(session)
+    first_hour = ceil_hour(datetime.utcnow()) + timedelta(hours=24)
+    bookings = [
+        rental_service.create_booking(user.id, sedans[1].id, first_hour, first_hour + timedelta(hours=10, minutes=30)),
+        rental_service.create_booking(user.id, sedans[2].id, first_hour - timedelta(hours=12), first_hour + timedelta(hours=20)),
+        rental_service.create_booking(user.id, sedans[2].id, first_hour + timedelta(hours=40), first_hour + timedelta(hours=60)),
+    ]
+    return sedans, bookings, first_hour
+
+def test_range_masks():
+    first, masks = range_masks(3, 5)
+    assert first == 0 and masks.tolist() == [0b11000]
+    first, masks = range_masks(60, 130)
+    assert first == 0 and masks.tolist() == [0xF << 60, 2 ** 64 - 1, 0b11]
+
+def test_free_vehicles_match_searches(db):
+    session = db.get_session()
+    sedans, bookings, first_hour = book_fleet(session)
+    rental_service = RentalService(session)
+    bitmap = session.info["availability_bitmap"]
+    assert len(bitmap) == 3
+
+    for hour in range(-24, 90, 3):
+        start_at = first_hour + hour * HOUR
+        end_at = start_at + 4 * HOUR
+        if start_at < datetime.utcnow():
+            continue
+        # a search window is the booking plus the buffer on both sides
+        free = bitmap.free_vehicles(session, VehicleType.SEDAN, start_at - BOOKING_BUFFER, end_at + BOOKING_BUFFER)
+        assert free == [v.id for v in rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, end_at)]
+
+    # cancelling clears the hours, a new booking sets them again
+    window = (first_hour, first_hour + 4 * HOUR)
+    assert sedans[1].id not in bitmap.free_vehicles(session, VehicleType.SEDAN, *window)
+    rental_service.cancel_booking(bookings[0].id, "CUSTOMER", "Plans changed")
+    assert sedans[1].id in bitmap.free_vehicles(session, VehicleType.SEDAN, *window)
+    assert len(bitmap) == 2
+
+    with pytest.raises(ValueError, match="outside"):
+        bitmap.free_mask([sedans[0].id], first_hour, first_hour + timedelta(days=400))
+
+def test_calendar_matches_sweep(db):
+    session = db.get_session()
+    book_fleet(session)
+    rental_service = RentalService(session)
+    with_bitmap = rental_service.availability_calendar(VehicleType.SEDAN, 4, hours=96)
+    session.info.pop("availability_bitmap")
+    without = rental_service.availability_calendar(VehicleType.SEDAN, 4, hours=96, first_hour=with_bitmap.first_hour)
+    assert [v.id for v in with_bitmap.vehicles] == [v.id for v in without.vehicles]
+    assert np.array_equal(with_bitmap.free, without.free)
+    assert not with_bitmap.free.all()
+
+def test_memory_mapped_bitmap_grows(tmp_path):
+    origin = datetime(2030, 1, 1)
+    bitmap = AvailabilityBitmap(origin, 24 * 366, capacity=1, folder=str(tmp_path))
+    bitmap._add(1, 10, origin + 5 * HOUR, origin + 7 * HOUR)
+    bitmap._add(2, 20, origin + 100 * HOUR, origin + 101 * HOUR)  # second vehicle doubles the rows
+    assert bitmap.bits.shape == (2, 138)
+    assert os.fstat(bitmap.file.fileno()).st_size == 2 * 138 * 8
+    assert bitmap.free_mask([10, 20, 30], origin + 6 * HOUR, origin + 8 * HOUR).tolist() == [False, True, True]
+    assert bitmap.free_mask([10, 20, 30], origin + 100 * HOUR, origin + 101 * HOUR).tolist() == [True, False, True]
+
+    report = bitmap.memory_report()
+    assert report["vehicles"] == 2 and report["bytes"] == 2 * 138 * 8
+    assert report["bytes_per_1k_vehicle_years"] == 1104000
+
+def test_memory_mapped_bitmaps_are_private(tmp_path):
+    # two processes on the same database each map their own file, nothing is shared
+    origin = datetime(2030, 1, 1)
+    first = AvailabilityBitmap(origin, 24 * 366, capacity=1, folder=str(tmp_path))
+    first._add(1, 10, origin + 5 * HOUR, origin + 7 * HOUR)
+    second = AvailabilityBitmap(origin, 24 * 366, capacity=1, folder=str(tmp_path))
+    second._row(10)
+    assert first.free_mask([10], origin + 5 * HOUR, origin + 6 * HOUR).tolist() == [False]
+    assert second.free_mask([10], origin + 5 * HOUR, origin + 6 * HOUR).tolist() == [True]
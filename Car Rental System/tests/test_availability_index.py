@@ -0,0 +1,107 @@
+import pytest
+from src.database import Database
+from src.availability_index import AvailabilityIndex, VehicleIntervals, SESSION_KEY
+from src.auth_service import AuthService
+from src.vehicle_service import VehicleService
+from src.rental_service import RentalService
+from src.admin_service import AdminService
+from src.models import Base, Rental, VehicleType, Role, PaymentMethod
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+T0 = datetime(2030, 1, 1)
+
+def hours(n):
+    return T0 + timedelta(hours=n)
+
+@pytest.fixture
+def engine():
+    # in-memory database shared by all sessions of the test
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    yield engine
+    Base.metadata.drop_all(engine)
+
+def test_intervals_overlap():
+    intervals = VehicleIntervals()
+    intervals.add(1, hours(0), hours(10))
+    intervals.add(2, hours(2), hours(4))
+    intervals.add(3, hours(20), hours(24))
+
+    # a short rental nested in a long one must still be found through the running max
+    assert intervals.overlaps(hours(5), hours(6))
+    assert not intervals.overlaps(hours(10), hours(20))
+    assert intervals.overlaps(hours(19), hours(21))
+
+    intervals.remove(1, hours(0))
+    assert not intervals.overlaps(hours(5), hours(6))
+    assert intervals.overlaps(hours(3), hours(5))
+    assert len(intervals) == 2
+
+def test_index_follows_booking_lifecycle(engine):
+    index = AvailabilityIndex(verify=True)
+    session = Session(bind=engine, info={SESSION_KEY: index})
+    user = AuthService(session).register("John", "Doe", "john@example.com", "1234567890", "Test123", Role.MEMBER)
+    vehicle = VehicleService(session).add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    rental_service = RentalService(session)
+    admin_service = AdminService(session)
+    start_at = datetime.utcnow() + timedelta(days=1)
+    end_at = start_at + timedelta(hours=4)
+
+    # a new booking blocks the vehicle, cancelling frees it
+    booking = rental_service.create_booking(user.id, vehicle.id, start_at, end_at)
+    assert len(index) == 1
+    assert rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, end_at) == []
+    rental_service.cancel_booking(booking.id, "CUSTOMER", "Plans changed")
+    assert len(index) == 0
+    assert [v.id for v in rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, end_at)] == [vehicle.id]
+
+    # rejected bookings are dropped, approved ones stay until returned
+    booking = rental_service.create_booking(user.id, vehicle.id, start_at, end_at)
+    admin_service.review_booking(booking.id, approve=False, reason="No licence")
+    assert len(index) == 0
+    booking = rental_service.create_booking(user.id, vehicle.id, start_at, end_at)
+    admin_service.review_booking(booking.id, approve=True)
+    admin_service.issue_vehicle(booking.id)
+    assert len(index) == 1
+    admin_service.return_vehicle(booking.id, 50100, 0, "", PaymentMethod.CARD)
+    assert len(index) == 0
+
+def test_load_and_verify_resyncs(engine):
+    session = Session(bind=engine)
+    user = AuthService(session).register("John", "Doe", "john@example.com", "1234567890", "Test123", Role.MEMBER)
+    vehicle = VehicleService(session).add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    start_at = datetime.utcnow() + timedelta(days=1)
+    end_at = start_at + timedelta(hours=4)
+    RentalService(session).create_booking(user.id, vehicle.id, start_at, end_at)
+
+    # loading picks up existing bookings
+    index = AvailabilityIndex.load(session, verify=True)
+    assert len(index) == 1
+
+    # a booking written without the index is caught by the consistency check
+    indexed = Session(bind=engine, info={SESSION_KEY: index})
+    session.add(Rental(user_id=user.id, vehicle_id=vehicle.id, start_at=start_at + timedelta(days=5),
+                       end_at=end_at + timedelta(days=5), initial_rental_cents=0, total_rental_cents=0))
+    session.commit()
+    later = start_at + timedelta(days=5)
+    assert RentalService(indexed).search_available_vehicles(VehicleType.SEDAN, later, later + timedelta(hours=4)) == []
+    assert len(index) == 2
+
+def test_verify_covers_catalog_searches():
+    db = Database.from_url("sqlite://")
+    index = db.enable_availability_index(verify=True)
+    db.enable_vehicle_catalog()
+    session = db.get_session()
+    user = AuthService(session).register("John", "Doe", "john@example.com", "1234567890", "Test123", Role.MEMBER)
+    vehicle = VehicleService(session).add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    start_at = datetime.utcnow() + timedelta(days=1)
+    end_at = start_at + timedelta(hours=4)
+    booking = RentalService(session).create_booking(user.id, vehicle.id, start_at, end_at)
+
+    # the index loses the booking, the database still blocks the vehicle
+    index.discard(booking.id)
+    assert RentalService(session).search_available_vehicles(VehicleType.SEDAN, start_at, end_at) == []
+    assert len(index) == 1
+    db.dispose()
@@ -0,0 +1,68 @@
+import pytest
+import os
+import subprocess
+import sys
+from src.config import Settings
+from src.database import Database
+
+def test_settings_from_env():
+    # CAR_RENTAL_* variables override defaults with the field types
+    settings = Settings.from_env({"CAR_RENTAL_DATABASE_URL": "sqlite:///other.db", "CAR_RENTAL_POOL_SIZE": "12",
+                                  "CAR_RENTAL_POOL_TIMEOUT": "2.5", "CAR_RENTAL_SQLITE_SYNCHRONOUS": ""},
+                                 bcrypt_rounds=4)
+    assert settings.database_url == "sqlite:///other.db"
+    assert settings.pool_size == 12 and settings.pool_timeout == 2.5
+    assert settings.sqlite_synchronous == "NORMAL"  # empty values keep the default
+    assert settings.bcrypt_rounds == 4
+    with pytest.raises(ValueError, match="CAR_RENTAL_MAX_OVERFLOW"):
+        Settings.from_env({"CAR_RENTAL_MAX_OVERFLOW": "many"})
+
+def test_pragmas_on_every_pooled_connection(tmp_path):
+    db = Database.from_url(f"sqlite:///{tmp_path / 'nested' / 'car_rental.db'}", pool_size=2,
+                           sqlite_busy_timeout_ms=1234, sqlite_cache_size_kib=4096)
+    assert db.engine.pool.size() == 2
+
+    # check out two connections at once so both are fresh pooled connections
+    with db.engine.connect() as first, db.engine.connect() as second:
+        for conn in (first, second):
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert conn.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+            assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 1234
+            assert conn.exec_driver_sql("PRAGMA cache_size").scalar() == -4096
+    db.dispose()
+
+def test_databases_are_independent(tmp_path):
+    # each Database owns its engine, no shared state between instances
+    first = Database.from_url(f"sqlite:///{tmp_path / 'a.db'}")
+    second = Database.from_url("sqlite://")
+    assert first.engine is not second.engine
+    first.session_info["marker"] = True
+    assert "marker" in first.get_session().info
+    assert "marker" not in second.get_session().info
+    first.dispose()
+    second.dispose()
+
+def test_help_does_not_load_the_database_stack():
+    # start.py --help and stats stay cheap: no SQLAlchemy, bcrypt or CLI imports
+    code = ("import sys, start; sys.argv = ['start.py', '--help']; start.main(); "
+            "print(sorted(m for m in ('sqlalchemy', 'bcrypt', 'numpy', 'tabulate', 'src.cli_controller') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout
+    assert "sweep-noshows" in output
+    assert output.strip().endswith("[]")
+
+
+@pytest.mark.parametrize("value, refused", [("0", False), ("off", False), ("", False), ("on", True), ("verify", True)])
+def test_serve_refuses_only_an_enabled_index_with_processes(monkeypatch, value, refused):
+    import start
+
+    served = []
+    monkeypatch.setattr("src.api_server.serve", lambda settings, setup: served.append(settings))
+    db = Database.from_url("sqlite://", api_processes=2, availability_index=value)
+    if refused:
+        with pytest.raises(SystemExit, match="availability index"):
+            start.serve(db)
+        assert served == []
+    else:
+        start.serve(db)
+        assert len(served) == 1
@@ -0,0 +1,99 @@
+import csv
+import pytest
+from src.database import Database
+from src.admin_service import AdminService
+from src.rental_service import RentalService
+from src.archive import archive_rentals
+from src.export import export_format, export_rentals, read_watermark, write_watermark
+from src.models import User, Vehicle
+from tests.test_aggregates import run_lifecycle
+from datetime import datetime, timedelta
+from sqlalchemy import text
+
+@pytest.fixture
+def db(tmp_path):
+    # file database, the export reads through its own connection
+    db = Database.from_url(f"sqlite:///{tmp_path / 'car_rental.db'}")
+    yield db
+    db.dispose()
+
+def add_history(session):
+    # three finished rentals, archived, and a pending booking, all last
+    # changed an hour ago
+    run_lifecycle(session)
+    user = session.query(User).one()
+    vehicle = session.query(Vehicle).first()
+    start_at = datetime.utcnow() + timedelta(days=10)
+    pending = RentalService(session).create_booking(user.id, vehicle.id, start_at, start_at + timedelta(hours=4))
+    archive_rentals(session, timedelta(0), now=datetime.utcnow() + timedelta(days=5))
+    for table in ("rentals", "rentals_archive"):
+        session.execute(text(f"UPDATE {table} SET updated_at = :at"), {"at": datetime.utcnow() - timedelta(hours=1)})
+    session.commit()
+    return pending
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+def test_full_export_to_csv(db, tmp_path):
+    session = db.get_session()
+    pending = add_history(session)
+    path = str(tmp_path / "rentals.csv")
+    report = export_rentals(db.engine, path, chunk_size=2)
+    assert (report.rows, report.chunks, report.since) == (4, 3, None)
+
+    rows = read_csv(path)
+    assert sorted(int(row["id"]) for row in rows) == [1, 2, 3, pending.id]
+    assert "user_password_hash" not in rows[0] and "password_hash" not in rows[0]
+    by_id = {int(row["id"]): row for row in rows}
+    assert by_id[pending.id]["booking_status"] == "REQUESTED" and by_id[pending.id]["archived_at"] == ""
+    assert by_id[1]["booking_status"] == "COMPLETED" and by_id[1]["archived_at"] != ""
+    assert (by_id[1]["vehicle_plate"], by_id[1]["user_email"]) == ("ABC123", "john@example.com")
+
+def test_incremental_export_reads_changed_rentals(db, tmp_path):
+    session = db.get_session()
+    pending = add_history(session)
+    first = export_rentals(db.engine, str(tmp_path / "full.csv"))
+    watermark_path = str(tmp_path / "rentals.watermark")
+    write_watermark(watermark_path, first.watermark)
+    assert read_watermark(watermark_path) == first.watermark
+
+    # a set-based review and a new booking change two rentals after the watermark
+    AdminService(session).review_bookings([pending.id], approve=True)
+    user = session.query(User).one()
+    vehicle = session.query(Vehicle).all()[1]
+    start_at = datetime.utcnow() + timedelta(days=20)
+    booking = RentalService(session).create_booking(user.id, vehicle.id, start_at, start_at + timedelta(hours=4))
+
+    path = str(tmp_path / "changes.csv")
+    report = export_rentals(db.engine, path, read_watermark(watermark_path), now=datetime.utcnow() + timedelta(minutes=2))
+    assert (report.rows, report.since) == (2, first.watermark)
+    assert sorted((int(row["id"]), row["approval_status"]) for row in read_csv(path)) == [
+        (pending.id, "APPROVED"), (booking.id, "PENDING")]
+
+    # running again right away finds nothing new and keeps the watermark
+    again = export_rentals(db.engine, path, report.watermark)
+    assert (again.rows, again.watermark) == (0, report.watermark)
+    assert read_csv(path) == []
+
+def test_export_formats(tmp_path):
+    assert export_format("rentals.csv", pyarrow_available=False) == "csv"
+    assert export_format("rentals.PARQUET", pyarrow_available=True) == "parquet"
+    with pytest.raises(ValueError, match="pyarrow"):
+        export_format("rentals.parquet", pyarrow_available=False)
+    with pytest.raises(ValueError, match="Unsupported"):
+        export_format("rentals.xlsx")
+    path = tmp_path / "bad.watermark"
+    path.write_text("yesterday")
+    with pytest.raises(ValueError, match="Invalid watermark"):
+        read_watermark(str(path))
+
+def test_export_to_parquet(db, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    session = db.get_session()
+    add_history(session)
+    path = str(tmp_path / "rentals.parquet")
+    assert export_rentals(db.engine, path, chunk_size=3).rows == 4
+    table = pq.read_table(path)
+    assert table.num_rows == 4
+    assert "password_hash" not in table.column_names and "user_email" in table.column_names
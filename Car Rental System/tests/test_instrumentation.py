@@ -0,0 +1,76 @@
+import logging
+import pytest
+from src.database import Database
+from src.instrumentation import get_instrumentation, instrumented, format_prometheus, format_table
+from src.auth_service import AuthService
+from src.rental_service import RentalService
+from src.vehicle_service import VehicleService
+from src.password_hasher import PasswordHasher
+from src.models import Vehicle, VehicleType
+from datetime import datetime, timedelta
+
+@pytest.fixture
+def instrumentation():
+    # the registry is process-wide, start empty and switch it off again afterwards
+    instrumentation = get_instrumentation()
+    instrumentation.reset()
+    yield instrumentation
+    instrumentation.disable()
+    instrumentation.reset()
+
+@pytest.fixture
+def db(instrumentation):
+    db = Database.from_url("sqlite://", instrumentation=True, slow_query_ms=0)
+    yield db
+    db.dispose()
+
+def add_booking(db):
+    session = db.get_session()
+    user = AuthService(session, PasswordHasher(rounds=4)).register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    vehicle = VehicleService(session).add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    start_at = datetime.utcnow() + timedelta(days=1)
+    return RentalService(session).create_booking(user.id, vehicle.id, start_at, start_at + timedelta(hours=4))
+
+def test_records_queries_and_latency_per_method(db, instrumentation):
+    instrumentation.reset()  # drop the schema setup statements
+    add_booking(db)
+    methods = instrumentation.snapshot()["methods"]
+
+    booking = methods["RentalService.create_booking"]
+    assert booking["calls"] == 1 and booking["errors"] == 0
+    # vehicle lookup with lock, overlap check, insert
+    assert booking["queries"] == 3
+    assert booking["p50_ms"] > 0 and sum(booking["buckets"]) == 1
+
+    # nested instrumented calls roll up into the caller
+    assert methods["AuthService.check_registration"]["queries"] == 1
+    assert methods["AuthService.register"]["queries"] == methods["AuthService.check_registration"]["queries"] + 1
+
+def test_errors_are_counted(db, instrumentation):
+    with pytest.raises(ValueError):
+        RentalService(db.get_session()).cancel_booking(42, "CUSTOMER", "no such booking")
+    stats = instrumentation.snapshot()["methods"]["RentalService.cancel_booking"]
+    assert (stats["calls"], stats["errors"], stats["queries"]) == (1, 1, 1)
+
+def test_slow_query_log(db, instrumentation, caplog):
+    instrumentation.slow_query_ms = 0.000001  # every statement is "slow"
+    with caplog.at_level(logging.WARNING, logger="src.instrumentation.slow_queries"):
+        db.get_session().query(Vehicle).all()
+    assert any("Slow query" in record.message and "FROM vehicles" in record.message for record in caplog.records)
+    assert instrumentation.snapshot()["slow_queries"] >= 1
+
+def test_disabled_wrapper_is_pass_through(instrumentation):
+    @instrumented
+    def double(x):
+        return 2 * x
+
+    assert double(2) == 4
+    assert instrumentation.snapshot()["methods"] == {}
+
+def test_exports(db, instrumentation):
+    add_booking(db)
+    snapshot = instrumentation.snapshot()
+    text = format_prometheus(snapshot)
+    assert 'car_rental_method_calls_total{method="RentalService.create_booking"} 1' in text
+    assert 'car_rental_method_duration_seconds_bucket{method="RentalService.create_booking",le="+Inf"} 1' in text
+    assert "RentalService.create_booking" in format_table(snapshot)
@@ -0,0 +1,130 @@
+import pytest
+from src.models import Base, Rental, VehicleType, Role
+from src.auth_service import AuthService
+from src.vehicle_service import VehicleService
+from src.rental_service import RentalService
+from src.admin_service import AdminService
+from db.migrations import ensure_schema, migrate, get_schema_version, SCHEMA_VERSION, v001_hot_path_indexes
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+INDEX_NAMES = ["ix_rentals_blocking_window", "ix_rentals_user_id",
+               "ix_rentals_status_approval_start", "ix_vehicles_type_is_deleted",
+               "ix_rentals_updated_at", "ix_rentals_archive_updated_at"]
+
+@pytest.fixture
+def engine(tmp_path):
+    # file-backed database so every connection sees the same schema
+    engine = create_engine(f"sqlite:///{tmp_path / 'car_rental.db'}")
+    Base.metadata.create_all(engine)
+    migrate(engine)
+    yield engine
+    engine.dispose()
+
+def index_names(engine):
+    inspector = inspect(engine)
+    return {ix["name"] for table in ("rentals", "rentals_archive", "vehicles") for ix in inspector.get_indexes(table)}
+
+def test_migrate_existing_database(engine):
+    # simulate a database created before indexes existed
+    with engine.begin() as conn:
+        for name in INDEX_NAMES:
+            conn.execute(text(f"DROP INDEX {name}"))
+        conn.execute(text("PRAGMA user_version = 0"))
+    assert not index_names(engine) & set(INDEX_NAMES)
+
+    assert migrate(engine) == SCHEMA_VERSION
+    assert set(INDEX_NAMES) <= index_names(engine)
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == SCHEMA_VERSION
+
+def test_migrate_is_idempotent(engine):
+    # running again on an up to date database changes nothing
+    assert migrate(engine) == SCHEMA_VERSION
+    with engine.begin() as conn:
+        v001_hot_path_indexes.upgrade(conn)
+    with engine.connect() as conn:
+        assert get_schema_version(conn) == SCHEMA_VERSION
+
+def test_ensure_schema_reads_only_the_version(engine):
+    # an up-to-date database is not inspected table by table
+    statements = []
+    listener = lambda conn, cursor, statement, params, context, executemany: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert ensure_schema(engine, Base.metadata) == SCHEMA_VERSION
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert statements == ["PRAGMA user_version"]
+
+def test_ensure_schema_creates_missing_tables(engine):
+    # a database from before version 2 gets the new tables and the migration
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE daily_revenue_stats"))
+        conn.execute(text("PRAGMA user_version = 1"))
+    assert ensure_schema(engine, Base.metadata) == SCHEMA_VERSION
+    assert "daily_revenue_stats" in inspect(engine).get_table_names()
+
+    # a newer database is refused rather than silently used
+    with engine.begin() as conn:
+        conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION + 1}"))
+    with pytest.raises(RuntimeError, match="newer"):
+        ensure_schema(engine, Base.metadata)
+
+def test_migration_adds_reject_reason(engine):
+    # a version 5 database gets the column on both rentals tables
+    with engine.begin() as conn:
+        for table in ("rentals", "rentals_archive"):
+            conn.execute(text(f"ALTER TABLE {table} DROP COLUMN reject_reason"))
+        conn.execute(text("PRAGMA user_version = 5"))
+    assert migrate(engine) == SCHEMA_VERSION
+    inspector = inspect(engine)
+    for table in ("rentals", "rentals_archive"):
+        assert "reject_reason" in {column["name"] for column in inspector.get_columns(table)}
+
+def query_plans(engine, action):
+    # run the action and return the query plan of every SELECT it issued
+    captured = []
+    def capture(conn, cursor, statement, params, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, params))
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        action()
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+    plans = []
+    with engine.connect() as conn:
+        for statement, params in captured:
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params).fetchall()
+            plans.append(" | ".join(row[-1] for row in rows))
+    return plans
+
+def test_hot_paths_use_indexes(engine):
+    session = sessionmaker(bind=engine)()
+    user = AuthService(session).register("John", "Doe", "john@example.com", "1234567890", "Test123", Role.MEMBER)
+    vehicle = VehicleService(session).add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    rental_service = RentalService(session)
+    admin_service = AdminService(session)
+    start_at = datetime.utcnow() + timedelta(days=1)
+    rental_service.create_booking(user.id, vehicle.id, start_at, start_at + timedelta(hours=4))
+
+    # availability search: vehicles by type, overlap check through the partial index
+    plan = query_plans(engine, lambda: rental_service.search_available_vehicles(
+        VehicleType.SEDAN, start_at, start_at + timedelta(hours=4)))[-1]
+    assert "ix_vehicles_type_is_deleted" in plan
+    assert "ix_rentals_blocking_window" in plan
+
+    plan = query_plans(engine, lambda: rental_service.has_active_bookings(vehicle.id))[-1]
+    assert "ix_rentals_blocking_window" in plan
+
+    plan = query_plans(engine, admin_service.get_no_show_bookings)[-1]
+    assert "ix_rentals_status_approval_start" in plan
+
+    plan = query_plans(engine, admin_service.get_cancelled_bookings)[-1]
+    assert "ix_rentals_status_approval_start" in plan
+
+    # per-customer listing as run by CLIController.view_user_bookings
+    plan = query_plans(engine, lambda: session.query(Rental).filter(Rental.user_id == user.id).all())[-1]
+    assert "ix_rentals_user_id" in plan
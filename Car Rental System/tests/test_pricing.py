@@ -0,0 +1,42 @@
+import random
+import numpy as np
+from src.pricing import price_cents, quote_matrix, quote_vehicles, rental_hours, window_hours, within_limits
+from src.vehicle_catalog import VehicleRecord
+from datetime import datetime, timedelta
+from math import ceil
+
+T0 = datetime(2030, 1, 1)
+
+def legacy_price(rate, start_at, end_at):
+    # the formula the CLI and booking used before the pricing module
+    return ceil((end_at - start_at).total_seconds() / 3600) * rate
+
+def test_scalar_pricing():
+    assert rental_hours(T0, T0 + timedelta(hours=4)) == 4
+    assert rental_hours(T0, T0 + timedelta(hours=4, microseconds=1)) == 5  # every started hour is billed
+    assert price_cents(500, T0, T0 + timedelta(minutes=90)) == 1000
+
+def test_matrix_matches_scalar_formula():
+    rnd = random.Random(5)
+    rates = [rnd.randint(100, 5000) for _ in range(200)]
+    starts = [T0 + timedelta(seconds=rnd.randint(0, 10**7), microseconds=rnd.randint(0, 999999)) for _ in range(50)]
+    ends = [s + timedelta(seconds=rnd.randint(1, 10**6), microseconds=rnd.randint(0, 999999)) for s in starts]
+    # exact hour boundaries are where rounding differences would show
+    starts.append(T0)
+    ends.append(T0 + timedelta(hours=3))
+
+    quotes = quote_matrix(rates, starts, ends)
+    assert quotes.shape == (200, 51) and quotes.dtype == np.int64
+    expected = [[legacy_price(rate, s, e) for s, e in zip(starts, ends)] for rate in rates]
+    assert quotes.tolist() == expected
+
+def test_limits_and_vehicle_quotes():
+    hours = window_hours([T0, T0, T0], [T0 + timedelta(hours=1), T0 + timedelta(hours=5), T0 + timedelta(hours=100)])
+    assert within_limits([2, 1], [72, 4], hours).tolist() == [[False, True, False], [True, False, False]]
+
+    vehicles = [VehicleRecord(dict(id=i, plate=f"P{i}", model="M", type=None, year=2020, vehicle_mileage=0,
+                                   mileage_threshold=1, min_rent_hours=1, max_rent_hours=72, hourly_rate_cents=100 * i,
+                                   photo_url=None, is_deleted=False, created_at=None, updated_at=None))
+                for i in (1, 2)]
+    assert quote_vehicles(vehicles, T0, T0 + timedelta(hours=3)) == {1: 300, 2: 600}
+    assert quote_vehicles([], T0, T0) == {}
@@ -3,18 +3,19 @@ from src.database import Database
 from src.rental_service import RentalService
 from src.vehicle_service import VehicleService
 from src.auth_service import AuthService
-from src.models import VehicleType, Role, Base
+from src.models import VehicleType, Role, Rental, BLOCKING_BOOKING_STATUSES, BLOCKING_APPROVAL_STATUSES
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine
+import random
+import threading
+import time
+from sqlalchemy import event
 
 @pytest.fixture
 def db():
-    # setup an in-memory SQLite database for isolated testing
-    db = Database()
-    db._engine = create_engine("sqlite:///:memory:")  # use in-memory DB
-    Base.metadata.create_all(db._engine)  # create all tables
+    # isolated in-memory database for each test
+    db = Database.from_url("sqlite://")
     yield db
-    Base.metadata.drop_all(db._engine)  # drop tables after test
+    db.dispose()
 
 def test_create_booking(db):
     # initialize services
@@ -37,3 +38,114 @@ def test_create_booking(db):
     
     # check if the initial rental cost is calculated correctly
     assert booking.initial_rental_cents == 4 * 500
+
+def test_search_excludes_overlapping_vehicles(db):
+    # initialize services on one session
+    session = db.get_session()
+    auth = AuthService(session)
+    vehicle_service = VehicleService(session)
+    rental_service = RentalService(session)
+
+    user = auth.register("John", "Doe", "john@example.com", "1234567890", "Test123", Role.MEMBER)
+    booked = vehicle_service.add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    free = vehicle_service.add_vehicle("DEF456", "Honda Civic", VehicleType.SEDAN, 2021, 20000, 100000, 2, 72, 450)
+    vehicle_service.add_vehicle("GHI789", "Ford Ranger", VehicleType.TRUCK, 2019, 10000, 100000, 2, 72, 900)
+
+    # book the first sedan, then search a window that falls inside its 6-hour buffer
+    start_at = datetime.utcnow() + timedelta(days=1)
+    rental_service.create_booking(user.id, booked.id, start_at, start_at + timedelta(hours=4))
+    search_start = start_at + timedelta(hours=8)
+    vehicles = rental_service.search_available_vehicles(VehicleType.SEDAN, search_start, search_start + timedelta(hours=4))
+    assert [v.id for v in vehicles] == [free.id]
+
+    # outside the buffer both sedans are available again
+    search_start = start_at + timedelta(hours=11)
+    vehicles = rental_service.search_available_vehicles(VehicleType.SEDAN, search_start, search_start + timedelta(hours=4))
+    assert [v.id for v in vehicles] == [booked.id, free.id]
+
+def test_search_runs_single_query(db):
+    session = db.get_session()
+    vehicle_service = VehicleService(session)
+    rental_service = RentalService(session)
+    for i in range(20):
+        vehicle_service.add_vehicle(f"CAR{i:03d}", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+
+    # count statements sent to the database during the search
+    statements = []
+    listener = lambda conn, cursor, statement, params, context, executemany: statements.append(statement)
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        start_at = datetime.utcnow() + timedelta(days=1)
+        vehicles = rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, start_at + timedelta(hours=4))
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+    assert len(vehicles) == 20
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+
+def test_create_booking_rejects_overlap(db):
+    session = db.get_session()
+    user = AuthService(session).register("John", "Doe", "john@example.com", "1234567890", "Test123", Role.MEMBER)
+    vehicle = VehicleService(session).add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    rental_service = RentalService(session)
+    start_at = datetime.utcnow() + timedelta(days=1)
+    first = rental_service.create_booking(user.id, vehicle.id, start_at, start_at + timedelta(hours=4))
+
+    # a booking starting inside the 6-hour buffer is refused
+    with pytest.raises(ValueError, match="already booked"):
+        rental_service.create_booking(user.id, vehicle.id, start_at + timedelta(hours=9), start_at + timedelta(hours=12))
+
+    # once the first booking is cancelled the slot is free again
+    rental_service.cancel_booking(first.id, "CUSTOMER", "Plans changed")
+    booking = rental_service.create_booking(user.id, vehicle.id, start_at + timedelta(hours=9), start_at + timedelta(hours=12))
+    assert booking.start_at == start_at + timedelta(hours=9)
+
+def test_concurrent_bookings_never_double_book(tmp_path):
+    # file database so every thread gets its own connection
+    db = Database.from_url(f"sqlite:///{tmp_path / 'stress.db'}")
+    Session = db.get_session
+    session = Session()
+    user = AuthService(session).register("John", "Doe", "john@example.com", "1234567890", "Test123", Role.MEMBER)
+    vehicle_ids = [VehicleService(session).add_vehicle(f"CAR{i}", "Toyota Camry", VehicleType.SEDAN, 2020, 50000,
+                                                       100000, 1, 72, 500).id for i in range(3)]
+    user_id = user.id
+    session.close()
+
+    # every thread books random, heavily overlapping windows on the same few cars
+    base = datetime.utcnow() + timedelta(days=1)
+    threads_count, attempts = 8, 25
+    created, refused = [], []
+    def booker(seed):
+        rnd = random.Random(seed)
+        service = RentalService(Session())
+        for _ in range(attempts):
+            start_at = base + timedelta(hours=rnd.randint(0, 200))
+            try:
+                created.append(service.create_booking(user_id, rnd.choice(vehicle_ids), start_at,
+                                                      start_at + timedelta(hours=rnd.randint(1, 8))).id)
+            except ValueError:
+                refused.append(seed)
+        service.db.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=booker, args=(seed,)) for seed in range(threads_count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    print(f"\n{len(created)} bookings, {len(refused)} refused, "
+          f"{(len(created) + len(refused)) / elapsed:.0f} booking attempts/s, {len(created) / elapsed:.0f} bookings/s")
+
+    # no two blocking bookings of the same vehicle may come within the buffer of each other
+    session = Session()
+    bookings = session.query(Rental).filter(
+        Rental.booking_status.in_(BLOCKING_BOOKING_STATUSES),
+        Rental.approval_status.in_(BLOCKING_APPROVAL_STATUSES)
+    ).order_by(Rental.vehicle_id, Rental.start_at).all()
+    clashes = [(a.id, b.id) for a, b in zip(bookings, bookings[1:])
+               if a.vehicle_id == b.vehicle_id and b.start_at < a.end_at + timedelta(hours=6)]
+    assert created and refused
+    assert session.query(Rental).count() == len(created)
+    assert clashes == []
+    session.close()
+    db.dispose()
@@ -0,0 +1,87 @@
+import pytest
+from src.database import Database
+from src.auth_service import AuthService
+from src.vehicle_service import VehicleService
+from src.rental_service import RentalService
+from src.password_hasher import PasswordHasher
+from src.schedule import ceil_hour, earliest_start, free_start_hours
+from src.models import VehicleType
+from datetime import datetime, timedelta
+
+T0 = datetime(2030, 1, 1)
+HOUR = timedelta(hours=1)
+
+@pytest.fixture(params=["database", "index"])
+def db(request):
+    # isolated in-memory database, with and without the availability index
+    db = Database.from_url("sqlite://")
+    if request.param == "index":
+        db.enable_availability_index()
+    yield db
+    db.dispose()
+
+def book_fleet(session):
+    # three sedans: free, booked tomorrow, booked tomorrow and the day after; one truck
+    user = AuthService(session, PasswordHasher(rounds=4)).register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    vehicle_service = VehicleService(session)
+    sedans = [vehicle_service.add_vehicle(f"SED{i}", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+              for i in range(3)]
+    vehicle_service.add_vehicle("TRK1", "Ford Ranger", VehicleType.TRUCK, 2020, 50000, 100000, 2, 72, 900)
+    rental_service = RentalService(session)
+    first_hour = ceil_hour(datetime.utcnow()) + timedelta(hours=24)
+    rental_service.create_booking(user.id, sedans[1].id, first_hour, first_hour + timedelta(hours=10, minutes=30))
+    rental_service.create_booking(user.id, sedans[2].id, first_hour - timedelta(hours=12), first_hour + timedelta(hours=20))
+    rental_service.create_booking(user.id, sedans[2].id, first_hour + timedelta(hours=40), first_hour + timedelta(hours=60))
+    return sedans, first_hour
+
+def test_sweeps():
+    intervals = [(T0 + 9 * HOUR, T0 + 12 * HOUR), (T0 + 11 * HOUR, T0 + 30 * HOUR)]
+    buffer = 6 * HOUR
+    # 4 hours plus buffers do not fit before the first rental, the overlapping one pushes further
+    assert earliest_start(intervals, T0, T0 + 100 * HOUR, 4 * HOUR, buffer) == T0 + 36 * HOUR
+    # a rental starting exactly where the buffered window ends does not conflict
+    assert earliest_start(intervals, T0 - HOUR, T0 + 100 * HOUR, 4 * HOUR, buffer) == T0 - HOUR
+    assert earliest_start(intervals, T0 + 8 * HOUR, T0 + 100 * HOUR, 2 * HOUR, HOUR) == T0 + 31 * HOUR
+    assert earliest_start(intervals, T0, T0 + 39 * HOUR, 4 * HOUR, buffer) is None
+    assert earliest_start([], T0 + timedelta(minutes=1), T0 + 100 * HOUR, HOUR, buffer) == T0 + HOUR
+
+    free = free_start_hours(intervals, T0 - HOUR, 41, 4 * HOUR, buffer)
+    assert [h for h in range(41) if free[h]] == [0] + list(range(37, 41))
+
+def test_earliest_slots_match_repeated_searches(db):
+    session = db.get_session()
+    sedans, first_hour = book_fleet(session)
+    rental_service = RentalService(session)
+
+    slots = rental_service.find_earliest_slots(VehicleType.SEDAN, 8, horizon_hours=96, not_before=first_hour)
+    assert [v.id for v, _ in slots] == [sedans[0].id, sedans[1].id, sedans[2].id]
+    for vehicle, start_at in slots:
+        # the slot is bookable, one hour earlier is not (unless it is the first candidate)
+        found = rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, start_at + timedelta(hours=8))
+        assert vehicle.id in [v.id for v in found]
+        if start_at > first_hour:
+            earlier = start_at - HOUR
+            assert vehicle.id not in [v.id for v in rental_service.search_available_vehicles(
+                VehicleType.SEDAN, earlier, earlier + timedelta(hours=8))]
+    # booked until 10:30 after the first hour, plus the buffer, rounded up to the hour
+    assert dict((v.id, s) for v, s in slots)[sedans[1].id] == first_hour + timedelta(hours=17)
+
+    # durations outside the vehicles' limits have no candidates; short horizons drop busy cars
+    assert rental_service.find_earliest_slots(VehicleType.SEDAN, 100, horizon_hours=200, not_before=first_hour) == []
+    assert [v.id for v, _ in rental_service.find_earliest_slots(
+        VehicleType.SEDAN, 8, horizon_hours=12, not_before=first_hour)] == [sedans[0].id]
+    with pytest.raises(ValueError, match="horizon"):
+        rental_service.find_earliest_slots(VehicleType.SEDAN, 8, horizon_hours=0)
+
+def test_calendar_matches_searches(db):
+    session = db.get_session()
+    sedans, first_hour = book_fleet(session)
+    rental_service = RentalService(session)
+
+    calendar = rental_service.availability_calendar(VehicleType.SEDAN, 4, hours=72, first_hour=first_hour)
+    assert calendar.first_hour == first_hour and calendar.free.shape == (3, 72)
+    assert calendar.free[0].all()
+    for hour in range(0, 72, 5):
+        start_at = first_hour + timedelta(hours=hour)
+        found = {v.id for v in rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, start_at + timedelta(hours=4))}
+        assert {v.id for row, v in enumerate(calendar.vehicles) if calendar.free[row, hour]} == found
@@ -0,0 +1,48 @@
+import pytest
+from src.database import Database
+from src.models import Rental, User, Vehicle, Role, BLOCKING_BOOKING_STATUSES, BLOCKING_APPROVAL_STATUSES
+from db.synthetic import generate
+from datetime import datetime
+
+NOW = datetime(2025, 6, 1, 12)
+
+@pytest.fixture
+def db():
+    # isolated in-memory database for each test
+    db = Database.from_url("sqlite://")
+    yield db
+    db.dispose()
+
+def snapshot(db):
+    session = db.get_session()
+    rows = session.query(Rental.vehicle_id, Rental.user_id, Rental.start_at, Rental.end_at,
+                         Rental.booking_status, Rental.approval_status).order_by(Rental.id).all()
+    session.close()
+    return rows
+
+def test_generate_is_reproducible(db):
+    # same seed and clock give the same rentals
+    generate(db.get_session(), vehicles=20, users=10, rentals=300, seed=7, now=NOW)
+    other = Database.from_url("sqlite://")
+    generate(other.get_session(), vehicles=20, users=10, rentals=300, seed=7, now=NOW)
+    assert snapshot(db) == snapshot(other)
+    other.dispose()
+
+def test_generated_data_follows_booking_rules(db):
+    session = db.get_session()
+    counts = generate(session, vehicles=20, users=10, rentals=500, seed=3, now=NOW)
+    assert counts == dict(vehicles=20, users=10, rentals=500)
+    assert session.query(Vehicle).count() == 20
+    assert session.query(User).filter(User.role == Role.ADMIN).count() == 1
+
+    # blocking rentals of one car never overlap
+    blocking = session.query(Rental).filter(
+        Rental.booking_status.in_(BLOCKING_BOOKING_STATUSES),
+        Rental.approval_status.in_(BLOCKING_APPROVAL_STATUSES)
+    ).order_by(Rental.vehicle_id, Rental.start_at).all()
+    for previous, current in zip(blocking, blocking[1:]):
+        if previous.vehicle_id == current.vehicle_id:
+            assert previous.end_at <= current.start_at
+
+    # completed, cancelled and rejected rentals make up the rest
+    assert len(blocking) < 500
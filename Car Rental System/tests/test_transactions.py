@@ -0,0 +1,125 @@
+import pytest
+from src.database import Database, begin_write, transaction
+from src.admin_service import AdminService
+from src.auth_service import AuthService
+from src.vehicle_service import VehicleService
+from src.rental_service import RentalService
+from src.password_hasher import PasswordHasher
+from src.models import PaymentMethod, Rental, User, VehicleType
+from datetime import datetime, timedelta
+from sqlalchemy import event
+
+@pytest.fixture
+def db(tmp_path):
+    # file database with the availability index; savepoints need the configured SQLite engine
+    db = Database.from_url(f"sqlite:///{tmp_path / 'car_rental.db'}")
+    db.enable_availability_index()
+    yield db
+    db.dispose()
+
+def count_commits(engine, session, action):
+    # COMMITs sent while running the action, after ending the read transaction left open
+    session.commit()
+    commits = []
+    listener = lambda conn: commits.append(conn)
+    event.listen(engine, "commit", listener)
+    try:
+        action()
+    finally:
+        event.remove(engine, "commit", listener)
+    return len(commits)
+
+def add_sedans(session, count=2):
+    vehicle_service = VehicleService(session)
+    return [vehicle_service.add_vehicle(f"SED{i}", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+            for i in range(count)]
+
+def register(session, email="john@example.com"):
+    return AuthService(session, PasswordHasher(rounds=4)).register("John", "Doe", email, "1234567890", "Test123")
+
+def test_register_and_book_commit_once(db):
+    session = db.get_session()
+    sedan = add_sedans(session)[0]
+    index = session.info["availability_index"]
+    start_at = datetime.utcnow() + timedelta(days=1)
+
+    def workflow():
+        with transaction(session):
+            user = register(session)
+            booking = RentalService(session).create_booking(user.id, sedan.id, start_at, start_at + timedelta(hours=4))
+            begin_write(session)  # no commit in between
+            assert len(index) == 0  # tracked only once committed
+        return booking
+
+    assert count_commits(db.engine, session, workflow) == 1
+    assert len(index) == 1
+    other = db.get_session()
+    assert other.query(User).count() == 1 and other.query(Rental).count() == 1
+    other.close()
+
+def test_failed_step_rolls_back_the_workflow(db):
+    session = db.get_session()
+    sedan = add_sedans(session)[0]
+    index = session.info["availability_index"]
+    start_at = datetime.utcnow() + timedelta(days=1)
+
+    with pytest.raises(ValueError, match="already booked"):
+        with transaction(session):
+            user = register(session)
+            rental_service = RentalService(session)
+            rental_service.create_booking(user.id, sedan.id, start_at, start_at + timedelta(hours=4))
+            rental_service.create_booking(user.id, sedan.id, start_at, start_at + timedelta(hours=4))
+    assert session.query(User).count() == 0 and session.query(Rental).count() == 0
+    assert len(index) == 0
+
+def test_savepoint_keeps_earlier_steps(db):
+    session = db.get_session()
+    sedans = add_sedans(session)
+    start_at = datetime.utcnow() + timedelta(days=1)
+
+    with transaction(session):
+        user = register(session)
+        rental_service = RentalService(session)
+        first = rental_service.create_booking(user.id, sedans[0].id, start_at, start_at + timedelta(hours=4))
+        with pytest.raises(ValueError, match="already booked"):
+            with transaction(session):
+                rental_service.create_booking(user.id, sedans[1].id, start_at, start_at + timedelta(hours=4))
+                rental_service.create_booking(user.id, sedans[0].id, start_at, start_at + timedelta(hours=2))
+    # the booking of the second sedan went with its savepoint, the first one stays
+    assert [r.id for r in session.query(Rental)] == [first.id]
+    index = session.info["availability_index"]
+    assert len(index) == 1 and index.intervals(sedans[1].id, start_at, start_at + timedelta(days=1)) == []
+
+def test_return_and_rebook_in_one_transaction(db):
+    catalog = db.enable_vehicle_catalog()
+    session = db.get_session()
+    sedan = add_sedans(session, 1)[0]
+    user = register(session)
+    rental_service = RentalService(session)
+    admin_service = AdminService(session)
+    start_at = datetime.utcnow() + timedelta(days=1)
+    booking = rental_service.create_booking(user.id, sedan.id, start_at, start_at + timedelta(hours=4))
+    admin_service.review_booking(booking.id, approve=True)
+    admin_service.issue_vehicle(booking.id)
+    assert catalog.get(session, sedan.id).vehicle_mileage == 50000
+
+    def workflow():
+        with transaction(session):
+            admin_service.return_vehicle(booking.id, 50400, 0, "", PaymentMethod.CARD)
+            rental_service.create_booking(user.id, sedan.id, start_at + timedelta(days=2), start_at + timedelta(days=2, hours=4))
+
+    assert count_commits(db.engine, session, workflow) == 1
+    # the catalog entry is dropped after the commit, the next read sees the new mileage
+    assert catalog.get(session, sedan.id).vehicle_mileage == 50400
+    assert session.query(Rental).count() == 2
+
+    # a return past the mileage threshold blocks the rebooking in the same block,
+    # although the catalog still holds the mileage from before the block
+    rebooked = session.query(Rental).order_by(Rental.id.desc()).first()
+    admin_service.review_booking(rebooked.id, approve=True)
+    admin_service.issue_vehicle(rebooked.id)
+    with pytest.raises(ValueError, match="mileage threshold"):
+        with transaction(session):
+            admin_service.return_vehicle(rebooked.id, 100500, 0, "", PaymentMethod.CARD)
+            rental_service.create_booking(user.id, sedan.id, start_at + timedelta(days=4), start_at + timedelta(days=4, hours=4))
+    assert catalog.get(session, sedan.id).vehicle_mileage == 50400  # rolled back with the block
@@ -1,17 +1,15 @@
 import pytest
 from src.database import Database
-from src.vehicle_service import VehicleService
-from src.models import VehicleType, Base
-from sqlalchemy import create_engine
+from src.vehicle_service import VehicleService, read_fleet_file
+from src.models import VehicleType, Vehicle
+from sqlalchemy import event
 
 @pytest.fixture
 def db():
-    # Setup an in-memory SQLite database for isolated testing
-    db = Database()
-    db._engine = create_engine("sqlite:///:memory:")  # use in-memory DB
-    Base.metadata.create_all(db._engine)  # create tables
+    # isolated in-memory database for each test
+    db = Database.from_url("sqlite://")
     yield db
-    Base.metadata.drop_all(db._engine)  # drop tables after test
+    db.dispose()
 
 def test_add_vehicle(db):
     # initialize the VehicleService
@@ -24,3 +22,59 @@ def test_add_vehicle(db):
     
     # check that the vehicle was added correctly
     assert vehicle.plate == "ABC123"
+
+def test_bulk_upsert_inserts_updates_and_reports_errors(db, tmp_path):
+    service = VehicleService(db.get_session())
+    service.add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+
+    # existing plate is updated, new plates inserted, bad rows reported by line
+    fleet = tmp_path / "fleet.csv"
+    fleet.write_text(
+        "plate,model,type,year,vehicle_mileage,mileage_threshold,min_rent_hours,max_rent_hours,hourly_rate_cents,photo_url\n"
+        "ABC123,Toyota Camry,SEDAN,2020,61000,100000,2,72,550,\n"
+        "NEW001,Honda CR-V,suv,2022,1000,80000,4,48,700,http://example.com/crv.jpg\n"
+        "NEW002,Ford Transit,BUS,2021,1000,80000,4,48,700,\n"
+        "NEW003,Kia Rio,HATCHBACK,2021,1000,80000,10,4,300,\n"
+        "NEW001,Honda CR-V,SUV,2022,1000,80000,4,48,700,\n"
+        "NEW004,Isuzu D-Max,TRUCK,2019,,80000,4,48,900,\n"
+        "NEW005,Mazda 3,SEDAN,2023,10,90000,1,24,400,\n"
+        "NEW006,Mazda 3,SEDAN,2023,10,0,1,24,400,\n"
+    )
+    report = service.bulk_upsert(read_fleet_file(str(fleet)), chunk_size=2)
+    assert (report.inserted, report.updated) == (2, 1)
+    assert sorted(line for line, _ in report.errors) == [4, 5, 6, 7, 9]
+    assert dict(report.errors)[6] == "Duplicate plate in import."
+    assert dict(report.errors)[9] == "Mileage threshold must be positive."
+
+    vehicles = {v.plate: v for v in service.db.query(Vehicle).all()}
+    assert vehicles["ABC123"].vehicle_mileage == 61000 and vehicles["ABC123"].hourly_rate_cents == 550
+    assert vehicles["NEW001"].type == VehicleType.SUV and vehicles["NEW001"].is_deleted is False
+    assert set(vehicles) == {"ABC123", "NEW001", "NEW005"}
+
+def test_bulk_upsert_checks_plates_under_the_write_lock(tmp_path):
+    # the plate lookup and the writes of a chunk run in one BEGIN IMMEDIATE transaction
+    db = Database.from_url(f"sqlite:///{tmp_path / 'car_rental.db'}")
+    service = VehicleService(db.get_session())
+    service.add_vehicle("ABC123", "Toyota Camry", VehicleType.SEDAN, 2020, 50000, 100000, 2, 72, 500)
+    row = dict(plate="ABC123", model="Toyota Camry", type="SEDAN", year=2020, vehicle_mileage=60000,
+               mileage_threshold=100000, min_rent_hours=2, max_rent_hours=72, hourly_rate_cents=500)
+    log = []
+    statement_listener = lambda conn, cursor, statement, params, context, executemany: log.append(statement.split()[0])
+    commit_listener = lambda conn: log.append("COMMIT")
+    event.listen(db.engine, "before_cursor_execute", statement_listener)
+    event.listen(db.engine, "commit", commit_listener)
+    try:
+        report = service.bulk_upsert([(1, row), (2, dict(row, plate="NEW001"))])
+    finally:
+        event.remove(db.engine, "before_cursor_execute", statement_listener)
+        event.remove(db.engine, "commit", commit_listener)
+    assert (report.inserted, report.updated) == (1, 1)
+    begin = log.index("BEGIN")
+    assert log[begin:] == ["BEGIN", "SELECT", "INSERT", "UPDATE", "COMMIT"]
+    db.dispose()
+
+def test_read_fleet_file_jsonl(tmp_path):
+    # blank lines are skipped and unparseable lines come back as None
+    fleet = tmp_path / "fleet.jsonl"
+    fleet.write_text('{"plate": "A1"}\n\nnot json\n[1, 2]\n')
+    assert list(read_fleet_file(str(fleet))) == [(1, {"plate": "A1"}), (3, None), (4, None)]
@@ -0,0 +1,163 @@
+import pytest
+from src.database import Database
+from src.auth_service import AuthService
+from src.vehicle_service import VehicleService
+from src.rental_service import RentalService
+from src.admin_service import AdminService
+from src.password_hasher import PasswordHasher
+from src.vehicle_catalog import VehicleCatalog, format_catalog_prometheus
+from src.models import Vehicle, VehicleType, PaymentMethod
+from datetime import datetime, timedelta
+from sqlalchemy import update
+
+@pytest.fixture
+def db():
+    # isolated in-memory database with the catalog enabled
+    db = Database.from_url("sqlite://")
+    db.enable_vehicle_catalog()
+    yield db
+    db.dispose()
+
+def add_vehicle(session, plate, vehicle_type=VehicleType.SEDAN, mileage=50000):
+    return VehicleService(session).add_vehicle(plate, "Toyota Camry", vehicle_type, 2020, mileage, 100000, 2, 72, 500)
+
+def window():
+    start_at = datetime.utcnow() + timedelta(days=1)
+    return start_at, start_at + timedelta(hours=4)
+
+def test_lookups_are_cached(db):
+    session = db.get_session()
+    vehicle = add_vehicle(session, "ABC123")
+    catalog = session.info["vehicle_catalog"]
+
+    assert catalog.get(session, vehicle.id).plate == "ABC123"
+    assert catalog.get(session, vehicle.id).plate == "ABC123"
+    assert catalog.get_by_plate(session, "ABC123").id == vehicle.id
+    assert catalog.get(session, 999) is None
+    assert (catalog.hits, catalog.misses) == (2, 2)
+
+    # records are shared between sessions, so they cannot be changed
+    with pytest.raises(AttributeError):
+        catalog.get(session, vehicle.id).vehicle_mileage = 0
+
+def test_search_sees_every_vehicle_change(db):
+    session = db.get_session()
+    rental_service = RentalService(session)
+    start_at, end_at = window()
+    first = add_vehicle(session, "ABC123")
+
+    assert [v.plate for v in rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, end_at)] == ["ABC123"]
+    second = add_vehicle(session, "XYZ789")
+    assert [v.id for v in rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, end_at)] == [first.id, second.id]
+
+    # a type change moves the vehicle between listings
+    VehicleService(session).update_vehicle("XYZ789", type=VehicleType.SUV)
+    assert [v.id for v in rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, end_at)] == [first.id]
+    assert [v.id for v in rental_service.search_available_vehicles(VehicleType.SUV, start_at, end_at)] == [second.id]
+
+    VehicleService(session).delete_vehicle("ABC123")
+    assert rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, end_at) == []
+    with pytest.raises(ValueError, match="not found"):
+        VehicleService(session).get_vehicle(first.id)
+
+def test_bookings_use_cached_vehicles(db):
+    session = db.get_session()
+    user = AuthService(session, PasswordHasher(rounds=4)).register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    vehicle = add_vehicle(session, "ABC123")
+    rental_service = RentalService(session)
+    start_at, end_at = window()
+
+    booking = rental_service.create_booking(user.id, vehicle.id, start_at, end_at)
+    assert booking.initial_rental_cents == 4 * 500
+    # the booked vehicle is filtered by the overlap check, not by the cache
+    assert rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, end_at) == []
+
+    # returning past the mileage threshold takes the vehicle out of searches right away
+    admin_service = AdminService(session)
+    admin_service.review_booking(booking.id, approve=True)
+    admin_service.issue_vehicle(booking.id)
+    admin_service.return_vehicle(booking.id, 100000, 0, "", PaymentMethod.CARD)
+    later_start = end_at + timedelta(days=2)
+    assert rental_service.search_available_vehicles(VehicleType.SEDAN, later_start, later_start + timedelta(hours=4)) == []
+    with pytest.raises(ValueError, match="mileage threshold"):
+        rental_service.create_booking(user.id, vehicle.id, later_start, later_start + timedelta(hours=4))
+
+def test_bookings_read_the_vehicle_row(db):
+    # a deletion or a return by another process leaves the cached copy stale until the
+    # TTL runs out; bookings still check the row
+    session = db.get_session()
+    user = AuthService(session, PasswordHasher(rounds=4)).register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    deleted = add_vehicle(session, "ABC123")
+    worn = add_vehicle(session, "XYZ789")
+    catalog = session.info["vehicle_catalog"]
+    assert not catalog.get(session, deleted.id).is_deleted and catalog.get(session, worn.id).vehicle_mileage == 50000
+
+    # written past the services, as another process would
+    session.execute(update(Vehicle).where(Vehicle.id == deleted.id).values(is_deleted=True))
+    session.execute(update(Vehicle).where(Vehicle.id == worn.id).values(vehicle_mileage=100500))
+    session.commit()
+    assert not catalog.get(session, deleted.id).is_deleted  # still cached
+    rental_service = RentalService(session)
+    start_at, end_at = window()
+    with pytest.raises(ValueError, match="not found or deleted"):
+        rental_service.create_booking(user.id, deleted.id, start_at, end_at)
+    with pytest.raises(ValueError, match="mileage threshold"):
+        rental_service.create_booking(user.id, worn.id, start_at, end_at)
+
+def test_search_answers_from_the_index(db):
+    index = db.enable_availability_index()
+    session = db.get_session()
+    user = AuthService(session, PasswordHasher(rounds=4)).register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    vehicle = add_vehicle(session, "ABC123")
+    rental_service = RentalService(session)
+    start_at, end_at = window()
+    booking = rental_service.create_booking(user.id, vehicle.id, start_at, end_at)
+    assert rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, end_at) == []
+
+    # with the consistency check off, the index alone decides over the cached vehicles
+    index.discard(booking.id)
+    found = rental_service.search_available_vehicles(VehicleType.SEDAN, start_at, end_at)
+    assert [v.id for v in found] == [vehicle.id]
+    with pytest.raises(AttributeError):
+        found[0].vehicle_mileage = 0
+
+def test_bulk_returns_invalidate(db):
+    session = db.get_session()
+    user = AuthService(session, PasswordHasher(rounds=4)).register("John", "Doe", "john@example.com", "1234567890", "Test123")
+    vehicle = add_vehicle(session, "ABC123")
+    catalog = session.info["vehicle_catalog"]
+    start_at, end_at = window()
+    booking = RentalService(session).create_booking(user.id, vehicle.id, start_at, end_at)
+    admin_service = AdminService(session)
+    admin_service.review_bookings([booking.id], approve=True)
+    admin_service.issue_vehicles([booking.id])
+
+    assert catalog.get(session, vehicle.id).vehicle_mileage == 50000
+    admin_service.return_vehicles([(booking.id, 51000, 0, PaymentMethod.CARD)])
+    assert catalog.get(session, vehicle.id).vehicle_mileage == 51000
+
+def test_size_and_ttl_bounds(db):
+    session = db.get_session()
+    ids = [add_vehicle(session, f"PLATE{i}").id for i in range(3)]
+    catalog = VehicleCatalog(max_entries=2, ttl=60)
+    for vehicle_id in ids:
+        catalog.get(session, vehicle_id)
+    assert len(catalog) == 2 and catalog.evictions == 1
+    assert catalog.get_by_plate(session, "PLATE0").id == ids[0]  # evicted plates are reloaded
+
+    # expired entries are reloaded from the database
+    expired = VehicleCatalog(ttl=0)
+    expired.get(session, ids[0])
+    session.query(Vehicle).filter(Vehicle.id == ids[0]).update({"vehicle_mileage": 1})
+    session.commit()
+    assert expired.get(session, ids[0]).vehicle_mileage == 1
+    assert expired.hits == 0
+
+def test_prometheus_counters(db):
+    session = db.get_session()
+    vehicle = add_vehicle(session, "ABC123")
+    catalog = session.info["vehicle_catalog"]
+    catalog.get(session, vehicle.id)
+    text = format_catalog_prometheus(catalog.stats())
+    assert "car_rental_vehicle_catalog_misses_total 1" in text
+    assert "car_rental_vehicle_catalog_entries 1" in text